@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional, Sequence
+
+from app.config import (
+    ELASTIC_INDEX, SCIFACT_INDEX, WIKICLIR_INDEX, SEARCH_COLLECTIONS, DEFAULT_COLLECTION,
+)
+
+
+class Collection:
+    """
+    One searchable dataset: the index (alias) it lives in, its field names
+    and the templates used to turn a document into text for the models.
+
+    Results keep the collection's own field names (`plot` for movies, `text`
+    elsewhere) and carry the collection name as `collection`.
+    """
+
+    def __init__(self, name: str, index: str, text_field: str, text_label: str, kind: str,
+                 rerank_template: str, tag_field: Optional[str] = None, tags_template: str = "",
+                 extra_fields: Sequence[str] = (), data_path: str = ""):
+        self.name = name
+        self.index = index
+        # Body field: searched, highlighted for snippets, used by the reranker and the LLM
+        self.text_field = text_field
+        self.text_label = text_label
+        self.kind = kind
+        # Filled with `title` and `text` (the body, cut to the passage budget)
+        self.rerank_template = rerank_template
+        # Keyword field the `tags` filter applies to; None if the dataset has none
+        self.tag_field = tag_field
+        self.tags_template = tags_template
+        # Returned as stored, e.g. the source dataset of a movie
+        self.extra_fields = list(extra_fields)
+        # Converted dataset (scripts/convert.py), also what the local search engine indexes
+        self.data_path = data_path
+
+    @property
+    def search_fields(self) -> List[str]:
+        return ["title", self.text_field]
+
+    @property
+    def summary_fields(self) -> List[str]:
+        """Stored fields of a document except its body."""
+        return ["title", *([self.tag_field] if self.tag_field else []), *self.extra_fields]
+
+    @property
+    def document_fields(self) -> List[str]:
+        return ["title", self.text_field, *self.summary_fields[1:]]
+
+    def __repr__(self):
+        return f"Collection({self.name!r}, index={self.index!r})"
+
+
+MOVIES = Collection(
+    "movies", ELASTIC_INDEX, text_field="plot", text_label="Plot", kind="Movie",
+    rerank_template="Title: {title}\nPlot: {text}",
+    tag_field="tags", tags_template="\nGenres: {tags}", extra_fields=["source"], data_path="data/mpst",
+)
+
+COLLECTIONS: Dict[str, Collection] = {
+    collection.name: collection for collection in [
+        MOVIES,
+        Collection(
+            "scifact", SCIFACT_INDEX, text_field="text", text_label="Abstract", kind="Paper",
+            rerank_template="Title: {title}\nAbstract: {text}", data_path="data/scifact",
+        ),
+        Collection(
+            "wikiclir", WIKICLIR_INDEX, text_field="text", text_label="Article", kind="Article",
+            rerank_template="Title: {title}\nArticle: {text}", data_path="data/wikiclir",
+        ),
+    ]
+}
+
+# Body fields across collections; requesting any of them fetches the body
+TEXT_FIELDS = {collection.text_field for collection in COLLECTIONS.values()}
+
+# Document field holding the embedding, mapped as an HNSW-indexed dense_vector
+# (scripts/index.py --embeddings); only used for kNN scoring, never returned
+EMBEDDING_FIELD = "embedding"
+
+
+def enabled_collections() -> List[Collection]:
+    """Collections the API serves (SEARCH_COLLECTIONS), in configured order."""
+    return [COLLECTIONS[name] for name in SEARCH_COLLECTIONS if name in COLLECTIONS]
+
+
+def get_collection(name: Optional[str] = None) -> Collection:
+    """Look up a collection by name (default: DEFAULT_COLLECTION); raises KeyError if unknown."""
+    return COLLECTIONS[name or DEFAULT_COLLECTION]
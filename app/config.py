@@ -4,13 +4,170 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Elasticsearch connection
-ELASTIC_HOST = f"http://es:{os.getenv('ES_PORT', 9200)}"
-# ELASTIC_HOST = f"http://localhost:{os.getenv('ES_PORT', 9200)}"
+ELASTIC_HOST = os.getenv("ELASTIC_HOST", f"http://es:{os.getenv('ES_PORT', 9200)}")
 ELASTIC_USER = "elastic"
 ELASTIC_PASSWORD = os.getenv("ELASTIC_PASSWORD", "changeme")
+# Client tuning (app/services/es_client.py). ELASTIC_HOST may list several
+# comma-separated nodes. Keep ES_CONNECTIONS_PER_NODE at or above the
+# requests a worker has in flight, or requests queue for a connection.
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", 32))
+ES_HTTP_COMPRESS = os.getenv("ES_HTTP_COMPRESS", "true").lower() == "true"
+# Latency budgets of the API's searches (search, msearch) and document
+# fetches (mget, mappings), retries included: each attempt's timeout is what
+# is left of the budget. Transient errors (unreachable node, timeout, 429,
+# 502-504) are retried up to ES_MAX_RETRIES times, backing off
+# ES_RETRY_BACKOFF_MS * 2^n with full jitter.
+ES_SEARCH_BUDGET_MS = float(os.getenv("ES_SEARCH_BUDGET_MS", 2000))
+ES_GET_BUDGET_MS = float(os.getenv("ES_GET_BUDGET_MS", 1000))
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", 2))
+ES_RETRY_BACKOFF_MS = float(os.getenv("ES_RETRY_BACKOFF_MS", 25))
+# Hedged reads: a read still unanswered after ES_HEDGE_AFTER_MS (about the
+# p95 of the es stage) is sent again to other shard copies and the first
+# answer wins. 0 disables.
+ES_HEDGE_AFTER_MS = float(os.getenv("ES_HEDGE_AFTER_MS", 0))
+# Searches use the shard request cache, and are routed by a preference
+# derived from the request so a repeated query hits the same (warm) shard copies
+ES_REQUEST_CACHE = os.getenv("ES_REQUEST_CACHE", "true").lower() == "true"
+ES_PREFERENCE_ROUTING = os.getenv("ES_PREFERENCE_ROUTING", "true").lower() == "true"
 
-# Index name default
+# Retrieval backend: elasticsearch, local (in-process BM25 over the converted
+# datasets in data/, no cluster needed) or failover (Elasticsearch, switching
+# to the local engine while it is unreachable and retrying it every
+# FAILOVER_RETRY_SECONDS). Local indices live in LOCAL_INDEX_DIR and are
+# built on first use, or with `python -m scripts.build_local_index`.
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "elasticsearch")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/local-index")
+FAILOVER_RETRY_SECONDS = float(os.getenv("FAILOVER_RETRY_SECONDS", 30))
+
+# Alias the API searches; scripts/index.py moves it onto each new index version
 ELASTIC_INDEX = os.getenv("ELASTIC_INDEX", "movies")
+# Aliases of the other datasets (see app/collections.py)
+SCIFACT_INDEX = os.getenv("SCIFACT_INDEX", "scifact")
+WIKICLIR_INDEX = os.getenv("WIKICLIR_INDEX", "wikiclir-en")
+# Collections the search routes serve, and the one used without an `index`
+# parameter. Federated searches merge the per-collection lists with rrf or
+# normalize (min-max scaled scores, summed); hybrid lists are merged the same way.
+SEARCH_COLLECTIONS = [c.strip() for c in os.getenv("SEARCH_COLLECTIONS", "movies,scifact,wikiclir").split(",") if c.strip()]
+DEFAULT_COLLECTION = os.getenv("DEFAULT_COLLECTION", "movies")
+FEDERATED_MERGE = os.getenv("FEDERATED_MERGE", "rrf")
 
 # LLM settings
 LLM_MODEL_ID = os.getenv("LLM_MODEL_ID", "Qwen/Qwen2.5-0.5B-Instruct")
+# Load the LLM at startup instead of on the first /llm request
+LLM_PRELOAD = os.getenv("LLM_PRELOAD", "false").lower() == "true"
+# Inference mode: dtype is auto|fp32|bf16|fp16 (auto = fp16 on GPU, bf16 on
+# CPUs with native bf16, else fp32); quantize is none|int8 (dynamic, CPU)
+LLM_DTYPE = os.getenv("LLM_DTYPE", "auto")
+LLM_QUANTIZE = os.getenv("LLM_QUANTIZE", "none")
+
+# Model weights are loaded once in the gunicorn master before the workers
+# fork (gunicorn.conf.py), so all workers share one copy; CPU only
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "true").lower() == "true"
+
+# Startup warm-up: once its services are loaded, each worker runs
+# WARMUP_QUERY_LIMIT queries through retrieval, the reranker and the encoder
+# and LLM when loaded, and only then reports ready on /readyz. Retrieval runs
+# on the serving event loop through the async client and the query cache, like
+# a default /search request. Queries come
+# from WARMUP_QUERIES_FILE (JSONL like scripts/bench_queries.jsonl) or a
+# built-in list.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_QUERIES_FILE = os.getenv("WARMUP_QUERIES_FILE", "")
+WARMUP_QUERY_LIMIT = int(os.getenv("WARMUP_QUERY_LIMIT", 8))
+
+# Reranker settings
+RERANKER_MODEL_ID = os.getenv(
+    "RERANKER_MODEL_ID", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_DTYPE = os.getenv("RERANKER_DTYPE", "fp32")
+RERANKER_QUANTIZE = os.getenv("RERANKER_QUANTIZE", "none")
+# torch or onnx (ONNX Runtime, needs optimum[onnxruntime])
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+
+# Torch CPU threads per worker (0 = torch default, i.e. all cores)
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", 0))
+TORCH_NUM_INTEROP_THREADS = int(os.getenv("TORCH_NUM_INTEROP_THREADS", 0))
+
+# Inference executors: concurrent model calls per worker and how many more
+# may wait before requests are rejected with 503
+RERANK_CONCURRENCY = int(os.getenv("RERANK_CONCURRENCY", 8))
+RERANK_QUEUE_LIMIT = int(os.getenv("RERANK_QUEUE_LIMIT", 16))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", 16))
+
+# Cross-request micro-batching for the reranker: pairs from requests arriving
+# within RERANK_MAX_WAIT_MS share one forward pass of up to
+# RERANK_MAX_BATCH_SIZE pairs
+RERANK_BATCHING = os.getenv("RERANK_BATCHING", "true").lower() == "true"
+RERANK_MAX_BATCH_SIZE = int(os.getenv("RERANK_MAX_BATCH_SIZE", 64))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", 5))
+
+# Rerank cascade: score candidates in first-stage order, RERANK_CASCADE_CHUNK_SIZE
+# at a time, and stop once later chunks stop reaching the top
+# RERANK_CASCADE_TOP_N or first-stage scores fall below
+# RERANK_CASCADE_MIN_SCORE_RATIO x the top score. A top hit scoring
+# RERANK_CASCADE_DOMINANCE_RATIO x the runner-up limits reranking to one chunk.
+RERANK_CASCADE = os.getenv("RERANK_CASCADE", "false").lower() == "true"
+RERANK_CASCADE_CHUNK_SIZE = int(os.getenv("RERANK_CASCADE_CHUNK_SIZE", 16))
+RERANK_CASCADE_TOP_N = int(os.getenv("RERANK_CASCADE_TOP_N", 10))
+RERANK_CASCADE_MIN_SCORE_RATIO = float(os.getenv("RERANK_CASCADE_MIN_SCORE_RATIO", 0.5))
+RERANK_CASCADE_DOMINANCE_RATIO = float(os.getenv("RERANK_CASCADE_DOMINANCE_RATIO", 2.0))
+# Default per-request rerank latency budget in ms (0 = unlimited); caps the
+# number of pairs scored using the measured cost per pair
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 0))
+
+# Rerank passages precomputed at index time (scripts/index.py). The rerank
+# step fetches only the stored passage instead of the full plot from indices
+# whose mapping has the field; older indices send the plot. Set to false to
+# always build passages from the plot.
+RERANK_STORED_PASSAGES = os.getenv("RERANK_STORED_PASSAGES", "true").lower() == "true"
+# Token budget for the plot part of a rerank passage, leaving room for the
+# query, title and genres within the cross-encoder's 512-token window
+RERANK_PASSAGE_MAX_TOKENS = int(os.getenv("RERANK_PASSAGE_MAX_TOKENS", 384))
+
+# Query result cache: in-process LRU with TTL, plus an optional shared Redis
+# tier. Entries are keyed on the index version so a reindex invalidates them.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 600))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+# How often a worker re-reads the index version from Elasticsearch
+INDEX_VERSION_CHECK_SECONDS = float(os.getenv("INDEX_VERSION_CHECK_SECONDS", 10))
+
+# Offline document summaries (scripts/summarize.py), served by
+# /llm/enhanced-search with a short query-specific relevance sentence.
+# Documents without one are summarized on the fly. Empty disables the store.
+SUMMARY_STORE_PATH = os.getenv("SUMMARY_STORE_PATH", "data/summaries.sqlite")
+
+# Continuous-batching generation: sequences decoded together per step
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", 8))
+
+# Result snippets: search results carry up to SNIPPET_FRAGMENTS highlighted
+# plot fragments of ~SNIPPET_CHARS characters instead of the full plot
+SNIPPET_CHARS = int(os.getenv("SNIPPET_CHARS", 160))
+SNIPPET_FRAGMENTS = int(os.getenv("SNIPPET_FRAGMENTS", 2))
+
+# Tags: distinct tags held in memory per collection for /tags (reloaded when
+# the index version changes), facet buckets per request, and how many of the
+# most used tag filters are re-run to warm the caches of a new index version
+TAG_VOCABULARY_SIZE = int(os.getenv("TAG_VOCABULARY_SIZE", 1000))
+FACET_SIZE = int(os.getenv("FACET_SIZE", 20))
+TAG_WARM_FILTERS = int(os.getenv("TAG_WARM_FILTERS", 20))
+
+# Retrieval mode: bm25 (multi_match only) or hybrid (BM25 + kNN over document
+# embeddings, fused with reciprocal rank fusion). hybrid needs an index built
+# with `scripts/index.py --embeddings`.
+SEARCH_MODE = os.getenv("SEARCH_MODE", "bm25")
+EMBEDDING_MODEL_ID = os.getenv(
+    "EMBEDDING_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+# HNSW candidates examined per shard for the kNN part of a hybrid query
+HYBRID_NUM_CANDIDATES = int(os.getenv("HYBRID_NUM_CANDIDATES", 100))
+# Rank constant of reciprocal rank fusion: score = sum(1 / (RRF_K + rank))
+RRF_K = int(os.getenv("RRF_K", 60))
+
+# Observability: log level for the app's loggers, Server-Timing response
+# headers with per-stage durations, and OpenTelemetry spans per stage (needs
+# opentelemetry-api plus an SDK/exporter configured, e.g. via opentelemetry-instrument)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
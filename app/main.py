@@ -1,16 +1,90 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import search, llm
+from fastapi.responses import JSONResponse, Response
+from app import metrics
+from app.config import LOG_LEVEL
+from app.responses import FastJSONResponse
+from app.routes import search, llm, docs, tags
+from app.services import registry as services
+from app.services.executor import OverloadedError
 
-app = FastAPI(title="Temu Search API")
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loads and warms up in the background; /readyz flips once it is done
+    starting = asyncio.create_task(services.astartup())
+    yield
+    starting.cancel()
+    await services.shutdown()
+
+
+app = FastAPI(title="Temu Search API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"], 
+    allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Outermost, so the timings cover the whole request
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
 
 app.include_router(search.router)
 app.include_router(llm.router, prefix="/llm", tags=["LLM"])
+app.include_router(docs.router, tags=["Documents"])
+app.include_router(tags.router, tags=["Tags"])
+
+
+@app.get("/healthz", summary="Liveness probe")
+def healthz():
+    """200 while the worker is alive, including while it is still loading; 503 if its startup failed."""
+    health = services.health()
+    if health["error"] is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": health["error"]})
+    return {"status": "ok"}
+
+
+@app.get("/readyz", summary="Readiness probe")
+def readyz():
+    """200 once the worker's services are loaded and warmed up, 503 until then."""
+    health = services.health()
+    if not health["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting", "error": health["error"]})
+    return {"status": "ready", "warmup_seconds": health["warmup_seconds"]}
+
+
+@app.get("/services", summary="Load status of the shared services")
+def service_status():
+    """Report, per service, whether it is loaded, how long loading took and how much resident memory it added."""
+    return services.status()
+
+
+@app.get("/cache/stats", summary="Query cache hit/miss counters")
+def cache_stats():
+    """Hit and miss counters per cache namespace (hits, rerank, summary)."""
+    return services.get_cache().stats()
+
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Request and per-stage latency histograms, LLM token rates, service load metrics."""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
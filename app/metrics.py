@@ -0,0 +1,143 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+
+from app.config import OTEL_ENABLED, SERVER_TIMING_ENABLED
+
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+REQUEST_SECONDS = Histogram(
+    "temu_http_request_duration_seconds", "HTTP request latency until the response headers are sent",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram(
+    "temu_stage_duration_seconds", "Time spent in one stage of request processing",
+    ["stage"], buckets=_LATENCY_BUCKETS)
+RERANK_PAIRS = Counter(
+    "temu_rerank_pairs_scored", "(query, document) pairs scored by the cross-encoder")
+RETRIEVAL_FALLBACKS = Counter(
+    "temu_retrieval_fallback_requests",
+    "Retrieval requests served by the local engine because Elasticsearch was unreachable")
+ES_IN_FLIGHT = Gauge(
+    "temu_es_requests_in_flight", "Elasticsearch requests holding a pooled connection", ["client"],
+    multiprocess_mode="livesum")
+ES_POOL_CONNECTIONS = Gauge(
+    "temu_es_pool_connections", "Connections the Elasticsearch client may keep open", ["client"],
+    multiprocess_mode="livesum")
+ES_RETRIES = Counter(
+    "temu_es_retries", "Elasticsearch requests retried after a transient error", ["method"])
+ES_HEDGES = Counter(
+    "temu_es_hedged_requests", "Hedged Elasticsearch requests, sent and won by the hedge", ["outcome"])
+LLM_TOKENS = Counter("temu_llm_generated_tokens", "Tokens generated by the LLM")
+LLM_TOKENS_PER_SECOND = Histogram(
+    "temu_llm_decode_tokens_per_second", "Decode speed per generation request",
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500))
+SERVICE_LOAD_SECONDS = Gauge(
+    "temu_service_load_seconds", "Time it took to load a service", ["service"],
+    multiprocess_mode="max")
+SERVICE_RSS_DELTA_BYTES = Gauge(
+    "temu_service_rss_delta_bytes", "Resident memory added by loading a service", ["service"],
+    multiprocess_mode="max")
+EXECUTOR_PENDING = Gauge(
+    "temu_executor_pending", "Inference calls running or queued", ["executor"],
+    multiprocess_mode="livesum")
+
+# Stage timings of the current request, for the Server-Timing header. Set by
+# the middleware; copied into executor threads with the rest of the context.
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("stage_timings", default=None)
+
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("temu-search")
+    except ImportError:
+        pass
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and, inside a request, for Server-Timing."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name`; also a span when OpenTelemetry is enabled."""
+    span = _tracer.start_as_current_span(name) if _tracer is not None else nullcontext()
+    with span:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe(name, time.perf_counter() - start)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    durations = {}
+    for name, seconds in timings:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
+
+
+def route_label(scope) -> str:
+    """Path template of the matched route (bounded label values, unlike raw paths)."""
+    # Newer FastAPI versions put the inner route of an included router in
+    # scope["route"], without the router prefix
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: times each HTTP request, and adds a
+    `Server-Timing` header with the stages recorded while handling it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                REQUEST_SECONDS.labels(scope["method"], route_label(scope), message["status"]).observe(elapsed)
+                if SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings, elapsed).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition of all metrics; aggregates across workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
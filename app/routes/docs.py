@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List
+from app.collections import Collection
+from app.responses import FastJSONResponse
+from app.routes.params import document_collection, document_fields, split_values
+from app.services.retrieval_service import RetrievalService
+from app.services.registry import get_retrieval
+
+router = APIRouter()
+
+
+@router.get("/documents/{doc_id}", summary="Fetch one full document")
+async def get_document(
+    doc_id: str,
+    collection: Collection = Depends(document_collection),
+    fields: List[str] = Depends(document_fields),
+    retrieval: RetrievalService = Depends(get_retrieval)
+):
+    """Return the full document (including the complete plot or text) for a search result."""
+    docs = await retrieval.aget_documents([doc_id], fields, collection)
+    if not docs:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    return FastJSONResponse(docs[0])
+
+
+@router.get("/documents", summary="Fetch several full documents")
+async def get_documents(
+    ids: List[str] = Query(..., min_length=1, max_length=100, description="Document ids (repeated or comma-separated)"),
+    collection: Collection = Depends(document_collection),
+    fields: List[str] = Depends(document_fields),
+    retrieval: RetrievalService = Depends(get_retrieval)
+):
+    """
+    Return full documents for up to 100 ids in one Elasticsearch mget, in
+    the order requested. Ids that do not exist are left out.
+    """
+    ids = split_values(ids)
+    if len(ids) > 100:
+        raise HTTPException(status_code=422, detail="At most 100 ids per request")
+    docs = await retrieval.aget_documents(ids, fields, collection)
+    return FastJSONResponse({"docs": docs})
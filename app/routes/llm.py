@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Query
-from typing import Optional, List
-from app.services.retrieval_service import RetrievalService
+from fastapi import APIRouter, Depends, Query
+from typing import Literal, Optional, List
+from app.collections import TEXT_FIELDS, Collection, get_collection
+from app.config import SEARCH_MODE, RERANK_CASCADE, FEDERATED_MERGE
+from app.responses import FastJSONResponse
+from app.routes.params import result_fields, search_collections
+from app.services.retrieval_service import RetrievalService, select_fields
 from app.services.reranker_service import RerankerService
 from app.services.llm_service import LLMService
+from app.services.cache import SUMMARY, QueryCache, make_key, normalize_query
+from app.services.executor import InferenceExecutor
+from app.services.streaming import EventStreamResponse, TextStream, sse
+from app.services.summary_store import SummaryStore, relevance_sentence, text_hash
+from app.services.registry import (
+    get_retrieval, get_reranker, get_llm, get_rerank_executor, get_llm_executor, get_cache,
+    get_summaries, embed_query
+)
 from pydantic import BaseModel, Field
 
 router = APIRouter()
-retrieval = RetrievalService()
-reranker = RerankerService()
-llm_service = LLMService()
 
 
 @router.get("/generate", summary="Generate text using LLM")
@@ -17,7 +26,11 @@ async def generate_text(
     max_length: int = Query(default=512, ge=1, le=2048,
                             description="Maximum length of generated text"),
     temperature: float = Query(
-        default=0.7, ge=0.1, le=2.0, description="Temperature for text generation")
+        default=0.7, ge=0.1, le=2.0, description="Temperature for text generation"),
+    stream: bool = Query(
+        default=False, description="Stream tokens as Server-Sent Events while they are generated"),
+    llm_service: LLMService = Depends(get_llm),
+    llm_executor: InferenceExecutor = Depends(get_llm_executor)
 ):
     """
     Generate text using the LLM model.
@@ -26,8 +39,28 @@ async def generate_text(
     - prompt: Text prompt to generate from
     - max_length: Maximum length of generated text (1-2048)
     - temperature: Controls randomness (0.1-2.0, lower is more deterministic)
+    - stream: If true, respond with `text/event-stream`: one `token` event per
+      decoded piece of text, then a `done` event with the full `generated_text`.
+      Generation stops when the client disconnects.
     """
-    generated_text = llm_service.generate(
+    if stream:
+        text_stream = TextStream(
+            llm_executor,
+            llm_service.generate,
+            prompt=prompt,
+            max_length=max_length,
+            temperature=temperature
+        )
+
+        async def events():
+            async for text in text_stream:
+                yield sse("token", {"text": text})
+            yield sse("done", {"generated_text": text_stream.result})
+
+        return EventStreamResponse(events(), text_stream)
+
+    generated_text = await llm_executor.run(
+        llm_service.generate,
         prompt=prompt,
         max_length=max_length,
         temperature=temperature
@@ -35,6 +68,12 @@ async def generate_text(
     return {"generated_text": generated_text}
 
 
+def _generate_summary(query, results, **kwargs):
+    # Runs on the LLM executor; the model is only loaded once a summary
+    # has to be generated, not for requests the summary store answers
+    return get_llm().enhance_search_results(query, results, **kwargs)
+
+
 @router.get("/enhanced-search", summary="Search with LLM enhancement and optional reranking")
 async def enhanced_search(
     query: str = Query(..., min_length=1, description="Search query text"),
@@ -45,7 +84,25 @@ async def enhanced_search(
     final_top_k: int = Query(
         default=30, ge=1, le=50, description="Number of results to return after potential reranking"),
     tags: Optional[List[str]] = Query(
-        default=None, description="Optional list of tags to filter results")
+        default=None, description="Optional list of tags to filter results"),
+    mode: Literal["bm25", "hybrid"] = Query(
+        default=SEARCH_MODE, description="First-stage retrieval: BM25 only, or BM25 + kNN fused with RRF"),
+    cascade: bool = Query(
+        default=RERANK_CASCADE, description="Rerank in first-stage order and stop once later candidates stop mattering"),
+    rerank_budget_ms: Optional[float] = Query(
+        default=None, gt=0, description="Latency budget for reranking; caps the number of pairs scored"),
+    stream: bool = Query(
+        default=False, description="Send results first, then stream the summary as Server-Sent Events"),
+    collections: List[Collection] = Depends(search_collections),
+    merge: Literal["rrf", "normalize"] = Query(
+        default=FEDERATED_MERGE, description="How result lists of several collections (or hybrid mode) are merged"),
+    fields: List[str] = Depends(result_fields),
+    retrieval: RetrievalService = Depends(get_retrieval),
+    reranker: RerankerService = Depends(get_reranker),
+    rerank_executor: InferenceExecutor = Depends(get_rerank_executor),
+    llm_executor: InferenceExecutor = Depends(get_llm_executor),
+    cache: QueryCache = Depends(get_cache),
+    summaries: SummaryStore = Depends(get_summaries)
 ):
     """
     Search using Elasticsearch, optionally rerank, and enhance results with LLM summary.
@@ -54,7 +111,11 @@ async def enhanced_search(
     1. Retrieves initial results using Elasticsearch (BM25) - controlled by `initial_top_k`.
     2. If `apply_rerank` is true, reranks the initial results using a neural cross-encoder model.
     3. Returns the top `final_top_k` results.
-    4. Generates an LLM summary based on the (potentially reranked) top result(s).
+    4. Summarizes the (potentially reranked) top result: its precomputed
+       summary from the summary store (scripts/summarize.py) followed by a
+       sentence on why it matches the query, or an LLM summary generated
+       for the query when the store has none made from the document's
+       current title and text. The LLM is only loaded to generate.
 
     Parameters:
     - query: Search query text
@@ -62,36 +123,120 @@ async def enhanced_search(
     - apply_rerank: Whether to apply reranking (defaults to True)
     - final_top_k: Number of results to return after reranking (1-50, default 30)
     - tags: Optional list of tags to filter results
+    - mode: `bm25` or `hybrid` first-stage retrieval (defaults to SEARCH_MODE)
+    - cascade / rerank_budget_ms: Rerank cascade and latency budget, as on `/search`
+    - index / merge: Collection(s) to search and how federated results are merged, as on `/search`
+    - fields: Result fields to return, as on `/search` (snippets, no full plots by default)
+    - stream: If true, respond with `text/event-stream`: a `results` event as
+      soon as retrieval and reranking finish, one `token` event per piece of
+      summary text, then a `done` event with the final `summary` and `summary_source`.
 
     Returns:
     - results: List of search results, potentially reranked.
-    - summary: LLM-generated summary of the top result(s).
+    - summary: Summary of the top result.
+    - summary_source: `store` (precomputed), `generated` (by the LLM for this query) or `cache`.
+    - rerank_stats: Pairs scored and cascade details, when reranking was applied.
     """
+    # Cached hits, rerank scores and summaries are keyed on the index version
+    index_version = await retrieval.aindex_version(collections)
+
+    query_vector = None
+    if mode == "hybrid":
+        query_vector = await rerank_executor.run(embed_query, query, cache=cache)
+
+    # Full plots / texts are only fetched when asked for
+    with_plot = bool(TEXT_FIELDS & set(fields))
+
     # Get initial results
-    initial_results = retrieval.search(
+    initial_results = await retrieval.asearch(
         query=query,
         top_k=initial_top_k,
-        tags=tags
+        tags=tags,
+        for_rerank=apply_rerank,
+        query_vector=query_vector,
+        snippets="snippet" in fields,
+        with_plot=with_plot,
+        collections=collections,
+        merge=merge,
+        cache=cache,
+        cache_scope=index_version
     )
 
     processed_results = initial_results
+    rerank_stats = None
 
     # Apply reranking if enabled and results exist
     if apply_rerank and initial_results:
-        processed_results = reranker.rerank(
+        processed_results, rerank_stats = await rerank_executor.run(
+            reranker.rerank_with_stats,
             query=query,
             results=initial_results,
-            top_k=final_top_k  # Reranker returns the final desired number of results
+            top_k=final_top_k,  # Reranker returns the final desired number of results
+            cache=cache,
+            cache_scope=index_version,
+            cascade=cascade,
+            budget_ms=rerank_budget_ms
         )
     elif initial_results:  # If not reranking, but have results, take the top final_top_k
         processed_results = initial_results[:final_top_k]
     else:  # No initial results
         processed_results = []
 
-    # Generate summary using LLM based on the processed (reranked or sliced) results
-    summary = llm_service.enhance_search_results(query, processed_results)
+    # Generate summary using LLM based on the processed (reranked or sliced) results.
+    # The summary depends only on the query and the top result.
+    top_result = processed_results[0] if processed_results else {}
+    summary_key = make_key(
+        index_version, normalize_query(query), top_result.get("collection"), top_result.get("doc_id"))
+    summary = await cache.aget(SUMMARY, summary_key)
+    summary_source = "cache"
+
+    # Plots are only loaded for the hits that survived reranking, and only
+    # for the top hit when the response itself leaves them out
+    if with_plot:
+        processed_results = await retrieval.ahydrate(processed_results)
+    elif summary is None and processed_results:
+        await retrieval.ahydrate(processed_results[:1])
+
+    if summary is None and top_result:
+        # One indexed SQLite read, cheap enough for the event loop. Only
+        # served if made from the title and body the index has now.
+        collection = get_collection(top_result["collection"])
+        stored = summaries.get(collection.name, top_result["doc_id"], text_hash(collection, top_result))
+        if stored is not None:
+            summary = f"{stored} {relevance_sentence(query, top_result, stored)}"
+            summary_source = "store"
+    if summary is None:
+        summary_source = "generated"
+
+    selected = select_fields(processed_results, fields)
+
+    if stream:
+        text_stream = None
+        if summary is None:
+            text_stream = TextStream(llm_executor, _generate_summary, query, processed_results)
+
+        async def events():
+            yield sse("results", {"results": selected, "rerank_stats": rerank_stats})
+            if text_stream is None:
+                yield sse("done", {"summary": summary, "summary_source": summary_source})
+                return
+            async for text in text_stream:
+                yield sse("token", {"text": text})
+            final_summary = text_stream.result
+            await cache.aset(SUMMARY, summary_key, final_summary)
+            yield sse("done", {"summary": final_summary, "summary_source": summary_source})
+
+        return EventStreamResponse(events(), text_stream)
+
+    if summary is None:
+        summary = await llm_executor.run(_generate_summary, query, processed_results)
+        await cache.aset(SUMMARY, summary_key, summary)
 
-    return {
-        "results": processed_results,
-        "summary": summary
+    response = {
+        "results": selected,
+        "summary": summary,
+        "summary_source": summary_source
     }
+    if rerank_stats is not None:
+        response["rerank_stats"] = rerank_stats
+    return FastJSONResponse(response)
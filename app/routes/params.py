@@ -0,0 +1,69 @@
+"""
+Query-parameter dependencies shared by the routers: result fields, the
+collections to search, and the collection and fields of document fetches.
+"""
+from fastapi import Depends, HTTPException, Query
+from typing import Optional, List
+from app.collections import Collection, enabled_collections
+from app.config import DEFAULT_COLLECTION
+from app.services.retrieval_service import RESULT_FIELDS, DEFAULT_RESULT_FIELDS
+
+
+def split_values(values: Optional[List[str]]) -> List[str]:
+    return [f.strip() for value in values or [] for f in value.split(",") if f.strip()]
+
+
+def result_fields(
+    fields: Optional[List[str]] = Query(
+        default=None,
+        description="Fields to return per result, comma-separated or repeated "
+                    f"({', '.join(sorted(RESULT_FIELDS))}). Defaults to "
+                    f"{', '.join(DEFAULT_RESULT_FIELDS)}; add `plot` for full plots.")
+) -> List[str]:
+    """Dependency parsing the `fields` parameter of the search endpoints."""
+    selected = split_values(fields)
+    if not selected:
+        return DEFAULT_RESULT_FIELDS
+    unknown = set(selected) - RESULT_FIELDS - {"doc_id"}
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def _collection(name: str) -> Collection:
+    for collection in enabled_collections():
+        if collection.name == name:
+            return collection
+    names = ", ".join(c.name for c in enabled_collections())
+    raise HTTPException(status_code=422, detail=f"Unknown index: {name} (available: {names})")
+
+
+def search_collections(
+    index: Optional[List[str]] = Query(
+        default=None,
+        description="Collections to search, comma-separated or repeated, or `all`. Several "
+                    f"collections are searched together and merged (federated). Defaults to {DEFAULT_COLLECTION}.")
+) -> List[Collection]:
+    """Dependency parsing the `index` parameter of the search endpoints."""
+    names = split_values(index)
+    if "all" in names or "*" in names:
+        return enabled_collections()
+    return [_collection(name) for name in dict.fromkeys(names or [DEFAULT_COLLECTION])]
+
+
+def document_collection(
+    index: str = Query(default=DEFAULT_COLLECTION, description="Collection the document belongs to")
+) -> Collection:
+    return _collection(index)
+
+
+def document_fields(
+    fields: Optional[List[str]] = Query(
+        default=None, description="Document fields to return, e.g. title,plot; default all"),
+    collection: Collection = Depends(document_collection)
+) -> List[str]:
+    selected = split_values(fields)
+    unknown = set(selected) - set(collection.document_fields)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return selected or collection.document_fields
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Query
-from typing import Optional, List
-from app.services.retrieval_service import RetrievalService
+import asyncio
+from fastapi import APIRouter, Depends, Query
+from typing import Literal, Optional, List
+from app.collections import TEXT_FIELDS, Collection
+from app.config import SEARCH_MODE, RERANK_CASCADE, FEDERATED_MERGE
+from app.responses import FastJSONResponse
+from app.routes.params import result_fields, search_collections
+from app.services.retrieval_service import RetrievalService, select_fields
 from app.services.reranker_service import RerankerService
+from app.services.cache import QueryCache
+from app.services.executor import InferenceExecutor
+from app.services.tag_service import TagService
+from app.services.registry import (
+    get_retrieval, get_reranker, get_rerank_executor, get_cache, get_tags, embed_query
+)
 from pydantic import BaseModel, Field
 
 router = APIRouter()
-retrieval = RetrievalService()
-reranker = RerankerService()
 
 
 @router.get("/search", summary="Search movies with reranking")
@@ -19,10 +28,27 @@ async def search(
     rerank: bool = Query(
         default=True, description="Whether to apply reranking to results"),
     rerank_top_k: int = Query(
-        default=25, ge=1, le=100, description="Number of results to return after reranking")
+        default=25, ge=1, le=100, description="Number of results to return after reranking"),
+    mode: Literal["bm25", "hybrid"] = Query(
+        default=SEARCH_MODE, description="First-stage retrieval: BM25 only, or BM25 + kNN fused with RRF"),
+    cascade: bool = Query(
+        default=RERANK_CASCADE, description="Rerank in first-stage order and stop once later candidates stop mattering"),
+    rerank_budget_ms: Optional[float] = Query(
+        default=None, gt=0, description="Latency budget for reranking; caps the number of pairs scored"),
+    collections: List[Collection] = Depends(search_collections),
+    merge: Literal["rrf", "normalize"] = Query(
+        default=FEDERATED_MERGE, description="How result lists of several collections (or hybrid mode) are merged"),
+    fields: List[str] = Depends(result_fields),
+    facets: bool = Query(
+        default=False, description="Also return tag counts over all documents matching the query"),
+    retrieval: RetrievalService = Depends(get_retrieval),
+    reranker: RerankerService = Depends(get_reranker),
+    rerank_executor: InferenceExecutor = Depends(get_rerank_executor),
+    cache: QueryCache = Depends(get_cache),
+    tag_service: TagService = Depends(get_tags)
 ):
     """
-    Search for movies using Elasticsearch with neural reranking.
+    Search for movies (or the other collections) using Elasticsearch with neural reranking.
 
     The search process:
     1. Retrieves initial results using Elasticsearch (BM25) - default 100 results
@@ -35,23 +61,87 @@ async def search(
     - tags: Optional list of tags to filter results
     - rerank: Whether to apply reranking (defaults to True)
     - rerank_top_k: Number of results to return after reranking (1-100, default 100)
+    - mode: `bm25` or `hybrid` (BM25 and dense kNN fused with reciprocal rank
+      fusion; better recall, so smaller `top_k` values work). Defaults to SEARCH_MODE.
+    - cascade: Score candidates in chunks and stop early (defaults to RERANK_CASCADE)
+    - rerank_budget_ms: Cap reranking at roughly this many milliseconds
+      (defaults to RERANK_BUDGET_MS); unscored results keep their first-stage order
+    - index: Collection(s) to search (movies, scifact, wikiclir or `all`;
+      defaults to DEFAULT_COLLECTION). With several, one msearch queries them
+      all and the lists are merged before a single rerank pass.
+    - merge: `rrf` or `normalize` (min-max scaled scores), defaults to FEDERATED_MERGE
+    - fields: Result fields to return. By default results carry a highlighted
+      plot `snippet` instead of the full `plot`; request `plot` explicitly or
+      fetch full documents from `/documents`.
+    - facets: Add `facets.tags`, the most frequent tags among all matches
+      (computed alongside the search; use `/browse` for tag-only listing)
 
     Returns:
     - results: List of search results, reranked by default for better relevance
+    - rerank_stats: Candidates, pairs scored by the cross-encoder, cache hits
+      and why the cascade stopped (only when reranking)
+    - facets: Tag counts (only with `facets=true`)
     """
-    # Get initial results
-    results = retrieval.search(
-        query=query,
-        top_k=top_k,
-        tags=tags
-    )
-
-    # Apply reranking if enabled (default is True)
-    if rerank and results:
-        results = reranker.rerank(
+    # Cached hits and rerank scores are keyed on the index version
+    index_version = await retrieval.aindex_version(collections)
+    await tag_service.aobserve(collections, tags)
+
+    # Facet counts run concurrently with retrieval and reranking
+    facet_task = None
+    if facets:
+        facet_task = asyncio.create_task(
+            tag_service.afacets(query, tags, collections, cache=cache, cache_scope=index_version))
+
+    try:
+        # Query embeddings are cached too; the encoder runs on the inference pool
+        query_vector = None
+        if mode == "hybrid":
+            query_vector = await rerank_executor.run(embed_query, query, cache=cache)
+
+        # Full plots / texts are only fetched when asked for
+        with_plot = bool(TEXT_FIELDS & set(fields))
+
+        # Get initial results
+        results = await retrieval.asearch(
             query=query,
-            results=results,
-            top_k=rerank_top_k
+            top_k=top_k,
+            tags=tags,
+            for_rerank=rerank,
+            query_vector=query_vector,
+            snippets="snippet" in fields,
+            with_plot=with_plot,
+            collections=collections,
+            merge=merge,
+            cache=cache,
+            cache_scope=index_version
         )
 
-    return {"results": results}
+        # Apply reranking if enabled (default is True)
+        if rerank and results:
+            results, rerank_stats = await rerank_executor.run(
+                reranker.rerank_with_stats,
+                query=query,
+                results=results,
+                top_k=rerank_top_k,
+                cache=cache,
+                cache_scope=index_version,
+                cascade=cascade,
+                budget_ms=rerank_budget_ms
+            )
+            if with_plot:
+                # Plots are only loaded for the hits that survived reranking
+                results = await retrieval.ahydrate(results)
+            response = {"results": select_fields(results, fields), "rerank_stats": rerank_stats}
+        else:
+            response = {"results": select_fields(results, fields)}
+
+        if facet_task is not None:
+            response["facets"] = await facet_task
+    finally:
+        # Retrieval or reranking failed before the facets were awaited
+        if facet_task is not None and not facet_task.done():
+            facet_task.cancel()
+        elif facet_task is not None and not facet_task.cancelled():
+            # Marks a failed facet search as retrieved
+            facet_task.exception()
+    return FastJSONResponse(response)
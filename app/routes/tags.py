@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from app.collections import TEXT_FIELDS, Collection
+from app.responses import FastJSONResponse
+from app.routes.params import document_collection, result_fields
+from app.services.cache import QueryCache
+from app.services.retrieval_service import RetrievalService, select_fields
+from app.services.tag_service import TagService
+from app.services.registry import get_retrieval, get_tags, get_cache
+
+router = APIRouter()
+
+
+def tagged_collection(collection: Collection = Depends(document_collection)) -> Collection:
+    if not collection.tag_field:
+        raise HTTPException(status_code=422, detail=f"Collection {collection.name} has no tags")
+    return collection
+
+
+@router.get("/tags", summary="List the tags of a collection")
+async def list_tags(
+    prefix: Optional[str] = Query(default=None, description="Only tags starting with this text"),
+    limit: int = Query(default=100, ge=1, le=1000, description="Number of tags to return"),
+    collection: Collection = Depends(tagged_collection),
+    tag_service: TagService = Depends(get_tags)
+):
+    """
+    Tags with their document counts, most frequent first.
+
+    Served from an in-process copy of the vocabulary that is reloaded when
+    the index version changes, so this does not query Elasticsearch.
+    """
+    vocabulary = await tag_service.avocabulary(collection)
+    tags = vocabulary.items()
+    if prefix:
+        prefix = prefix.lower()
+        tags = [(tag, count) for tag, count in tags if tag.lower().startswith(prefix)]
+    return FastJSONResponse({
+        "total": len(vocabulary),
+        "tags": [{"tag": tag, "count": count} for tag, count in list(tags)[:limit]],
+    })
+
+
+@router.get("/browse", summary="Browse documents by tag")
+async def browse(
+    tags: List[str] = Query(..., description="Tags to browse; documents with any of them match"),
+    offset: int = Query(default=0, ge=0, le=10000, description="Results to skip"),
+    limit: int = Query(default=25, ge=1, le=100, description="Results per page"),
+    facets: bool = Query(default=False, description="Also count the tags of the matching documents"),
+    collection: Collection = Depends(tagged_collection),
+    fields: List[str] = Depends(result_fields),
+    tag_service: TagService = Depends(get_tags),
+    retrieval: RetrievalService = Depends(get_retrieval),
+    cache: QueryCache = Depends(get_cache)
+):
+    """
+    Page through the documents of a tag without a search query.
+
+    A filter-only request: no BM25 scoring and no reranking, and the tag
+    filter is served from Elasticsearch's filter cache. Results come in
+    index order with `score` null. `total` counts all matching documents.
+    """
+    index_version = await retrieval.aindex_version([collection])
+    await tag_service.aobserve([collection], tags)
+    page = await tag_service.abrowse(
+        tags, collection, offset=offset, limit=limit, facets=facets,
+        with_plot=bool(TEXT_FIELDS & set(fields)), cache=cache, cache_scope=index_version)
+    page["results"] = select_fields(page["results"], fields)
+    return FastJSONResponse(page)
@@ -0,0 +1,145 @@
+"""
+Retrieval backends: the clients RetrievalService (and through it
+TagService) send Elasticsearch requests to, chosen by RETRIEVAL_BACKEND.
+
+Every backend offers the same surface, the part of the Elasticsearch
+client the services use: `search`, `msearch`, `mget`,
+`indices.get_mapping` and `close`, with Elasticsearch-shaped responses.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from elasticsearch import ConnectionError, ConnectionTimeout
+
+from app import metrics
+from app.collections import enabled_collections
+from app.config import RETRIEVAL_BACKEND, LOCAL_INDEX_DIR, FAILOVER_RETRY_SECONDS
+from app.services.es_client import IndicesNamespace, create_api_clients, resolve_method
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("elasticsearch", "local", "failover")
+
+# Raised by the client when the cluster cannot be reached at all (after its
+# retries), as opposed to errors Elasticsearch itself answers with
+UNREACHABLE = (ConnectionError, ConnectionTimeout)
+
+
+class _LocalEngine:
+    """The local engine, opened (and its indices built) on first use."""
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._engine is None:
+            from app.services.local_search import LocalSearchEngine
+
+            with self._lock:
+                if self._engine is None:
+                    self._engine = LocalSearchEngine.open(enabled_collections(), LOCAL_INDEX_DIR)
+        return self._engine
+
+    def close(self):
+        # Shared by the sync and async clients, so closed once by whichever comes first
+        with self._lock:
+            if self._engine is not None:
+                self._engine.close()
+                self._engine = None
+
+
+class FailoverClient:
+    """
+    Sends requests to Elasticsearch; when it is unreachable, to the local
+    engine instead, and keeps doing so for `retry_seconds` before trying
+    Elasticsearch again. Errors Elasticsearch answers with are raised as usual.
+    """
+
+    def __init__(self, primary, fallback: _LocalEngine, retry_seconds: float = FAILOVER_RETRY_SECONDS):
+        self.primary = primary
+        self.fallback = fallback
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+        self.indices = IndicesNamespace(self)
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    def _failed(self, method: str, exc: Exception):
+        if not self.degraded:
+            logger.warning("elasticsearch unreachable, serving from the local engine for %.0fs: %s %s",
+                           self.retry_seconds, method, exc)
+        self._down_until = time.monotonic() + self.retry_seconds
+
+    def _call(self, method: str, **kwargs):
+        if not self.degraded:
+            try:
+                return resolve_method(self.primary, method)(**kwargs)
+            except UNREACHABLE as exc:
+                self._failed(method, exc)
+        metrics.RETRIEVAL_FALLBACKS.inc()
+        return resolve_method(self.fallback.get(), method)(**kwargs)
+
+    def search(self, **kwargs):
+        return self._call("search", **kwargs)
+
+    def msearch(self, **kwargs):
+        return self._call("msearch", **kwargs)
+
+    def mget(self, **kwargs):
+        return self._call("mget", **kwargs)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+class AsyncFailoverClient(FailoverClient):
+    """Async variant of FailoverClient, over AsyncElasticsearch."""
+
+    async def _call(self, method: str, **kwargs):
+        if not self.degraded:
+            try:
+                return await resolve_method(self.primary, method)(**kwargs)
+            except UNREACHABLE as exc:
+                self._failed(method, exc)
+        metrics.RETRIEVAL_FALLBACKS.inc()
+        # Opening the engine may build its indices: keep that off the event loop
+        engine = await asyncio.to_thread(self.fallback.get)
+        return await asyncio.to_thread(resolve_method(engine, method), **kwargs)
+
+    async def search(self, **kwargs):
+        return await self._call("search", **kwargs)
+
+    async def msearch(self, **kwargs):
+        return await self._call("msearch", **kwargs)
+
+    async def mget(self, **kwargs):
+        return await self._call("mget", **kwargs)
+
+    async def close(self):
+        await self.primary.close()
+        self.fallback.close()
+
+
+def create_clients(backend: str = RETRIEVAL_BACKEND):
+    """The sync and async clients of a backend, as (client, async client)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown RETRIEVAL_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "local":
+        from app.services.local_search import AsyncLocalSearchEngine, LocalSearchEngine
+
+        engine = LocalSearchEngine.open(enabled_collections(), LOCAL_INDEX_DIR)
+        return engine, AsyncLocalSearchEngine(engine)
+
+    # The async client is used by the routes so ES round trips never block the event loop
+    es, aes = create_api_clients()
+    if backend == "elasticsearch":
+        return es, aes
+    # One engine for both, so indices are opened once
+    fallback = _LocalEngine()
+    return FailoverClient(es, fallback), AsyncFailoverClient(aes, fallback)
@@ -0,0 +1,117 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+
+
+class _Request:
+    __slots__ = ("items", "future")
+
+    def __init__(self, items: Sequence[Any]):
+        self.items = items
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    Collects scoring work from concurrent callers into shared forward passes.
+
+    Callers `submit()` a list of items and get back a future of their scores.
+    A single worker thread takes the first waiting request, keeps collecting
+    more for up to `max_wait_ms` or until `max_batch_size` items are queued,
+    then scores all of them in one `predict_fn` call. Items are sorted by
+    `length_fn` first so each padded batch holds inputs of similar length.
+    """
+
+    def __init__(self, predict_fn: Callable[[List[Any]], Sequence[float]],
+                 max_batch_size: int, max_wait_ms: float,
+                 length_fn: Callable[[Any], int] = len, name: str = "batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.length_fn = length_fn
+        self._queue: "queue.Queue[_Request | None]" = queue.Queue()
+        # Guards `_closed`, so nothing is queued behind the close sentinel
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items: Sequence[Any]) -> Future:
+        request = _Request(items)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Micro-batcher is closed")
+            if not items:
+                request.future.set_result([])
+            else:
+                self._queue.put(request)
+        return request.future
+
+    def close(self):
+        """Score what is already queued, then stop; later `submit` calls raise RuntimeError."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        size = len(first.items)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Finish the current batch, then let the loop see the sentinel
+                self._queue.put(None)
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            try:
+                self._run(batch)
+            except Exception as exc:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(exc)
+
+    def _run(self, batch: List[_Request]):
+        # Drop requests whose callers already gave up
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        owners = []
+        items = []
+        for request_index, request in enumerate(batch):
+            for item_index, item in enumerate(request.items):
+                owners.append((request_index, item_index))
+                items.append(item)
+
+        order = sorted(range(len(items)), key=lambda i: self.length_fn(items[i]))
+        sorted_scores = self.predict_fn([items[i] for i in order])
+
+        results = [[0.0] * len(request.items) for request in batch]
+        for position, score in zip(order, sorted_scores):
+            request_index, item_index = owners[position]
+            results[request_index][item_index] = score
+
+        for request, scores in zip(batch, results):
+            request.future.set_result(scores)
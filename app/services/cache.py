@@ -0,0 +1,204 @@
+import asyncio
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import (
+    CACHE_ENABLED, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_REDIS_URL,
+)
+
+# Cache namespaces: first-stage hits, per (query, doc_id) rerank scores,
+# LLM summaries, query embeddings and facet counts are stored and counted separately.
+HITS = "hits"
+RERANK = "rerank"
+SUMMARY = "summary"
+EMBEDDING = "embedding"
+FACETS = "facets"
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def make_key(*parts: Any) -> str:
+    """Build a stable string key; list/tuple parts are sorted so tag order does not matter."""
+    normalized = []
+    for part in parts:
+        if isinstance(part, (list, tuple, set)):
+            part = sorted(part)
+        normalized.append(part)
+    return json.dumps(normalized, separators=(",", ":"), default=str)
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        # Callers mutate what they get back (e.g. rerank adds scores)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any) -> None:
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    """Shared cache tier backed by Redis, storing JSON-encoded values."""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "temu:"):
+        import redis
+        self.client = redis.Redis.from_url(
+            url, socket_timeout=0.05, socket_connect_timeout=0.2)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        try:
+            values = self.client.mget([self.prefix + key for key in keys])
+        except Exception:
+            # The shared tier is best-effort; a Redis hiccup is just a miss
+            return [None] * len(keys)
+        return [json.loads(v) if v is not None else None for v in values]
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+            pipe.execute()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class QueryCache:
+    """
+    Two-tier cache for query results: an in-process LRU in front of an
+    optional shared Redis tier. Hit/miss counters are kept per namespace.
+
+    Keys should include the index version (see
+    `RetrievalService.aindex_version`) so a reindex invalidates every entry.
+    """
+
+    def __init__(self, local: TTLCache, shared: Optional[RedisCache] = None):
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, hits: int, misses: int) -> None:
+        with self._lock:
+            counter = self.counters.setdefault(namespace, {"hits": 0, "misses": 0})
+            counter["hits"] += hits
+            counter["misses"] += misses
+
+    def get_many(self, namespace: str, keys: Sequence[str]) -> List[Optional[Any]]:
+        values = [self.local.get(f"{namespace}:{key}") for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and self.shared is not None:
+            shared_values = self.shared.get_many(
+                [f"{namespace}:{keys[i]}" for i in missing])
+            for i, value in zip(missing, shared_values):
+                if value is not None:
+                    values[i] = value
+                    self.local.set(f"{namespace}:{keys[i]}", value)
+        found = sum(value is not None for value in values)
+        self._count(namespace, found, len(values) - found)
+        return values
+
+    def set_many(self, namespace: str, items: Dict[str, Any]) -> None:
+        for key, value in items.items():
+            self.local.set(f"{namespace}:{key}", value)
+        if self.shared is not None:
+            self.shared.set_many(
+                {f"{namespace}:{key}": value for key, value in items.items()})
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        return self.get_many(namespace, [key])[0]
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        self.set_many(namespace, {key: value})
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        """Like `get`, but a round trip to the shared tier runs off the event loop."""
+        if self.shared is None:
+            return self.get(namespace, key)
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any) -> None:
+        if self.shared is None:
+            self.set(namespace, key, value)
+        else:
+            await asyncio.to_thread(self.set, namespace, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counter in self.counters.items():
+            total = counter["hits"] + counter["misses"]
+            namespaces[namespace] = {
+                **counter,
+                "hit_rate": round(counter["hits"] / total, 4) if total else 0.0,
+            }
+        return {
+            "local_entries": len(self.local),
+            "shared": self.shared is not None,
+            "namespaces": namespaces,
+        }
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def close(self) -> None:
+        if self.shared is not None:
+            self.shared.close()
+
+
+class NullCache(QueryCache):
+    """Stand-in used when CACHE_ENABLED is false: every lookup misses."""
+
+    def __init__(self):
+        super().__init__(TTLCache(0, 0))
+
+    def get_many(self, namespace: str, keys: Sequence[str]) -> List[Optional[Any]]:
+        return [None] * len(keys)
+
+    def set_many(self, namespace: str, items: Dict[str, Any]) -> None:
+        pass
+
+
+def create_cache() -> QueryCache:
+    if not CACHE_ENABLED:
+        return NullCache()
+    shared = RedisCache(CACHE_REDIS_URL, CACHE_TTL_SECONDS) if CACHE_REDIS_URL else None
+    return QueryCache(TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS), shared)
@@ -0,0 +1,50 @@
+import logging
+from typing import List, Optional
+
+from app import metrics
+from app.config import EMBEDDING_MODEL_ID, EMBEDDING_BATCH_SIZE
+from app.services.inference import configure_threads, load_sentence_encoder
+from app.services.cache import EMBEDDING, QueryCache, make_key, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_text(title: str, plot: str) -> str:
+    """Text a document is embedded by; the encoder truncates it to its own window."""
+    return f"{title}\n{plot or ''}"
+
+
+def load_embedding_model():
+    return load_sentence_encoder(EMBEDDING_MODEL_ID)
+
+
+class EmbeddingService:
+    def __init__(self):
+        """Load the sentence encoder used for hybrid retrieval."""
+        logger.info("loading embedding model model=%s", EMBEDDING_MODEL_ID)
+        configure_threads()
+        self.model = load_embedding_model()
+        # Renamed in newer sentence-transformers releases
+        get_dims = getattr(self.model, "get_embedding_dimension", None) or self.model.get_sentence_embedding_dimension
+        self.dims = get_dims()
+        logger.info("embedding model loaded dims=%d", self.dims)
+
+    def encode(self, texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+        """Embed texts in batches; vectors are L2-normalized so cosine and dot product agree."""
+        vectors = self.model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_query(self, query: str, cache: Optional[QueryCache] = None) -> List[float]:
+        """Embed a search query, reusing the cached vector for repeated queries."""
+        if cache is not None:
+            key = make_key(EMBEDDING_MODEL_ID, normalize_query(query))
+            vector = cache.get(EMBEDDING, key)
+            if vector is not None:
+                return vector
+        with metrics.stage("embed"):
+            vector = self.encode([query])[0]
+        if cache is not None:
+            cache.set(EMBEDDING, key, vector)
+        return vector
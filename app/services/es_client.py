@@ -0,0 +1,270 @@
+"""
+Elasticsearch clients of the API and the scripts.
+
+`create_client` and `create_async_client` build clients for ELASTIC_HOST
+with ES_CONNECTIONS_PER_NODE pooled connections per node and compressed
+bodies, so connections are reused instead of churned under load.
+
+The API talks to Elasticsearch through `ResilientClient` /
+`AsyncResilientClient` (see `create_api_clients`), which add to the reads:
+
+- a latency budget per request (ES_SEARCH_BUDGET_MS for searches,
+  ES_GET_BUDGET_MS for document and mapping fetches). Each attempt's
+  timeout is what is left of it, so retries never exceed the budget.
+- retries of transient errors, with exponential backoff and full jitter.
+- the shard request cache, and a `preference` derived from the search
+  itself: a repeated query goes to the same shard copies and hits their
+  caches.
+- hedging (async only, ES_HEDGE_AFTER_MS): a read still unanswered after
+  that delay is sent again without the preference, so adaptive replica
+  selection (and, with several hosts, the next node) routes it away from
+  the slow copy. The first answer wins; the other request is cancelled.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List
+
+from elasticsearch import ApiError, AsyncElasticsearch, ConnectionError, ConnectionTimeout, Elasticsearch
+
+from app import metrics
+from app.config import (
+    ELASTIC_HOST, ELASTIC_USER, ELASTIC_PASSWORD, ES_CONNECTIONS_PER_NODE, ES_HTTP_COMPRESS,
+    ES_SEARCH_BUDGET_MS, ES_GET_BUDGET_MS, ES_MAX_RETRIES, ES_RETRY_BACKOFF_MS, ES_HEDGE_AFTER_MS,
+    ES_REQUEST_CACHE, ES_PREFERENCE_ROUTING,
+)
+
+logger = logging.getLogger(__name__)
+
+# Statuses Elasticsearch answers with when it is overloaded or a node is restarting
+TRANSIENT_STATUSES = (429, 502, 503, 504)
+# A retry is only sent if at least this much of the budget is left for it
+MIN_ATTEMPT_SECONDS = 0.05
+
+
+def hosts(value: str = ELASTIC_HOST) -> List[str]:
+    return [host.strip() for host in value.split(",") if host.strip()]
+
+
+def _client_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "basic_auth": (ELASTIC_USER, ELASTIC_PASSWORD),
+        "connections_per_node": ES_CONNECTIONS_PER_NODE,
+        "http_compress": ES_HTTP_COMPRESS,
+        **options,
+    }
+
+
+def create_client(**options) -> Elasticsearch:
+    """A sync client; `options` override the defaults (e.g. a long request_timeout for bulk jobs)."""
+    return Elasticsearch(hosts(), **_client_options(options))
+
+
+def create_async_client(**options) -> AsyncElasticsearch:
+    """An async client; `options` override the defaults."""
+    return AsyncElasticsearch(hosts(), **_client_options(options))
+
+
+def create_api_clients():
+    """The API's clients, as (client, async client). Retries are theirs, not the transport's."""
+    return (
+        ResilientClient(create_client(max_retries=0), "sync"),
+        AsyncResilientClient(create_async_client(max_retries=0), "async"),
+    )
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, (ConnectionError, ConnectionTimeout)):
+        return True
+    return isinstance(exc, ApiError) and exc.status_code in TRANSIENT_STATUSES
+
+
+def _preference(body) -> str:
+    # Custom preference strings must not start with "_"
+    text = json.dumps(body, sort_keys=True, default=str)
+    return "q" + hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def resolve_method(client, method: str):
+    """The bound method of a client for a dotted name, e.g. "indices.get_mapping"."""
+    for name in method.split("."):
+        client = getattr(client, name)
+    return client
+
+
+class ResilientClient:
+    """
+    Sync client of the API: budgets, retries, request cache and preference
+    routing on `search`, `msearch`, `mget` and `indices.get_mapping`.
+    """
+
+    def __init__(self, client, name: str, search_budget_ms: float = ES_SEARCH_BUDGET_MS,
+                 get_budget_ms: float = ES_GET_BUDGET_MS, max_retries: int = ES_MAX_RETRIES,
+                 backoff_ms: float = ES_RETRY_BACKOFF_MS):
+        self.client = client
+        self.name = name
+        self.budgets = {
+            "search": search_budget_ms / 1000,
+            "msearch": search_budget_ms / 1000,
+            "mget": get_budget_ms / 1000,
+            "indices.get_mapping": get_budget_ms / 1000,
+        }
+        self.max_retries = max_retries
+        self.backoff = backoff_ms / 1000
+        self.indices = IndicesNamespace(self)
+        self._pool_size = ES_CONNECTIONS_PER_NODE * len(client.transport.node_pool.all())
+        metrics.ES_POOL_CONNECTIONS.labels(name).inc(self._pool_size)
+
+    def _route(self, method: str, kwargs: Dict[str, Any], hedge: bool = False) -> Dict[str, Any]:
+        """Add the request cache and the preference of the search (none for a hedge)."""
+        if method == "search":
+            body = kwargs
+            kwargs = dict(kwargs)
+            if ES_REQUEST_CACHE:
+                kwargs.setdefault("request_cache", True)
+            if ES_PREFERENCE_ROUTING and not hedge:
+                kwargs.setdefault("preference", _preference(body))
+        elif method == "msearch":
+            # Alternating header / body lines
+            searches = list(kwargs["searches"])
+            for i in range(0, len(searches) - 1, 2):
+                header = dict(searches[i])
+                if ES_REQUEST_CACHE:
+                    header.setdefault("request_cache", True)
+                if ES_PREFERENCE_ROUTING and not hedge:
+                    header.setdefault("preference", _preference([header.get("index"), searches[i + 1]]))
+                searches[i] = header
+            kwargs = {**kwargs, "searches": searches}
+        return kwargs
+
+    def _retry_delay(self, method: str, exc: Exception, attempt: int, deadline: float):
+        """Seconds to wait before retrying, or None to give up and raise."""
+        if attempt >= self.max_retries or not is_transient(exc):
+            return None
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        if deadline - time.monotonic() - delay < MIN_ATTEMPT_SECONDS:
+            return None
+        metrics.ES_RETRIES.labels(method).inc()
+        logger.info("retrying elasticsearch %s in %.0fms after %s", method, delay * 1000, exc)
+        return delay
+
+    def _attempt(self, method: str, kwargs: Dict[str, Any], deadline: float):
+        timeout = max(deadline - time.monotonic(), MIN_ATTEMPT_SECONDS)
+        in_flight = metrics.ES_IN_FLIGHT.labels(self.name)
+        in_flight.inc()
+        try:
+            return resolve_method(self.client.options(request_timeout=timeout), method)(**kwargs)
+        finally:
+            in_flight.dec()
+
+    def _call(self, method: str, **kwargs):
+        deadline = time.monotonic() + self.budgets[method]
+        routed = self._route(method, kwargs)
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(method, routed, deadline)
+            except Exception as exc:
+                delay = self._retry_delay(method, exc, attempt, deadline)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def search(self, **kwargs):
+        return self._call("search", **kwargs)
+
+    def msearch(self, **kwargs):
+        return self._call("msearch", **kwargs)
+
+    def mget(self, **kwargs):
+        return self._call("mget", **kwargs)
+
+    def close(self):
+        metrics.ES_POOL_CONNECTIONS.labels(self.name).dec(self._pool_size)
+        self.client.close()
+
+
+class AsyncResilientClient(ResilientClient):
+    """Async variant of ResilientClient, over AsyncElasticsearch, with hedged reads."""
+
+    def __init__(self, client, name: str, hedge_after_ms: float = ES_HEDGE_AFTER_MS, **kwargs):
+        super().__init__(client, name, **kwargs)
+        self.hedge_after = hedge_after_ms / 1000
+
+    async def _attempt(self, method: str, kwargs: Dict[str, Any], deadline: float):
+        timeout = max(deadline - time.monotonic(), MIN_ATTEMPT_SECONDS)
+        in_flight = metrics.ES_IN_FLIGHT.labels(self.name)
+        in_flight.inc()
+        try:
+            return await resolve_method(self.client.options(request_timeout=timeout), method)(**kwargs)
+        finally:
+            in_flight.dec()
+
+    async def _hedged(self, method: str, kwargs: Dict[str, Any], deadline: float):
+        tasks = [asyncio.ensure_future(self._attempt(method, self._route(method, kwargs), deadline))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done and deadline - time.monotonic() > MIN_ATTEMPT_SECONDS:
+                metrics.ES_HEDGES.labels("sent").inc()
+                tasks.append(asyncio.ensure_future(
+                    self._attempt(method, self._route(method, kwargs, hedge=True), deadline)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            metrics.ES_HEDGES.labels("won").inc()
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The loser, or both when the caller is cancelled
+            for task in tasks:
+                task.cancel()
+
+    async def _call(self, method: str, **kwargs):
+        deadline = time.monotonic() + self.budgets[method]
+        routed = self._route(method, kwargs)
+        attempt = 0
+        while True:
+            try:
+                if self.hedge_after and method != "indices.get_mapping":
+                    return await self._hedged(method, kwargs, deadline)
+                return await self._attempt(method, routed, deadline)
+            except Exception as exc:
+                delay = self._retry_delay(method, exc, attempt, deadline)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def search(self, **kwargs):
+        return await self._call("search", **kwargs)
+
+    async def msearch(self, **kwargs):
+        return await self._call("msearch", **kwargs)
+
+    async def mget(self, **kwargs):
+        return await self._call("mget", **kwargs)
+
+    async def close(self):
+        metrics.ES_POOL_CONNECTIONS.labels(self.name).dec(self._pool_size)
+        await self.client.close()
+
+
+class IndicesNamespace:
+    """
+    The `indices` namespace of a client wrapper (ResilientClient,
+    FailoverClient): `get_mapping` goes through the wrapper's `_call`.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def get_mapping(self, **kwargs):
+        return self._client._call("indices.get_mapping", **kwargs)
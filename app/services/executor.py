@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from app.metrics import EXECUTOR_PENDING
+
+
+class OverloadedError(Exception):
+    """Raised when an executor's queue is full; the API maps it to a 503."""
+
+    def __init__(self, name: str):
+        super().__init__(f"The {name} executor is at capacity, try again later")
+        self.name = name
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for blocking model calls.
+
+    At most `concurrency` calls run at once and at most `queue_limit` more
+    wait for a slot. Anything beyond that is rejected immediately with
+    `OverloadedError` instead of queueing without bound.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_limit: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self._pool = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix=f"{name}-inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pending_gauge = EXECUTOR_PENDING.labels(name)
+
+    @property
+    def pending(self) -> int:
+        """Calls currently running or waiting for a worker thread."""
+        return self._pending
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.concurrency + self.queue_limit:
+                raise OverloadedError(self.name)
+            self._pending += 1
+        self._pending_gauge.inc()
+
+    def _release(self, *_):
+        with self._lock:
+            self._pending -= 1
+        self._pending_gauge.dec()
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> "asyncio.Future[Any]":
+        """
+        Schedule `fn(*args, **kwargs)` on the pool. Admission happens right
+        away, so `OverloadedError` is raised here rather than when awaiting.
+        """
+        self._acquire()
+        try:
+            # Run in the caller's context so per-request stage timings are kept
+            context = contextvars.copy_context()
+            future = self._pool.submit(context.run, partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        # Release the slot when the work finishes, not when the caller stops
+        # awaiting it, so cancelled requests cannot oversubscribe the pool.
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the pool and await its result."""
+        return await self.submit(fn, *args, **kwargs)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,251 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import torch
+from transformers import DynamicCache
+
+# Per-layer (keys, values) tensors of shape [1, kv_heads, seq_len, head_dim]
+KVLayers = List[Tuple[torch.Tensor, torch.Tensor]]
+
+
+def cache_to_layers(cache) -> KVLayers:
+    """Extract per-layer key/value tensors from any transformers cache format."""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [(keys, values) for keys, values in cache]
+
+
+def layers_to_cache(layers: KVLayers) -> DynamicCache:
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+class GenerationRequest:
+    """One sequence being decoded by the engine."""
+
+    def __init__(self, input_ids: Sequence[int], max_new_tokens: int, temperature: float,
+                 on_text: Optional[Callable[[str], None]] = None,
+                 cancel: Optional[threading.Event] = None,
+                 prefix: Optional[Tuple[KVLayers, int]] = None):
+        self.input_ids = list(input_ids)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.on_text = on_text
+        self.cancel = cancel
+        # Optional precomputed KV states for the first `prefix[1]` input ids
+        self.prefix = prefix
+        self.future: Future = Future()
+
+        self.past: KVLayers = []
+        self.length = 0  # tokens currently held in `past`
+        self.next_token: Optional[int] = None
+        self.generated: List[int] = []
+        self.emitted = ""
+
+        # perf_counter timestamps for metrics: queued, prefill started,
+        # first token sampled, finished
+        self.submitted_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+
+class GenerationEngine:
+    """
+    Continuous-batching decoder for a causal LM.
+
+    Requests are admitted into the running batch between decode steps, so a
+    new summary does not wait for the others to finish. Each sequence keeps
+    its own KV cache; for every step the caches are left-padded to a common
+    length, decoded together in one forward pass and split back. Sampling
+    honours each request's own `temperature` (0 means greedy) and
+    `max_new_tokens`.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+
+        eos = model.generation_config.eos_token_id
+        eos = eos if isinstance(eos, (list, tuple)) else [eos]
+        self.eos_token_ids = {t for t in [*eos, tokenizer.eos_token_id] if t is not None}
+
+        self._queue: "queue.Queue[GenerationRequest | None]" = queue.Queue()
+        self._active: List[GenerationRequest] = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="generation-engine", daemon=True)
+        self._thread.start()
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def submit(self, request: GenerationRequest) -> Future:
+        if self._closed:
+            raise RuntimeError("Generation engine is closed")
+        self._queue.put(request)
+        return request.future
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    # Scheduler
+
+    def _loop(self):
+        while True:
+            if not self._active:
+                request = self._queue.get()
+                if request is None:
+                    return
+                self._admit(request)
+            while len(self._active) < self.max_batch_size:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._fail_all(RuntimeError("Generation engine is closed"))
+                    return
+                self._admit(request)
+            if self._active:
+                try:
+                    self._step()
+                except Exception as exc:
+                    self._fail_all(exc)
+
+    def _fail_all(self, exc: Exception):
+        for request in self._active:
+            if not request.future.done():
+                request.future.set_exception(exc)
+        self._active = []
+
+    def _admit(self, request: GenerationRequest):
+        if not request.future.set_running_or_notify_cancel():
+            return
+        request.started_at = time.perf_counter()
+        try:
+            self._prefill(request)
+        except Exception as exc:
+            request.future.set_exception(exc)
+            return
+        request.first_token_at = time.perf_counter()
+        if not self._after_token(request):
+            self._active.append(request)
+
+    # Model passes
+
+    @torch.no_grad()
+    def _prefill(self, request: GenerationRequest):
+        ids = request.input_ids
+        start = 0
+        cache = None
+        if request.prefix is not None:
+            prefix_layers, start = request.prefix
+            cache = layers_to_cache(prefix_layers)
+
+        input_ids = torch.tensor([ids[start:]], device=self.device)
+        position_ids = torch.arange(start, len(ids), device=self.device).unsqueeze(0)
+        attention_mask = torch.ones((1, len(ids)), dtype=torch.long, device=self.device)
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=cache,
+            use_cache=True,
+        )
+        request.past = cache_to_layers(outputs.past_key_values)
+        request.length = len(ids)
+        request.next_token = self._sample(outputs.logits[:, -1, :], [request])[0]
+
+    @torch.no_grad()
+    def _step(self):
+        batch = self._active
+        max_len = max(r.length for r in batch)
+
+        layers = []
+        for layer_index in range(len(batch[0].past)):
+            keys, values = [], []
+            for request in batch:
+                k, v = request.past[layer_index]
+                pad = max_len - request.length
+                if pad:
+                    k = torch.nn.functional.pad(k, (0, 0, pad, 0))
+                    v = torch.nn.functional.pad(v, (0, 0, pad, 0))
+                keys.append(k)
+                values.append(v)
+            layers.append((torch.cat(keys), torch.cat(values)))
+
+        attention_mask = torch.zeros((len(batch), max_len + 1), dtype=torch.long, device=self.device)
+        for i, request in enumerate(batch):
+            attention_mask[i, max_len - request.length:] = 1
+        input_ids = torch.tensor([[r.next_token] for r in batch], device=self.device)
+        position_ids = torch.tensor([[r.length] for r in batch], device=self.device)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=layers_to_cache(layers),
+            use_cache=True,
+        )
+        new_layers = cache_to_layers(outputs.past_key_values)
+        next_tokens = self._sample(outputs.logits[:, -1, :], batch)
+
+        still_active = []
+        for i, request in enumerate(batch):
+            start = max_len - request.length
+            request.past = [(k[i:i + 1, :, start:], v[i:i + 1, :, start:]) for k, v in new_layers]
+            request.length += 1
+            request.next_token = next_tokens[i]
+            if not self._after_token(request):
+                still_active.append(request)
+        self._active = still_active
+
+    def _sample(self, logits: torch.Tensor, batch: List[GenerationRequest]) -> List[int]:
+        logits = logits.float()
+        greedy = logits.argmax(dim=-1)
+        temperatures = torch.tensor([r.temperature for r in batch], device=logits.device)
+        sampled_rows = temperatures > 0
+        if not sampled_rows.any():
+            return greedy.tolist()
+        probs = torch.softmax(logits / temperatures.clamp(min=1e-5).unsqueeze(-1), dim=-1)
+        sampled = torch.multinomial(probs, num_samples=1).squeeze(-1)
+        return torch.where(sampled_rows, sampled, greedy).tolist()
+
+    # Bookkeeping
+
+    def _after_token(self, request: GenerationRequest) -> bool:
+        """Record the freshly sampled token; return True when the request is finished."""
+        token = request.next_token
+        finished = token in self.eos_token_ids
+        if not finished:
+            request.generated.append(token)
+            self._emit(request)
+            finished = len(request.generated) >= request.max_new_tokens
+        if request.cancel is not None and request.cancel.is_set():
+            finished = True
+        if finished:
+            self._emit(request, final=True)
+            request.past = []
+            request.finished_at = time.perf_counter()
+            request.future.set_result(request.emitted.strip())
+        return finished
+
+    def _emit(self, request: GenerationRequest, final: bool = False):
+        text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+        # Hold back an incomplete multi-byte character until the next token
+        if not final and text.endswith("�"):
+            return
+        new_text = text[len(request.emitted):]
+        request.emitted = text
+        if new_text and request.on_text is not None:
+            request.on_text(new_text)
@@ -0,0 +1,179 @@
+import inspect
+import os
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+
+from app.config import TORCH_NUM_THREADS, TORCH_NUM_INTEROP_THREADS
+
+_DTYPES = {
+    "fp32": torch.float32,
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+# Models loaded inside `preloading()` (the server's master, see
+# gunicorn.conf.py), keyed by loader and arguments. Forked workers find them
+# here and share their weight pages copy-on-write instead of loading a copy.
+_preloaded: Dict[Tuple, Any] = {}
+_preloading = False
+# torch's intra-op thread count, lowered to 1 while preloading
+_default_threads: Optional[int] = None
+
+
+def configure_threads() -> None:
+    """Apply TORCH_NUM_THREADS / TORCH_NUM_INTEROP_THREADS (0 keeps torch's default)."""
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    elif _default_threads is not None:
+        torch.set_num_threads(_default_threads)
+    if TORCH_NUM_INTEROP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(TORCH_NUM_INTEROP_THREADS)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work started
+            pass
+
+
+@contextmanager
+def preloading():
+    """
+    Keep the models loaded in this block for later calls with the same
+    arguments, in this process and in processes forked from it.
+
+    Loading runs single-threaded: an OpenMP thread pool started before a
+    fork is unusable in the children.
+    """
+    global _preloading, _default_threads
+    _default_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    _preloading = True
+    try:
+        yield
+    finally:
+        _preloading = False
+
+
+def _reusable(loader):
+    """Return the preloaded model when one was loaded with the same arguments."""
+    signature = inspect.signature(loader)
+
+    @wraps(loader)
+    def load(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (loader.__name__, *bound.arguments.values())
+        if key in _preloaded:
+            return _preloaded[key]
+        model = loader(*args, **kwargs)
+        if _preloading:
+            _preloaded[key] = model
+        return model
+    return load
+
+
+@lru_cache(maxsize=None)
+def cpu_supports_bf16() -> bool:
+    """True if the CPU has native bf16 matmul instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_device() -> str:
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def resolve_dtype(setting: str, device: str) -> torch.dtype:
+    """
+    Map a dtype setting (auto, fp32, bf16, fp16) to a torch dtype.
+
+    `auto` picks fp16 on GPU, and on CPU bf16 when the CPU supports it
+    natively, else fp32. fp16 on CPU is emulated and much slower.
+    """
+    if setting != "auto":
+        return _DTYPES[setting]
+    if device == "cuda":
+        return torch.float16
+    return torch.bfloat16 if cpu_supports_bf16() else torch.float32
+
+
+def quantize_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Dynamically quantize every nn.Linear to int8 weights (CPU only)."""
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+@_reusable
+def load_causal_lm(model_id: str, dtype: str = "auto", quantize: str = "none"):
+    """Load the LLM and its tokenizer in the requested inference mode."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    device = resolve_device()
+    if quantize == "int8":
+        # Dynamic quantization runs on fp32 CPU weights
+        device, torch_dtype = "cpu", torch.float32
+    else:
+        torch_dtype = resolve_dtype(dtype, device)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=torch_dtype,
+        # Automatically use available GPUs; plain CPU load otherwise
+        device_map="auto" if device == "cuda" else None,
+    )
+    model.eval()
+    if quantize == "int8":
+        model = quantize_int8(model)
+    return tokenizer, model
+
+
+@_reusable
+def load_cross_encoder(model_id: str, dtype: str = "fp32", quantize: str = "none", backend: str = "torch"):
+    """
+    Load the reranker cross-encoder in the requested inference mode.
+
+    `backend="onnx"` runs it through ONNX Runtime (exported on first load,
+    needs `optimum[onnxruntime]`); dtype and quantize then do not apply.
+    """
+    from sentence_transformers import CrossEncoder
+
+    device = resolve_device()
+    if backend == "onnx":
+        return CrossEncoder(model_id, device="cpu", backend="onnx")
+
+    if quantize == "int8":
+        device, torch_dtype = "cpu", torch.float32
+    else:
+        torch_dtype = resolve_dtype(dtype, device)
+    model = CrossEncoder(model_id, device=device, model_kwargs={"torch_dtype": torch_dtype})
+    if quantize == "int8":
+        model = quantize_int8(model)
+    return model
+
+
+@_reusable
+def load_sentence_encoder(model_id: str):
+    """Load the bi-encoder used for document and query embeddings."""
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_id, device=resolve_device())
+    model.eval()
+    return model
+
+
+def describe() -> dict:
+    """Summary of the CPU/threading setup, for logs and benchmark output."""
+    return {
+        "device": resolve_device(),
+        "cpu_bf16": cpu_supports_bf16(),
+        "cpu_capability": torch.backends.cpu.get_cpu_capability(),
+        "num_threads": torch.get_num_threads(),
+        "num_interop_threads": torch.get_num_interop_threads(),
+        "cpu_count": os.cpu_count(),
+    }
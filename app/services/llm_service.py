@@ -1,22 +1,73 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import logging
+import threading
 import torch
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 import os
-from app.config import LLM_MODEL_ID
+from app import metrics
+from app.collections import Collection, get_collection
+from app.config import LLM_MODEL_ID, LLM_MAX_BATCH_SIZE, LLM_DTYPE, LLM_QUANTIZE
+from app.services.generation_engine import GenerationEngine, GenerationRequest, cache_to_layers
+from app.services.inference import configure_threads, load_causal_lm
+
+# Fixed instruction block of the summary prompt. It is identical for every
+# request, so its KV states are computed once at startup and reused.
+SUMMARY_INSTRUCTIONS = """Task: Based on the movie's plot, create a brief summary that highlights its key elements and also explains how it relates to the user's search query.
+
+Requirements:
+1. Emphasize details from the plot in the summary.
+2. Maximum 2-3 sentences.
+3. Clearly explain its relevance to the search query.
+4. Be direct and concise.
+5. Do not mention the search query itself at all.
+6. Do not include meta-commentary or analysis.
+7. Do not repeat these instructions.
+8. Do not halucinate."""
+
+# Instructions of the query-independent summaries made offline for the
+# summary store (scripts/summarize.py)
+DOCUMENT_SUMMARY_INSTRUCTIONS = """Task: Write a brief, neutral summary of the document below.
+
+Requirements:
+1. Emphasize its key details.
+2. Maximum 2-3 sentences.
+3. Be direct and concise.
+4. Do not include meta-commentary or analysis.
+5. Do not repeat these instructions.
+6. Do not hallucinate."""
+
+# Marks where the per-request part starts when rendering the chat template
+_USER_CONTENT_MARKER = "\x00USER_CONTENT\x00"
+
+logger = logging.getLogger(__name__)
+
+
+def load_llm_model():
+    """Tokenizer and model of LLM_MODEL_ID in the configured inference mode."""
+    return load_causal_lm(LLM_MODEL_ID, dtype=LLM_DTYPE, quantize=LLM_QUANTIZE)
+
 
 class LLMService:
     def __init__(self):
         """Initialize the LLM service by loading the model and tokenizer."""
-        print(f"Loading LLM model: {LLM_MODEL_ID}")
-        self.tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL_ID)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            LLM_MODEL_ID,
-            torch_dtype=torch.float16,  # Use fp16 for efficiency
-            device_map="auto"  # Automatically use available GPUs or fallback to CPU
-        )
-        print("LLM model loaded successfully")
+        logger.info("loading LLM model=%s dtype=%s quantize=%s", LLM_MODEL_ID, LLM_DTYPE, LLM_QUANTIZE)
+        configure_threads()
+        self.tokenizer, self.model = load_llm_model()
+        logger.info("LLM loaded dtype=%s device=%s", self.model.dtype, self.model.device)
 
-    def generate(self, prompt: str, max_length: int = 512, temperature: float = 0.7, max_new_tokens: Optional[int] = None) -> str:
+        # All generation goes through one continuous-batching scheduler
+        self.engine = GenerationEngine(self.model, self.tokenizer, max_batch_size=LLM_MAX_BATCH_SIZE)
+
+        # Prefill the constant instruction prefix once
+        self.summary_prefix = self._build_summary_prefix()
+        # Built on the first offline summary; the API never needs it
+        self._document_prefix = None
+        self._document_prefix_lock = threading.Lock()
+
+    def close(self):
+        self.engine.close()
+
+    def generate(self, prompt: str, max_length: int = 512, temperature: float = 0.7, max_new_tokens: Optional[int] = None,
+                 on_text: Optional[Callable[[str], None]] = None, cancel: Optional[threading.Event] = None) -> str:
         """
         Generate text using the loaded LLM.
 
@@ -25,49 +76,108 @@ class LLMService:
             max_length: Maximum length of the generated text (used if max_new_tokens is None)
             temperature: Controls randomness of output (lower is more deterministic)
             max_new_tokens: Explicitly sets the number of new tokens to generate
+            on_text: Optional callback receiving the new text piece by piece while decoding
+            cancel: Optional event; once set, generation stops after the current token
 
         Returns:
             The generated text
         """
-        inputs = self.tokenizer(prompt, return_tensors="pt", padding=True)
-        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
-
-        generation_kwargs = {
-            "attention_mask": inputs["attention_mask"],
-            "temperature": temperature,
-            "do_sample": True,
-            "pad_token_id": self.tokenizer.eos_token_id
-        }
-
-        if max_new_tokens is not None:
-            generation_kwargs["max_new_tokens"] = max_new_tokens
-        else:
-            generation_kwargs["max_length"] = max_length
-
-        # Generate text
-        with torch.no_grad():
-            generated_ids = self.model.generate(
-                inputs["input_ids"],
-                **generation_kwargs
-            )
-
-        # Decode the generated ids to text
-        generated_text = self.tokenizer.decode(generated_ids[0], skip_special_tokens=True)
-        
-        # Return only the newly generated text (remove the input prompt)
-        # Ensure prompt is not part of the generated_text for cases where it might be identical or a substring at the start
-        if generated_text.startswith(prompt):
-            return generated_text[len(prompt):].strip()
-        else:
-            return generated_text.strip() # Or handle as an unexpected case if prompt must be a prefix
-
-    def enhance_search_results(self, query: str, search_results: List[Dict[Any, Any]]) -> str:
+        with metrics.stage("llm_tokenize"):
+            input_ids = self.tokenizer(prompt)["input_ids"]
+        if max_new_tokens is None:
+            # max_length counts the prompt, as with transformers' generate()
+            max_new_tokens = max(1, max_length - len(input_ids))
+
+        return self._generate_ids(input_ids, max_new_tokens, temperature, on_text, cancel)
+
+    def _generate_ids(self, input_ids: List[int], max_new_tokens: int, temperature: float,
+                      on_text: Optional[Callable[[str], None]] = None,
+                      cancel: Optional[threading.Event] = None, prefix=None) -> str:
+        if cancel is not None and cancel.is_set():
+            return ""
+
+        # Queue the prompt with the scheduler and wait for this sequence to finish
+        request = GenerationRequest(
+            input_ids,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            on_text=on_text,
+            cancel=cancel,
+            prefix=prefix
+        )
+        try:
+            return self.engine.submit(request).result()
+        finally:
+            self._record_timings(request)
+
+    @staticmethod
+    def _record_timings(request: GenerationRequest):
+        """Report queueing, prefill and decode time of a finished request, and its decode speed."""
+        if request.started_at is None:
+            return
+        metrics.observe("llm_queue", request.started_at - request.submitted_at)
+        if request.first_token_at is None:
+            return
+        metrics.observe("llm_prefill", request.first_token_at - request.started_at)
+        metrics.LLM_TOKENS.inc(len(request.generated))
+        if request.finished_at is None:
+            return
+        decode_seconds = request.finished_at - request.first_token_at
+        metrics.observe("llm_decode", decode_seconds)
+        # The first token comes out of the prefill
+        if decode_seconds > 0 and len(request.generated) > 1:
+            metrics.LLM_TOKENS_PER_SECOND.observe((len(request.generated) - 1) / decode_seconds)
+
+    def _summary_messages(self, user_content: str, instructions: str = SUMMARY_INSTRUCTIONS) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": user_content},
+        ]
+
+    def _render_summary_prompt(self, user_content: str, instructions: str = SUMMARY_INSTRUCTIONS) -> str:
+        """Render the summary prompt with the model's chat template, or as plain text for base models without one."""
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(
+                self._summary_messages(user_content, instructions), tokenize=False, add_generation_prompt=True)
+        return f"{instructions}\n\n{user_content}\n\nSummary:"
+
+    def _encode(self, text: str) -> List[int]:
+        # Chat templates already contain the special tokens
+        return self.tokenizer(text, add_special_tokens=not getattr(self.tokenizer, "chat_template", None))["input_ids"]
+
+    @torch.no_grad()
+    def _build_summary_prefix(self, instructions: str = SUMMARY_INSTRUCTIONS):
+        """Compute the KV states of everything in the summary prompt before the per-request part."""
+        rendered = self._render_summary_prompt(_USER_CONTENT_MARKER, instructions)
+        prefix_text = rendered.split(_USER_CONTENT_MARKER)[0]
+        prefix_ids = self._encode(prefix_text)
+        if not prefix_ids:
+            return None
+        outputs = self.model(
+            input_ids=torch.tensor([prefix_ids], device=self.model.device), use_cache=True)
+        return prefix_ids, cache_to_layers(outputs.past_key_values)
+
+    def _prefix_for(self, input_ids: List[int], prefix=None):
+        """Return the cached prefix (default: the summary prompt's) if `input_ids` start with it (tokenization can merge across the boundary)."""
+        prefix = prefix or self.summary_prefix
+        if prefix is None:
+            return None
+        prefix_ids, layers = prefix
+        if len(input_ids) > len(prefix_ids) and input_ids[:len(prefix_ids)] == prefix_ids:
+            return layers, len(prefix_ids)
+        return None
+
+    def enhance_search_results(self, query: str, search_results: List[Dict[Any, Any]],
+                               on_text: Optional[Callable[[str], None]] = None,
+                               cancel: Optional[threading.Event] = None) -> str:
         """
         Enhance search results with LLM summary.
 
         Args:
             query: The user's search query
             search_results: List of search results from Elasticsearch
+            on_text: Optional callback receiving the raw summary text while it is generated
+            cancel: Optional event that stops generation early
 
         Returns:
             A summary or enhanced explanation of the search results
@@ -78,47 +188,69 @@ class LLMService:
 
         # Get only the top result
         top_result = search_results[0]
+        collection = get_collection(top_result.get('collection'))
 
-        # Create a focused prompt for movie summary
-        # Note: The prompt you designed in a previous step is assumed here
-        prompt = f"""Task: Based on the movie's plot, create a brief summary that highlights its key elements and also explains how it relates to the search query "{query}".
+        # Only the document and the query vary; the instructions come from the cached prefix
+        user_content = f"""Search query: "{query}"
 
-Movie Information:
+{collection.kind} Information:
 Title: {top_result['title']}
-Plot: {top_result['plot']}
-
-Requirements:
-1. Emphasize details from the plot in the summary.
-2. Maximum 2-3 sentences.
-3. Clearly explain its relevance to "{query}".
-4. Be direct and concise.
-5. Do not mention the search query itself at all.
-6. Do not include meta-commentary or analysis.
-7. Do not repeat these instructions.
-8. Do not halucinate. 
-
-Summary:"""
+{collection.text_label}: {top_result[collection.text_field]}"""
+        with metrics.stage("llm_tokenize"):
+            input_ids = self._encode(self._render_summary_prompt(user_content))
 
         # Generate summary with a slightly larger token budget to allow sentence completion
-        summary = self.generate(
-            prompt,
+        summary = self._generate_ids(
+            input_ids,
+            max_new_tokens=180,
             temperature=0.2,   # Lower temperature for more focused output
-            max_new_tokens=180
+            on_text=on_text,
+            cancel=cancel,
+            prefix=self._prefix_for(input_ids)
+        )
+
+        return complete_sentences(summary)
+
+    def summarize_document(self, doc: Dict[str, Any], collection: Optional[Collection] = None,
+                           max_new_tokens: int = 150) -> str:
+        """
+        Query-independent summary of one document, for the offline summary
+        store (scripts/summarize.py). Concurrent calls are decoded together
+        by the generation engine.
+        """
+        collection = collection or get_collection(doc.get('collection'))
+        if self._document_prefix is None:
+            with self._document_prefix_lock:
+                if self._document_prefix is None:
+                    self._document_prefix = self._build_summary_prefix(DOCUMENT_SUMMARY_INSTRUCTIONS)
+
+        user_content = f"""{collection.kind} Information:
+Title: {doc['title']}
+{collection.text_label}: {doc[collection.text_field]}"""
+        input_ids = self._encode(self._render_summary_prompt(user_content, DOCUMENT_SUMMARY_INSTRUCTIONS))
+        summary = self._generate_ids(
+            input_ids,
+            max_new_tokens=max_new_tokens,
+            temperature=0.2,
+            prefix=self._prefix_for(input_ids, self._document_prefix)
         )
+        return complete_sentences(summary)
+
 
-        # Try to ensure the summary ends with a complete sentence.
-        if summary and summary[-1] not in ['.', '!', '?']:
-            # Find the last sentence-ending punctuation.
-            last_period = summary.rfind('.')
-            last_exclamation = summary.rfind('!')
-            last_question = summary.rfind('?')
+def complete_sentences(summary: str) -> str:
+    """Try to ensure the summary ends with a complete sentence."""
+    if summary and summary[-1] not in ['.', '!', '?']:
+        # Find the last sentence-ending punctuation.
+        last_period = summary.rfind('.')
+        last_exclamation = summary.rfind('!')
+        last_question = summary.rfind('?')
 
-            last_punctuation_pos = max(last_period, last_exclamation, last_question)
+        last_punctuation_pos = max(last_period, last_exclamation, last_question)
 
-            if last_punctuation_pos != -1:
-                # Trim to the character after the punctuation and strip any trailing space
-                summary = summary[:last_punctuation_pos + 1].strip()
-            # If no sentence-ending punctuation is found, leave the summary as is.
-            # This handles cases like very short phrases or single long sentences.
+        if last_punctuation_pos != -1:
+            # Trim to the character after the punctuation and strip any trailing space
+            summary = summary[:last_punctuation_pos + 1].strip()
+        # If no sentence-ending punctuation is found, leave the summary as is.
+        # This handles cases like very short phrases or single long sentences.
 
-        return summary
\ No newline at end of file
+    return summary
@@ -0,0 +1,509 @@
+"""
+In-process BM25 search over the converted datasets (see scripts/convert.py),
+for running the API without an Elasticsearch cluster and as its fallback
+during outages (RETRIEVAL_BACKEND, see app/services/backends.py).
+
+`LocalSearchEngine` answers the subset of the Elasticsearch client API that
+RetrievalService and TagService use (search, msearch, mget, get_mapping)
+with the same response shapes, so neither needs to know which one it talks
+to. Supported: multi_match (best_fields) over title and body, terms filters
+on the tag field, `_doc` sort with `from_`, terms aggregations on the tag
+field, source filtering and body highlights. kNN searches are answered with
+an error, which the federated merge skips: hybrid queries degrade to BM25.
+
+Each collection's index is a directory of NumPy arrays, memory-mapped on
+load so the page cache is shared between workers:
+
+    meta.json                      document count, field lengths, input fingerprint
+    vocab.json                     term -> term id, shared by both fields
+    {title,body}.offsets.npy       postings of term t are [offsets[t], offsets[t + 1])
+    {title,body}.docs.npy          document rows, ascending per term
+    {title,body}.tfs.npy           term frequencies
+    {title,body}.lengths.npy       tokens per document
+    tags.json, tags.{offsets,docs}.npy  tag -> document rows
+    ids.json                       row -> doc_id
+    docs.jsonl, docs.offsets.npy   stored fields and rerank passage, one document per line
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.collections import Collection
+from app.services.shards import iter_records, read_manifest, shard_paths
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes, so existing indices are rebuilt
+LOCAL_INDEX_VERSION = 2
+# Elasticsearch's BM25 defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+FIELDS = ("title", "body")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased word tokens, close to Elasticsearch's standard analyzer."""
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def source_fingerprint(data_path: str) -> Dict[str, Any]:
+    """What an index was built from: the shards' checksums, or the file's size and mtime."""
+    manifest = read_manifest(data_path) if os.path.isdir(data_path) else None
+    if manifest is not None:
+        return {"rows": manifest["rows"], "shards": [shard["sha256"] for shard in manifest["shards"]]}
+    stat = os.stat(shard_paths(data_path)[0])
+    return {"bytes": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _offsets(keys: np.ndarray, size: int) -> np.ndarray:
+    return np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=size))]).astype(np.int64)
+
+
+def _save_postings(directory: str, name: str, keys: array, rows: array, size: int, tfs: array = None):
+    keys = np.frombuffer(keys, dtype=np.int32)
+    # Stable, so rows stay ascending within each key
+    order = np.argsort(keys, kind="stable")
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), _offsets(keys, size))
+    np.save(os.path.join(directory, f"{name}.docs.npy"), np.frombuffer(rows, dtype=np.int32)[order])
+    if tfs is not None:
+        tfs = np.minimum(np.frombuffer(tfs, dtype=np.int32)[order], np.iinfo(np.uint16).max)
+        np.save(os.path.join(directory, f"{name}.tfs.npy"), tfs.astype(np.uint16))
+
+
+def build_local_index(collection: Collection, data_path: str, directory: str,
+                      tokenizer=None) -> Dict[str, Any]:
+    """
+    Build the index of `collection` from its converted data into `directory`.
+
+    Documents store their rerank passage like the Elasticsearch indices do
+    (scripts/index.py). With the cross-encoder's `tokenizer` the body is cut
+    exactly at the passage budget, without one by an estimated word count.
+
+    Written to a directory of its own and swapped in when complete, so a
+    running engine never sees a partial index. Callers hold `build_lock`.
+    """
+    # Lazy: the reranker module imports torch
+    from app.services.reranker_service import rerank_passage
+
+    start = time.perf_counter()
+    parent, name = os.path.split(os.path.abspath(directory))
+    # Left behind by builds that were killed; nobody else builds while we hold the lock
+    for leftover in glob.glob(os.path.join(parent, f"{name}.tmp-*")):
+        shutil.rmtree(leftover, ignore_errors=True)
+    tmp = tempfile.mkdtemp(prefix=f"{name}.tmp-", dir=parent)
+
+    fingerprint = source_fingerprint(data_path)
+    stored = collection.document_fields
+    vocab: Dict[str, int] = {}
+    tag_vocab: Dict[str, int] = {}
+    # Flat (term id, row, tf) triples per field; array() keeps them at 4 bytes each
+    postings = {field: (array("i"), array("i"), array("i")) for field in FIELDS}
+    lengths = {field: array("i") for field in FIELDS}
+    tag_keys, tag_rows = array("i"), array("i")
+    ids = []
+    offsets = array("q", [0])
+
+    with open(os.path.join(tmp, "docs.jsonl"), "wb") as store:
+        for row, doc in enumerate(iter_records(data_path)):
+            ids.append(str(doc["doc_id"]))
+            fields = {f: doc.get(f) for f in stored}
+            fields["rerank_passage"] = rerank_passage(collection, doc, tokenizer=tokenizer)
+            line = json.dumps(fields, ensure_ascii=False).encode() + b"\n"
+            store.write(line)
+            offsets.append(offsets[-1] + len(line))
+
+            for field, name in zip(FIELDS, ("title", collection.text_field)):
+                counts = Counter(tokenize(doc.get(name)))
+                terms, rows, tfs = postings[field]
+                for term, tf in counts.items():
+                    terms.append(vocab.setdefault(term, len(vocab)))
+                    rows.append(row)
+                    tfs.append(tf)
+                lengths[field].append(sum(counts.values()))
+
+            if collection.tag_field:
+                for tag in set(doc.get(collection.tag_field) or []):
+                    tag_keys.append(tag_vocab.setdefault(tag, len(tag_vocab)))
+                    tag_rows.append(row)
+
+    for field in FIELDS:
+        terms, rows, tfs = postings[field]
+        _save_postings(tmp, field, terms, rows, len(vocab), tfs)
+        np.save(os.path.join(tmp, f"{field}.lengths.npy"), np.frombuffer(lengths[field], dtype=np.int32))
+    _save_postings(tmp, "tags", tag_keys, tag_rows, len(tag_vocab))
+    np.save(os.path.join(tmp, "docs.offsets.npy"), np.frombuffer(offsets, dtype=np.int64))
+
+    meta = {
+        "collection": collection.name,
+        "version": LOCAL_INDEX_VERSION,
+        "source": fingerprint,
+        "build_id": time.strftime("%Y%m%d%H%M%S"),
+        "docs": len(ids),
+        "avgdl": {field: sum(lengths[field]) / max(len(ids), 1) for field in FIELDS},
+    }
+    for name, value in [("vocab.json", vocab), ("tags.json", list(tag_vocab)), ("ids.json", ids),
+                        ("meta.json", meta)]:
+        with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+
+    # Renaming onto an empty directory is atomic: move the old index aside first.
+    # Engines that have it open keep their mapped files until they close.
+    old = None
+    if os.path.exists(directory):
+        old = tempfile.mkdtemp(prefix=f"{name}.tmp-", dir=parent)
+        os.replace(directory, old)
+    os.replace(tmp, directory)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    logger.info("local index built collection=%s docs=%d terms=%d seconds=%.1f",
+                collection.name, len(ids), len(vocab), time.perf_counter() - start)
+    return meta
+
+
+@contextmanager
+def build_lock(directory: str):
+    """
+    Exclusive lock on building the index in `directory`, across processes:
+    gunicorn workers that all find it missing build it once, one after another.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+    with open(f"{directory}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def is_current(directory: str, data_path: str) -> bool:
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get("version") == LOCAL_INDEX_VERSION and meta.get("source") == source_fingerprint(data_path)
+
+
+class _Field:
+    def __init__(self, directory: str, name: str, avgdl: float):
+        load = lambda part: np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode="r")
+        self.offsets, self.docs, self.tfs = load("offsets"), load("docs"), load("tfs")
+        # BM25 length normalization per document: k1 * (1 - b + b * dl / avgdl)
+        self.norm = (BM25_K1 * (1 - BM25_B + BM25_B * load("lengths") / max(avgdl, 1e-9))).astype(np.float32)
+
+
+class LocalIndex:
+    """One collection's index, memory-mapped from `directory`."""
+
+    def __init__(self, collection: Collection, directory: str):
+        self.collection = collection
+        self.directory = directory
+
+        def load_json(name):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                return json.load(f)
+
+        self.meta = load_json("meta.json")
+        self.vocab: Dict[str, int] = load_json("vocab.json")
+        self.ids: List[str] = load_json("ids.json")
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.tags: List[str] = load_json("tags.json")
+        self.tag_ids = {tag: i for i, tag in enumerate(self.tags)}
+        self.tag_offsets = np.load(os.path.join(directory, "tags.offsets.npy"), mmap_mode="r")
+        self.tag_docs = np.load(os.path.join(directory, "tags.docs.npy"), mmap_mode="r")
+        self.doc_offsets = np.load(os.path.join(directory, "docs.offsets.npy"), mmap_mode="r")
+        self.fields = {field: _Field(directory, field, self.meta["avgdl"][field]) for field in FIELDS}
+        self.size = self.meta["docs"]
+        self._store = os.open(os.path.join(directory, "docs.jsonl"), os.O_RDONLY)
+
+    @classmethod
+    def open(cls, collection: Collection, data_path: str, directory: str, build: bool = True) -> "LocalIndex":
+        """Load the index, building it first if it is missing or older than the data."""
+        if not is_current(directory, data_path):
+            if not build:
+                raise FileNotFoundError(f"No current local index for {collection.name} in {directory}")
+            with build_lock(directory):
+                # Another worker may have built it while this one waited
+                if not is_current(directory, data_path):
+                    build_local_index(collection, data_path, directory)
+        return cls(collection, directory)
+
+    def close(self):
+        if self._store is not None:
+            os.close(self._store)
+            self._store = None
+
+    def bm25(self, terms: List[str]) -> np.ndarray:
+        """
+        BM25 score of every document: per field, then the best field wins
+        (multi_match best_fields). Zero for documents matching no term.
+        """
+        best = np.zeros(self.size, dtype=np.float32)
+        term_ids = [self.vocab[t] for t in dict.fromkeys(terms) if t in self.vocab]
+        for field in self.fields.values():
+            scores = np.zeros(self.size, dtype=np.float32)
+            for term_id in term_ids:
+                start, end = int(field.offsets[term_id]), int(field.offsets[term_id + 1])
+                if start == end:
+                    continue
+                rows = field.docs[start:end]
+                tfs = field.tfs[start:end].astype(np.float32)
+                idf = np.log1p((self.size - (end - start) + 0.5) / (end - start + 0.5))
+                # Rows are unique within a posting list, so fancy-index += is exact
+                scores[rows] += idf * tfs * (BM25_K1 + 1) / (tfs + field.norm[rows])
+            np.maximum(best, scores, out=best)
+        return best
+
+    def tag_mask(self, tags: List[str]) -> np.ndarray:
+        """Documents having any of `tags`."""
+        mask = np.zeros(self.size, dtype=bool)
+        for tag in tags:
+            tag_id = self.tag_ids.get(tag)
+            if tag_id is not None:
+                mask[self.tag_docs[self.tag_offsets[tag_id]:self.tag_offsets[tag_id + 1]]] = True
+        return mask
+
+    def tag_counts(self, mask: np.ndarray, size: int) -> List[Dict[str, Any]]:
+        """Terms aggregation buckets of the tag field over the documents in `mask`."""
+        counts = [
+            (int(np.count_nonzero(mask[self.tag_docs[self.tag_offsets[i]:self.tag_offsets[i + 1]]])), tag)
+            for i, tag in enumerate(self.tags)
+        ]
+        counts.sort(key=lambda item: (-item[0], item[1]))
+        return [{"key": tag, "doc_count": count} for count, tag in counts[:size] if count]
+
+    def document(self, row: int) -> Dict[str, Any]:
+        start, end = int(self.doc_offsets[row]), int(self.doc_offsets[row + 1])
+        # pread: no shared file position, so threads can read concurrently
+        return json.loads(os.pread(self._store, end - start, start))
+
+
+def _top_rows(scores: np.ndarray, matched: np.ndarray, k: int) -> np.ndarray:
+    """Rows of the k best matches, best first; ties in index order like ES."""
+    rows = np.flatnonzero(matched)
+    if len(rows) > k:
+        rows = np.sort(rows[np.argpartition(-scores[rows], k - 1)[:k]])
+    return rows[np.lexsort((rows, -scores[rows]))]
+
+
+def _filter_source(doc: Dict[str, Any], source) -> Dict[str, Any]:
+    if source is False:
+        return {}
+    if isinstance(source, list):
+        source = {"includes": source}
+    includes = (source or {}).get("includes")
+    excludes = set((source or {}).get("excludes") or [])
+    return {f: v for f, v in doc.items() if (includes is None or f in includes) and f not in excludes}
+
+
+def _highlight(text: str, terms: set, fragment_size: int, fragments: int, no_match_size: int) -> List[str]:
+    """Fragments around matching terms with the matches wrapped in <em>, like ES's unified highlighter."""
+    found, covered = [], -1
+    for match in _TOKEN.finditer(text or ""):
+        if match.group().lower() not in terms or match.start() < covered:
+            continue
+        start = max(0, match.start() - fragment_size // 4)
+        covered = start + fragment_size
+        fragment = _TOKEN.sub(
+            lambda m: f"<em>{m.group()}</em>" if m.group().lower() in terms else m.group(),
+            text[start:covered])
+        found.append(fragment)
+        if len(found) >= fragments:
+            break
+    if not found and no_match_size and text:
+        return [text[:no_match_size]]
+    return found
+
+
+class _Response(dict):
+    """A response dict that also has `.body`, like the client's ObjectApiResponse."""
+
+    @property
+    def body(self):
+        return self
+
+
+class LocalSearchEngine:
+    """
+    Elasticsearch stand-in over LocalIndex instances, keyed by the index
+    (alias) name of their collection. `indices` is the engine itself, so
+    `engine.indices.get_mapping(...)` works as with the client.
+    """
+
+    def __init__(self, indices: Dict[str, LocalIndex]):
+        self._indices = indices
+        self.indices = self
+
+    @classmethod
+    def open(cls, collections: List[Collection], index_dir: str, build: bool = True) -> "LocalSearchEngine":
+        """Open (and build when needed) the indices of the collections whose converted data exists."""
+        indices = {}
+        for collection in collections:
+            if not os.path.exists(collection.data_path):
+                logger.warning("no converted data for collection=%s at %s; not searchable locally",
+                               collection.name, collection.data_path)
+                continue
+            indices[collection.index] = LocalIndex.open(
+                collection, collection.data_path, os.path.join(index_dir, collection.name), build)
+        return cls(indices)
+
+    def close(self):
+        for index in self._indices.values():
+            index.close()
+
+    def _index(self, name: str) -> LocalIndex:
+        try:
+            return self._indices[name]
+        except KeyError:
+            raise KeyError(f"no such index [{name}]") from None
+
+    @staticmethod
+    def _parse_query(query: Optional[Dict[str, Any]]):
+        """The text of a multi_match query and the tags of a terms filter; None when absent."""
+        text, tags = None, None
+        parts = [query["bool"].get("must"), query["bool"].get("filter")] if query and "bool" in query else [query]
+        for part in parts:
+            for clause in part if isinstance(part, list) else [part]:
+                if clause and "multi_match" in clause:
+                    text = clause["multi_match"]["query"]
+                elif clause and "terms" in clause:
+                    tags = next(iter(clause["terms"].values()))
+        return text, tags
+
+    def search(self, index: str = None, query: Dict[str, Any] = None, knn: Dict[str, Any] = None,
+               size: int = 10, from_: int = 0, source=None, highlight: Dict[str, Any] = None,
+               aggs: Dict[str, Any] = None, sort=None, track_total_hits=None, **kwargs) -> _Response:
+        start = time.perf_counter()
+        if knn is not None:
+            raise ValueError("kNN search needs Elasticsearch; the local engine only scores BM25")
+        target = self._index(index)
+        source = kwargs.get("_source", source)
+        text, tags = self._parse_query(query)
+
+        matched = target.tag_mask(tags) if tags is not None else np.ones(target.size, dtype=bool)
+        scores = None
+        if text is not None:
+            terms = tokenize(text)
+            scores = target.bm25(terms)
+            matched &= scores > 0
+            rows = _top_rows(scores, matched, from_ + size)[from_:]
+        else:
+            # Filter-only: index order, like sort=["_doc"]
+            rows = np.flatnonzero(matched)[from_:from_ + size]
+
+        hits = []
+        for row in rows:
+            doc = target.document(int(row))
+            hit = {
+                "_index": index,
+                "_id": target.ids[row],
+                "_score": float(scores[row]) if scores is not None else None,
+                "_source": _filter_source(doc, source),
+            }
+            if highlight and text is not None:
+                highlights = {}
+                for field, options in highlight["fields"].items():
+                    fragments = _highlight(
+                        doc.get(field), set(terms), options.get("fragment_size", 100),
+                        options.get("number_of_fragments", 5), options.get("no_match_size", 0))
+                    if fragments:
+                        highlights[field] = fragments
+                if highlights:
+                    hit["highlight"] = highlights
+            hits.append(hit)
+
+        response = _Response({
+            "took": int((time.perf_counter() - start) * 1000),
+            "timed_out": False,
+            "hits": {
+                "total": {"value": int(np.count_nonzero(matched)), "relation": "eq"},
+                "max_score": hits[0]["_score"] if hits else None,
+                "hits": hits,
+            },
+        })
+        if aggs:
+            response["aggregations"] = {
+                name: {"buckets": target.tag_counts(matched, agg["terms"].get("size", 10))}
+                for name, agg in aggs.items()
+            }
+        return response
+
+    def msearch(self, searches: List[Dict[str, Any]], **kwargs) -> _Response:
+        responses = []
+        for header, body in zip(searches[::2], searches[1::2]):
+            try:
+                responses.append(self.search(index=header.get("index"), **body))
+            except (KeyError, ValueError) as exc:
+                responses.append({"error": {"type": type(exc).__name__, "reason": str(exc)}, "status": 400})
+        return _Response({"responses": responses})
+
+    def mget(self, index: str = None, ids: List[str] = None, docs: List[Dict[str, Any]] = None,
+             source_includes: List[str] = None, **kwargs) -> _Response:
+        requests = docs or [{"_index": index, "_id": doc_id} for doc_id in ids or []]
+        found = []
+        for request in requests:
+            target = self._indices.get(request.get("_index", index))
+            row = target.rows.get(request["_id"]) if target is not None else None
+            if row is None:
+                found.append({"_index": request.get("_index", index), "_id": request["_id"], "found": False})
+                continue
+            source = request.get("_source", source_includes)
+            found.append({
+                "_index": request.get("_index", index),
+                "_id": request["_id"],
+                "found": True,
+                "_source": _filter_source(target.document(row), source),
+            })
+        return _Response({"docs": found})
+
+    def get_mapping(self, index: str = None, ignore_unavailable: bool = False, **kwargs) -> _Response:
+        mappings = {}
+        for name in (index or ",".join(self._indices)).split(","):
+            if ignore_unavailable and name not in self._indices:
+                continue
+            target = self._index(name)
+            # A name of its own, so versions (and cache keys) differ from the ES index's
+            mappings[f"{name}-local"] = {"mappings": {
+                "_meta": {"build_id": target.meta["build_id"]},
+                "properties": {"rerank_passage": {"type": "text", "index": False}},
+            }}
+        return _Response(mappings)
+
+
+class AsyncLocalSearchEngine:
+    """Async facade of a LocalSearchEngine; scoring runs in a worker thread (NumPy releases the GIL)."""
+
+    def __init__(self, engine: LocalSearchEngine):
+        self.engine = engine
+        self.indices = self
+
+    async def search(self, **kwargs):
+        return await asyncio.to_thread(self.engine.search, **kwargs)
+
+    async def msearch(self, **kwargs):
+        return await asyncio.to_thread(self.engine.msearch, **kwargs)
+
+    async def mget(self, **kwargs):
+        return await asyncio.to_thread(self.engine.mget, **kwargs)
+
+    async def get_mapping(self, **kwargs):
+        return self.engine.get_mapping(**kwargs)
+
+    async def close(self):
+        pass
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import (
+    LLM_PRELOAD, SEARCH_MODE, RERANK_CONCURRENCY, RERANK_QUEUE_LIMIT,
+    LLM_CONCURRENCY, LLM_QUEUE_LIMIT, RERANKER_BACKEND, WARMUP_ENABLED,
+)
+from app.metrics import SERVICE_LOAD_SECONDS, SERVICE_RSS_DELTA_BYTES
+from app.services.executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes() -> int:
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak RSS reported by getrusage
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _load_retrieval():
+    from app.services.retrieval_service import RetrievalService
+    return RetrievalService()
+
+
+def _load_tags():
+    from app.services.tag_service import TagService
+    return TagService(registry.get("retrieval"))
+
+
+def _load_reranker():
+    from app.services.reranker_service import RerankerService
+    return RerankerService()
+
+
+def _load_embedder():
+    from app.services.embedding_service import EmbeddingService
+    return EmbeddingService()
+
+
+def _load_cache():
+    from app.services.cache import create_cache
+    return create_cache()
+
+
+def _load_llm():
+    from app.services.llm_service import LLMService
+    return LLMService()
+
+
+def _load_summaries():
+    from app.services.summary_store import SummaryStore
+    return SummaryStore()
+
+
+class ServiceRegistry:
+    """
+    Process-wide holder for the heavy services.
+
+    Every service is constructed at most once per process, either eagerly
+    through `load()` (called from the FastAPI lifespan) or lazily on the
+    first `get()`. Load time and the RSS growth caused by each load are
+    recorded in `stats`.
+    """
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]]):
+        self._factories = factories
+        self._services: Dict[str, Any] = {}
+        self._locks = {name: threading.Lock() for name in factories}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, name: str) -> Any:
+        service = self._services.get(name)
+        if service is not None:
+            return service
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            if name in self._services:
+                return self._services[name]
+
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            service = self._factories[name]()
+            load_seconds = time.perf_counter() - start
+            rss_after = _rss_bytes()
+
+            self.stats[name] = {
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_bytes": rss_after - rss_before,
+                "rss_after_bytes": rss_after,
+            }
+            SERVICE_LOAD_SECONDS.labels(name).set(load_seconds)
+            SERVICE_RSS_DELTA_BYTES.labels(name).set(rss_after - rss_before)
+            logger.info("service loaded service=%s load_seconds=%.3f rss_delta_bytes=%d rss_after_bytes=%d",
+                        name, load_seconds, rss_after - rss_before, rss_after)
+            self._services[name] = service
+            return service
+
+    def load(self, *names: str) -> None:
+        for name in names:
+            self.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._services
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "rss_bytes": _rss_bytes(),
+            "services": {
+                name: {"loaded": self.is_loaded(name), **self.stats.get(name, {})}
+                for name in self._factories
+            },
+        }
+
+    async def aclose(self) -> None:
+        for service in self._services.values():
+            aclose = getattr(service, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            close = getattr(service, "close", None)
+            if close is not None:
+                close()
+        self._services.clear()
+
+
+registry = ServiceRegistry({
+    "cache": _load_cache,
+    "retrieval": _load_retrieval,
+    "tags": _load_tags,
+    "reranker": _load_reranker,
+    "embedder": _load_embedder,
+    "llm": _load_llm,
+    "summaries": _load_summaries,
+})
+
+# Reranking and generation get separate pools so a burst of slow LLM calls
+# cannot starve /search of reranker slots.
+rerank_executor = InferenceExecutor(
+    "rerank", RERANK_CONCURRENCY, RERANK_QUEUE_LIMIT)
+llm_executor = InferenceExecutor("llm", LLM_CONCURRENCY, LLM_QUEUE_LIMIT)
+
+
+def status():
+    return {
+        **registry.status(),
+        "executors": {
+            executor.name: {
+                "pending": executor.pending,
+                "concurrency": executor.concurrency,
+                "queue_limit": executor.queue_limit,
+            }
+            for executor in (rerank_executor, llm_executor)
+        },
+    }
+
+
+# Worker startup progress, for /healthz and /readyz
+_ready = threading.Event()
+_startup_error: Optional[BaseException] = None
+_warmup: Dict[str, float] = {}
+
+
+def startup() -> None:
+    """Load the services every worker needs before it serves traffic."""
+    registry.load("cache", "retrieval", "tags", "reranker")
+    if SEARCH_MODE == "hybrid":
+        registry.load("embedder")
+    if LLM_PRELOAD:
+        registry.load("llm")
+
+
+async def astartup() -> None:
+    """
+    `startup` and the warm-up in a worker thread, then mark the worker
+    ready. Runs in the background of the lifespan, so the server answers
+    liveness probes while models load.
+    """
+    global _startup_error
+    try:
+        await asyncio.to_thread(startup)
+        if WARMUP_ENABLED:
+            from app.services.warmup import awarm_up
+            _warmup.update(await awarm_up(registry))
+    except Exception as exc:
+        logger.exception("worker startup failed")
+        _startup_error = exc
+        return
+    _ready.set()
+    logger.info("worker ready")
+
+
+def health() -> Dict[str, Any]:
+    return {
+        "ready": _ready.is_set(),
+        "error": repr(_startup_error) if _startup_error is not None else None,
+        "warmup_seconds": dict(_warmup),
+    }
+
+
+def preload_models() -> List[str]:
+    """
+    Load the model weights `startup` will need into this process: the
+    server's master before it forks its workers (gunicorn.conf.py). The
+    workers then reuse them, sharing the pages copy-on-write, and only
+    build their own services around them.
+
+    CPU only: CUDA contexts and ONNX Runtime sessions do not survive a fork.
+    """
+    from app.services import inference
+
+    if inference.resolve_device() != "cpu":
+        logger.info("model preload skipped: not on CPU")
+        return []
+    loaders = {}
+    if RERANKER_BACKEND != "onnx":
+        from app.services.reranker_service import load_reranker_model
+        loaders["reranker"] = load_reranker_model
+    if SEARCH_MODE == "hybrid":
+        from app.services.embedding_service import load_embedding_model
+        loaders["embedder"] = load_embedding_model
+    if LLM_PRELOAD:
+        from app.services.llm_service import load_llm_model
+        loaders["llm"] = load_llm_model
+
+    with inference.preloading():
+        for name, load in loaders.items():
+            start = time.perf_counter()
+            load()
+            logger.info("model preloaded service=%s load_seconds=%.3f rss_bytes=%d",
+                        name, time.perf_counter() - start, _rss_bytes())
+    return list(loaders)
+
+
+async def shutdown() -> None:
+    rerank_executor.shutdown()
+    llm_executor.shutdown()
+    await registry.aclose()
+
+
+# FastAPI dependencies. They are plain (sync) functions so that a lazy first
+# load runs in the threadpool instead of blocking the event loop.
+
+def get_retrieval():
+    return registry.get("retrieval")
+
+
+def get_tags():
+    return registry.get("tags")
+
+
+def get_reranker():
+    return registry.get("reranker")
+
+
+def get_llm():
+    return registry.get("llm")
+
+
+def get_cache():
+    return registry.get("cache")
+
+
+def get_summaries():
+    return registry.get("summaries")
+
+
+def embed_query(query: str, cache=None):
+    """
+    Embed a query for hybrid search. The encoder is only loaded when a
+    hybrid request first needs it, so call this on an inference executor.
+    """
+    return registry.get("embedder").embed_query(query, cache=cache)
+
+
+def get_rerank_executor():
+    return rerank_executor
+
+
+def get_llm_executor():
+    return llm_executor
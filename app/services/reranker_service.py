@@ -1,52 +1,271 @@
-from typing import List, Dict, Any
-from sentence_transformers import CrossEncoder
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
 import torch
+from app import metrics
+from app.collections import MOVIES, Collection, get_collection
+from app.config import (
+    RERANKER_MODEL_ID, RERANK_BATCHING, RERANK_MAX_BATCH_SIZE, RERANK_MAX_WAIT_MS,
+    RERANK_PASSAGE_MAX_TOKENS, RERANKER_DTYPE, RERANKER_QUANTIZE, RERANKER_BACKEND,
+    RERANK_CASCADE_CHUNK_SIZE, RERANK_CASCADE_TOP_N, RERANK_CASCADE_MIN_SCORE_RATIO,
+    RERANK_CASCADE_DOMINANCE_RATIO, RERANK_BUDGET_MS,
+)
+from app.services.inference import configure_threads, load_cross_encoder
+from app.services.batching import MicroBatcher
+from app.services.cache import RERANK, QueryCache, make_key, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+def truncate_plot(plot: str, tokenizer=None, max_tokens: int = RERANK_PASSAGE_MAX_TOKENS) -> str:
+    """
+    Cut a plot down to roughly `max_tokens` cross-encoder tokens.
+
+    With a (fast) tokenizer the cut is exact and lands on a token boundary;
+    without one it falls back to a word count, assuming ~0.75 words per token.
+    """
+    if not plot:
+        return ""
+    if tokenizer is not None:
+        encoding = tokenizer(plot, add_special_tokens=False, truncation=True,
+                             max_length=max_tokens, return_offsets_mapping=True)
+        offsets = encoding["offset_mapping"]
+        if not offsets or offsets[-1][1] >= len(plot):
+            return plot
+        return plot[:offsets[-1][1]]
+    words = plot.split()
+    max_words = int(max_tokens * 0.75)
+    if len(words) <= max_words:
+        return plot
+    return " ".join(words[:max_words])
+
+
+def rerank_passage(collection: Collection, doc: Dict[str, Any], tokenizer=None,
+                   max_tokens: int = RERANK_PASSAGE_MAX_TOKENS) -> str:
+    """Build the text the cross-encoder scores a document by, from its collection's template."""
+    passage = collection.rerank_template.format(
+        title=doc.get("title", ""),
+        text=truncate_plot(doc.get(collection.text_field, ""), tokenizer, max_tokens))
+    tags = doc.get(collection.tag_field) if collection.tag_field else None
+    if tags and collection.tags_template:
+        passage += collection.tags_template.format(tags=", ".join(tags))
+    return passage
+
+
+def build_rerank_passage(title: str, plot: str, tags: Optional[List[str]] = None,
+                         tokenizer=None, max_tokens: int = RERANK_PASSAGE_MAX_TOKENS) -> str:
+    """Rerank passage of a movie."""
+    return rerank_passage(MOVIES, {"title": title, "plot": plot, "tags": tags}, tokenizer, max_tokens)
+
+
+def load_reranker_model():
+    """The configured cross-encoder (RERANKER_MODEL_ID in its inference mode)."""
+    return load_cross_encoder(
+        RERANKER_MODEL_ID, dtype=RERANKER_DTYPE, quantize=RERANKER_QUANTIZE, backend=RERANKER_BACKEND)
+
 
 class RerankerService:
     def __init__(self):
         """Initialize the reranker service with a cross-encoder model."""
-        print("Loading reranker model...")
+        logger.info("loading reranker model=%s backend=%s dtype=%s quantize=%s",
+                    RERANKER_MODEL_ID, RERANKER_BACKEND, RERANKER_DTYPE, RERANKER_QUANTIZE)
+        configure_threads()
         # Use a lightweight cross-encoder model specifically trained for reranking
-        self.model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', device='cuda' if torch.cuda.is_available() else 'cpu')
-        print("Reranker model loaded successfully")
+        self.model = load_reranker_model()
+        logger.info("reranker loaded")
+
+        # Forward-pass time is measured with module hooks so that predict()
+        # time can be split into forward and tokenization/collation overhead
+        self._forward = threading.local()
+        module = self.model if isinstance(self.model, torch.nn.Module) else getattr(self.model, "model", None)
+        self._hooked = isinstance(module, torch.nn.Module)
+        if self._hooked:
+            module.register_forward_pre_hook(self._forward_started)
+            module.register_forward_hook(self._forward_finished)
+
+        # Pairs from concurrent requests are scored together in shared batches
+        self.batcher = None
+        if RERANK_BATCHING:
+            self.batcher = MicroBatcher(
+                self._predict,
+                max_batch_size=RERANK_MAX_BATCH_SIZE,
+                max_wait_ms=RERANK_MAX_WAIT_MS,
+                length_fn=lambda pair: len(pair[0]) + len(pair[1]),
+                name="reranker-batcher",
+            )
+
+        # Running estimate of wall time per scored pair, used for latency budgets
+        self.seconds_per_pair: Optional[float] = None
+        self._cost_lock = threading.Lock()
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def _forward_started(self, module, args):
+        self._forward.started = time.perf_counter()
+
+    def _forward_finished(self, module, args, output):
+        self._forward.seconds = getattr(self._forward, "seconds", 0.0) + time.perf_counter() - self._forward.started
+
+    def _predict(self, pairs):
+        self._forward.seconds = 0.0
+        start = time.perf_counter()
+        scores = self.model.predict(pairs, batch_size=RERANK_MAX_BATCH_SIZE)
+        total = time.perf_counter() - start
+        if self._hooked:
+            metrics.observe("rerank_forward", self._forward.seconds)
+            metrics.observe("rerank_tokenize", total - self._forward.seconds)
+        else:
+            metrics.observe("rerank_predict", total)
+        return scores
+
+    def score(self, pairs) -> List[float]:
+        """Score (query, document text) pairs, sharing a batch with other callers when batching is enabled."""
+        if self.batcher is None:
+            return list(self._predict(pairs))
+        return self.batcher.submit(pairs).result()
+
+    def _pair_text(self, result: Dict[Any, Any]) -> str:
+        # Passages stored at index time are used as-is; otherwise one is built from the body
+        return result.get('rerank_passage') or rerank_passage(get_collection(result.get('collection')), result)
+
+    def _timed_score(self, pairs) -> List[float]:
+        """Score pairs and fold the observed cost per pair into the running estimate."""
+        start = time.perf_counter()
+        scores = self.score(pairs)
+        per_pair = (time.perf_counter() - start) / len(pairs)
+        with self._cost_lock:
+            if self.seconds_per_pair is None:
+                self.seconds_per_pair = per_pair
+            else:
+                self.seconds_per_pair += 0.2 * (per_pair - self.seconds_per_pair)
+        return scores
 
-    def rerank(self, query: str, results: List[Dict[Any, Any]], top_k: int = 100) -> List[Dict[Any, Any]]:
+    def rerank(self, query: str, results: List[Dict[Any, Any]], top_k: int = 100,
+               cache: Optional[QueryCache] = None, cache_scope: str = "",
+               cascade: bool = False, budget_ms: Optional[float] = None) -> List[Dict[Any, Any]]:
         """
         Rerank search results using the cross-encoder model.
-        
+
         Args:
             query: Original search query
             results: List of search results from Elasticsearch
             top_k: Number of results to return after reranking
-            
+            cache: Optional cache of (query, doc_id) scores; only misses are scored
+            cache_scope: Extra key part for cached scores, e.g. the index version
+            cascade: Score in first-stage order and stop early (see `rerank_with_stats`)
+            budget_ms: Optional latency budget capping the pairs scored
+
         Returns:
             Reranked list of results
         """
+        return self.rerank_with_stats(
+            query, results, top_k, cache, cache_scope, cascade, budget_ms)[0]
+
+    def rerank_with_stats(self, query: str, results: List[Dict[Any, Any]], top_k: int = 100,
+                          cache: Optional[QueryCache] = None, cache_scope: str = "",
+                          cascade: bool = False, budget_ms: Optional[float] = None
+                          ) -> Tuple[List[Dict[Any, Any]], Dict[str, Any]]:
+        """
+        Like `rerank`, but also return what the reranking cost.
+
+        With `cascade`, candidates (assumed in first-stage order) are scored
+        in chunks of RERANK_CASCADE_CHUNK_SIZE. After each chunk, scoring stops
+        once the top RERANK_CASCADE_TOP_N are filled and either no document of
+        the chunk made it into them, or the next first-stage score is below
+        RERANK_CASCADE_MIN_SCORE_RATIO x the top one. If the first hit's score
+        is RERANK_CASCADE_DOMINANCE_RATIO x the runner-up's, only one chunk is
+        scored.
+
+        `budget_ms` (default RERANK_BUDGET_MS) caps the pairs scored to what
+        fits the budget at the measured cost per pair. Documents left
+        unscored follow the scored ones in first-stage order with a
+        `rerank_score` of None.
+
+        The stats report the candidates, pairs scored by the model, cache
+        hits, whether the top hit dominated and why scoring stopped.
+        """
+        with metrics.stage("rerank"):
+            return self._rerank(query, results, top_k, cache, cache_scope, cascade, budget_ms)
+
+    def _rerank(self, query, results, top_k, cache, cache_scope, cascade, budget_ms):
+        stats = {"candidates": len(results), "pairs_scored": 0, "cached": 0,
+                 "dominant": False, "stopped": None}
         if not results:
-            return results
-
-        # Prepare pairs of (query, document text) for scoring
-        pairs = []
-        for result in results:
-            # Create a more focused text representation for scoring
-            doc_text = f"Title: {result['title']}\nPlot: {result['plot']}"
-            if 'tags' in result:
-                doc_text += f"\nGenres: {', '.join(result['tags'])}"
-            pairs.append((query, doc_text))
-        
-        # Get similarity scores from the cross-encoder
-        scores = self.model.predict(pairs)
-        
-        # Combine results with their scores
-        scored_results = list(zip(results, scores))
-        
-        # Sort by score in descending order and get top_k
-        reranked_results = sorted(scored_results, key=lambda x: x[1], reverse=True)[:top_k]
-        
-        # Add scores to results and return just the documents
+            return results, stats
+
+        if budget_ms is None:
+            budget_ms = RERANK_BUDGET_MS
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+
+        scores = [None] * len(results)
+        if cache is not None:
+            normalized = normalize_query(query)
+            keys = [make_key(cache_scope, normalized, r.get('collection'), r['doc_id']) for r in results]
+            scores = cache.get_many(RERANK, keys)
+        stats["cached"] = sum(score is not None for score in scores)
+
+        chunk_size = RERANK_CASCADE_CHUNK_SIZE if cascade else len(results)
+        end = len(results)
+        first_stage = [r.get('score') or 0.0 for r in results]
+        if cascade and len(results) > 1 and first_stage[1] > 0 \
+                and first_stage[0] >= RERANK_CASCADE_DOMINANCE_RATIO * first_stage[1]:
+            stats["dominant"] = True
+            end = min(end, chunk_size)
+        top_n = min(top_k, RERANK_CASCADE_TOP_N)
+
+        scored_upto = 0
+        for start in range(0, end, chunk_size):
+            chunk = range(start, min(start + chunk_size, end))
+            to_score = [i for i in chunk if scores[i] is None]
+
+            if deadline is not None and to_score and self.seconds_per_pair is not None:
+                affordable = int((deadline - time.perf_counter()) / self.seconds_per_pair)
+                if affordable < len(to_score):
+                    stats["stopped"] = "budget"
+                    to_score = to_score[:max(affordable, 0)]
+
+            # Get similarity scores from the cross-encoder
+            if to_score:
+                with metrics.stage("rerank_pairs"):
+                    pairs = [(query, self._pair_text(results[i])) for i in to_score]
+                new_scores = self._timed_score(pairs)
+                metrics.RERANK_PAIRS.inc(len(pairs))
+                for i, score in zip(to_score, new_scores):
+                    scores[i] = float(score)
+                stats["pairs_scored"] += len(to_score)
+                if cache is not None:
+                    cache.set_many(RERANK, {keys[i]: scores[i] for i in to_score})
+            if stats["stopped"] == "budget":
+                break
+            scored_upto = chunk.stop
+
+            if cascade and scored_upto < end:
+                known = sorted((s for s in scores[:scored_upto] if s is not None), reverse=True)
+                if len(known) >= top_n:
+                    cutoff = known[top_n - 1]
+                    if max(scores[i] for i in chunk) < cutoff:
+                        stats["stopped"] = "no_gain"
+                        break
+                    if first_stage[scored_upto] < RERANK_CASCADE_MIN_SCORE_RATIO * first_stage[0]:
+                        stats["stopped"] = "score_ratio"
+                        break
+        if stats["stopped"] is None and end < len(results):
+            stats["stopped"] = "dominant"
+
+        # Scored (or cached) documents by rerank score, then the rest in first-stage order
+        scored = sorted(((doc, score) for doc, score in zip(results, scores) if score is not None),
+                        key=lambda x: x[1], reverse=True)
+        unscored = [doc for doc, score in zip(results, scores) if score is None]
+
         final_results = []
-        for doc, score in reranked_results:
+        for doc, score in scored[:top_k]:
             doc['rerank_score'] = float(score)  # Convert to float for JSON serialization
             final_results.append(doc)
-            
-        return final_results 
\ No newline at end of file
+        for doc in unscored[:top_k - len(final_results)]:
+            doc['rerank_score'] = None
+            final_results.append(doc)
+
+        return final_results, stats
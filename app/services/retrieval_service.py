@@ -1,18 +1,103 @@
-from elasticsearch import Elasticsearch
-from app.config import ELASTIC_HOST, ELASTIC_USER, ELASTIC_PASSWORD, ELASTIC_INDEX
+import asyncio
+import logging
+import time
+from typing import List, Optional
+from app.config import (
+    RERANK_STORED_PASSAGES, INDEX_VERSION_CHECK_SECONDS,
+    HYBRID_NUM_CANDIDATES, RRF_K, SNIPPET_CHARS, SNIPPET_FRAGMENTS, FEDERATED_MERGE,
+)
+from app import metrics
+from app.collections import EMBEDDING_FIELD, Collection, get_collection
+from app.services.backends import create_clients
+from app.services.cache import HITS, QueryCache, make_key, normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Fields a result can carry; `doc_id` is always included. `plot` (movies) and
+# `text` (other collections) are the document body.
+RESULT_FIELDS = {"collection", "title", "tags", "source", "plot", "text", "snippet", "score", "rerank_score"}
+DEFAULT_RESULT_FIELDS = ["collection", "title", "tags", "source", "snippet", "score", "rerank_score"]
+
+MERGE_METHODS = ("rrf", "normalize")
+
+
+def select_fields(results, fields):
+    """Copy each result with only `doc_id` and the requested fields."""
+    wanted = ["doc_id", *(f for f in fields if f != "doc_id")]
+    return [{f: result[f] for f in wanted if f in result} for result in results]
+
+
+def snippet_highlight(collection: Collection):
+    """Body highlights: matching fragments, or the start of the body when only the title matched (no_match_size)."""
+    return {
+        "fields": {
+            collection.text_field: {
+                "fragment_size": SNIPPET_CHARS,
+                "number_of_fragments": SNIPPET_FRAGMENTS,
+                "no_match_size": SNIPPET_CHARS,
+            }
+        }
+    }
 
 
 class RetrievalService:
     def __init__(self):
-        self.es = Elasticsearch(ELASTIC_HOST, basic_auth=(
-            ELASTIC_USER, ELASTIC_PASSWORD))
-        self.index = ELASTIC_INDEX
+        # Elasticsearch clients, or stand-ins answering the same requests
+        # (RETRIEVAL_BACKEND, see app/services/backends.py); `aes` is used
+        # by the async routes so round trips never block the event loop
+        self.es, self.aes = create_clients()
+        self.index = get_collection().index
+        # Collection index -> (version, stores rerank passages, checked at)
+        self._versions = {}
+
+    def close(self):
+        self.es.close()
 
-    def search(self, query: str, top_k: int = 10, tags: list[str] = None):
+    async def aclose(self):
+        await self.aes.close()
+
+    async def aindex_version(self, collections: Optional[List[Collection]] = None) -> str:
+        """
+        Identify the index contents currently being served.
+
+        Combines the concrete index name(s) behind the collections' aliases
+        (default: DEFAULT_COLLECTION) with the `_meta.build_id` the indexer
+        writes when it finishes, so the value changes on every reindex.
+        Re-read at most every INDEX_VERSION_CHECK_SECONDS, together with
+        whether the indices store rerank passages (see `_source_filter`).
+        """
+        collections = collections or [get_collection()]
+        now = time.monotonic()
+        stale = [
+            c for c in collections
+            if now - self._versions.get(c.index, (None, False, -INDEX_VERSION_CHECK_SECONDS - 1))[2]
+            > INDEX_VERSION_CHECK_SECONDS
+        ]
+        if stale:
+            responses = await asyncio.gather(*(
+                self.aes.indices.get_mapping(index=c.index, ignore_unavailable=True) for c in stale))
+            for collection, response in zip(stale, responses):
+                mappings = sorted(response.body.items())
+                version = "|".join(
+                    f"{name}:{mapping['mappings'].get('_meta', {}).get('build_id', '')}"
+                    for name, mapping in mappings
+                )
+                # Every index behind the alias must have the field (both do mid-swap)
+                passages = bool(mappings) and all(
+                    "rerank_passage" in mapping["mappings"].get("properties", {}) for _, mapping in mappings)
+                self._versions[collection.index] = (version, passages, now)
+        return "|".join(self._versions[c.index][0] for c in collections)
+
+    def stores_passages(self, collection: Collection) -> bool:
+        """Whether the collection's index has stored rerank passages, as of the last version check."""
+        return self._versions.get(collection.index, (None, False, 0.0))[1]
+
+    def _build_query(self, query: str, tags: list[str] = None, collection: Optional[Collection] = None):
+        collection = collection or get_collection()
         must_clause = {
             "multi_match": {
                 "query": query,
-                "fields": ["title", "plot"]
+                "fields": collection.search_fields
             }
         }
 
@@ -25,24 +110,254 @@ class RetrievalService:
         if tags:
             es_query["bool"]["filter"] = {
                 "terms": {
-                    "tags": tags
+                    collection.tag_field: tags
                 }
             }
 
-        response = self.es.search(
-            index=self.index,
-            query=es_query,
-            size=top_k
-        )
+        return es_query
 
-        return [
-            {
+    def _source_filter(self, collection: Collection, for_rerank: bool, with_plot: bool = True):
+        # Embeddings are only used for kNN scoring, never sent back
+        source = {"excludes": [EMBEDDING_FIELD]}
+        if for_rerank and RERANK_STORED_PASSAGES and self.stores_passages(collection):
+            # The stored passage replaces the full body, which is only loaded
+            # afterwards for the hits that survive reranking. Indices without
+            # the field (or not checked yet) send the body to build it from.
+            source["includes"] = [*collection.summary_fields, "rerank_passage"]
+        elif not with_plot and not for_rerank:
+            source["includes"] = collection.summary_fields
+        return source
+
+    def _search_body(self, collection: Collection, query: str, top_k: int, tags: list[str] = None,
+                     for_rerank: bool = False, snippets: bool = False, with_plot: bool = True):
+        body = {
+            "query": self._build_query(query, tags, collection),
+            "size": top_k,
+            "source": self._source_filter(collection, for_rerank, with_plot),
+        }
+        if snippets:
+            body["highlight"] = snippet_highlight(collection)
+        return body
+
+    def _msearch_body(self, collections: List[Collection], query: str, query_vector: Optional[List[float]],
+                      top_k: int, tags: list[str] = None, for_rerank: bool = False,
+                      snippets: bool = False, with_plot: bool = True):
+        """
+        One BM25 search per collection, plus a kNN search each with a
+        `query_vector`, for a single msearch round trip. Returns the
+        searches and the collection of each result list.
+        """
+        searches, lists = [], []
+        for collection in collections:
+            lexical = self._search_body(collection, query, top_k, tags, for_rerank, snippets, with_plot)
+            lexical["_source"] = lexical.pop("source")
+            searches += [{"index": collection.index}, lexical]
+            lists.append(collection)
+            if query_vector is None:
+                continue
+
+            knn = {
+                "field": EMBEDDING_FIELD,
+                "query_vector": query_vector,
+                "k": top_k,
+                "num_candidates": max(top_k, HYBRID_NUM_CANDIDATES),
+            }
+            if tags:
+                knn["filter"] = {"terms": {collection.tag_field: tags}}
+            dense = {"knn": knn, "size": top_k, "_source": lexical["_source"]}
+            if snippets:
+                # The query is only used for highlighting here
+                dense["highlight"] = {**snippet_highlight(collection), "highlight_query": lexical["query"]}
+            searches += [{"index": collection.index}, dense]
+            lists.append(collection)
+        return searches, lists
+
+    @classmethod
+    def _merge(cls, lists: List[Collection], responses, top_k: int, merge: str = FEDERATED_MERGE):
+        """
+        Merge result lists (per collection, and BM25/kNN in hybrid mode).
+
+        `rrf`: every hit scores sum(1 / (RRF_K + rank)) over the lists it
+        appears in, so BM25 and cosine scores need no normalization.
+        `normalize`: scores are min-max scaled per list and summed.
+        A list whose search failed is skipped, unless all of them failed.
+        """
+        fused = {}
+        scores = {}
+        failed = 0
+        for collection, response in zip(lists, responses):
+            if "error" in response:
+                logger.warning("search failed collection=%s error=%s", collection.name, response["error"])
+                failed += 1
+                continue
+            hits = cls._to_hits(response, collection)
+            if merge == "normalize" and hits:
+                low, high = min(h["score"] for h in hits), max(h["score"] for h in hits)
+            for rank, hit in enumerate(hits, start=1):
+                key = (hit["collection"], hit["doc_id"])
+                if merge == "normalize":
+                    score = (hit["score"] - low) / (high - low) if high > low else 1.0
+                else:
+                    score = 1.0 / (RRF_K + rank)
+                fused.setdefault(key, hit)
+                scores[key] = scores.get(key, 0.0) + score
+        if lists and failed == len(lists):
+            raise RuntimeError(f"Search failed: {responses[0]['error']}")
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        hits = []
+        for key in ranked:
+            hit = fused[key]
+            hit["score"] = scores[key]
+            hits.append(hit)
+        return hits
+
+    @staticmethod
+    def _to_hits(response, collection: Optional[Collection] = None):
+        collection = collection or get_collection()
+        hits = []
+        for hit in response["hits"]["hits"]:
+            source = hit["_source"]
+            result = {
                 "doc_id": hit["_id"],
+                "collection": collection.name,
                 "score": hit["_score"],
-                "title": hit["_source"]["title"],
-                "plot": hit["_source"]["plot"],
-                "tags": hit["_source"]["tags"],
-                "source": hit["_source"]["source"]
             }
-            for hit in response["hits"]["hits"]
+            for field in collection.summary_fields:
+                result[field] = source.get(field)
+            if collection.text_field in source:
+                result[collection.text_field] = source[collection.text_field]
+            if "rerank_passage" in source:
+                result["rerank_passage"] = source["rerank_passage"]
+            if "highlight" in hit:
+                result["snippet"] = " … ".join(hit["highlight"].get(collection.text_field, []))
+            hits.append(result)
+        return hits
+
+    @staticmethod
+    def _targets(collections: Optional[List[Collection]], tags: list[str] = None):
+        collections = collections or [get_collection()]
+        if tags:
+            # Collections without tags cannot match a tag filter
+            collections = [c for c in collections if c.tag_field]
+        return collections
+
+    def search(self, query: str, top_k: int = 10, tags: list[str] = None, for_rerank: bool = False,
+               query_vector: Optional[List[float]] = None, snippets: bool = False, with_plot: bool = True,
+               collections: Optional[List[Collection]] = None, merge: str = FEDERATED_MERGE):
+        """
+        Run the BM25 query. With `for_rerank`, hits carry the stored rerank
+        passage instead of the body; call `hydrate` on the reranked subset.
+        With a `query_vector` (see `EmbeddingService.embed_query`) a kNN
+        search runs alongside and both lists are merged.
+        With `snippets`, hits carry highlighted body fragments as `snippet`;
+        `with_plot=False` leaves the body out of the fetched source.
+        Several `collections` (default: DEFAULT_COLLECTION) are searched
+        in one msearch and merged with `merge` (rrf or normalize).
+        """
+        collections = self._targets(collections, tags)
+        if not collections:
+            return []
+        with metrics.stage("es"):
+            if query_vector is not None or len(collections) > 1:
+                searches, lists = self._msearch_body(
+                    collections, query, query_vector, top_k, tags, for_rerank, snippets, with_plot)
+                response = self.es.msearch(searches=searches)
+                return self._merge(lists, response["responses"], top_k, merge)
+
+            collection = collections[0]
+            response = self.es.search(
+                index=collection.index,
+                **self._search_body(collection, query, top_k, tags, for_rerank, snippets, with_plot)
+            )
+
+        return self._to_hits(response, collection)
+
+    async def asearch(self, query: str, top_k: int = 10, tags: list[str] = None, for_rerank: bool = False,
+                      query_vector: Optional[List[float]] = None, snippets: bool = False,
+                      with_plot: bool = True, collections: Optional[List[Collection]] = None,
+                      merge: str = FEDERATED_MERGE, cache: Optional[QueryCache] = None, cache_scope: str = ""):
+        """
+        Async variant of `search` for use from `async def` routes. With a
+        `cache`, hits are looked up and stored under `cache_scope` (the
+        index version) plus the normalized query, tags, sizes, collections and mode.
+        """
+        collections = self._targets(collections, tags)
+        if not collections:
+            return []
+        if cache is not None:
+            mode = "hybrid" if query_vector is not None else "bm25"
+            key = make_key(cache_scope, normalize_query(query), tags or [], top_k, for_rerank, mode,
+                           snippets, with_plot, [c.name for c in collections], merge)
+            hits = await cache.aget(HITS, key)
+            if hits is not None:
+                return hits
+
+        with metrics.stage("es"):
+            if query_vector is not None or len(collections) > 1:
+                searches, lists = self._msearch_body(
+                    collections, query, query_vector, top_k, tags, for_rerank, snippets, with_plot)
+                response = await self.aes.msearch(searches=searches)
+                hits = self._merge(lists, response["responses"], top_k, merge)
+            else:
+                collection = collections[0]
+                response = await self.aes.search(
+                    index=collection.index,
+                    **self._search_body(collection, query, top_k, tags, for_rerank, snippets, with_plot)
+                )
+                hits = self._to_hits(response, collection)
+
+        if cache is not None:
+            await cache.aset(HITS, key, hits)
+        return hits
+
+    @staticmethod
+    def _missing_bodies(results):
+        """Results without their body, and the mget entries that load it."""
+        missing, docs = [], []
+        for result in results:
+            collection = get_collection(result.get("collection"))
+            if collection.text_field not in result:
+                missing.append(result)
+                docs.append({"_index": collection.index, "_id": result["doc_id"],
+                             "_source": [collection.text_field]})
+        return missing, docs
+
+    @staticmethod
+    def _fill_bodies(results, missing, response):
+        # mget answers in request order
+        for result, doc in zip(missing, response["docs"]):
+            field = get_collection(result.get("collection")).text_field
+            result[field] = doc["_source"].get(field, "") if doc.get("found") else ""
+        for result in results:
+            result.pop("rerank_passage", None)
+        return results
+
+    def hydrate(self, results):
+        """Load bodies for results fetched with `for_rerank` and drop the rerank passages."""
+        missing, docs = self._missing_bodies(results)
+        if not missing:
+            return self._fill_bodies(results, [], {"docs": []})
+        with metrics.stage("es_hydrate"):
+            response = self.es.mget(docs=docs)
+        return self._fill_bodies(results, missing, response)
+
+    async def ahydrate(self, results):
+        """Async variant of `hydrate`."""
+        missing, docs = self._missing_bodies(results)
+        if not missing:
+            return self._fill_bodies(results, [], {"docs": []})
+        with metrics.stage("es_hydrate"):
+            response = await self.aes.mget(docs=docs)
+        return self._fill_bodies(results, missing, response)
+
+    async def aget_documents(self, ids: List[str], fields: Optional[List[str]] = None,
+                             collection: Optional[Collection] = None):
+        """Fetch full documents by id, in the order given; unknown ids are skipped."""
+        collection = collection or get_collection()
+        with metrics.stage("es_docs"):
+            response = await self.aes.mget(
+                index=collection.index, ids=ids, source_includes=fields or collection.document_fields)
+        return [
+            {"doc_id": doc["_id"], **doc["_source"]}
+            for doc in response["docs"] if doc.get("found")
         ]
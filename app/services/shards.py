@@ -0,0 +1,73 @@
+"""
+Sharded dataset layout written by scripts/convert.py and read by the indexer
+and the benchmarks.
+
+A converted dataset is a directory with shard files (`part-00000.jsonl` or
+`part-00000.parquet`) and a `manifest.json` listing them with their row
+counts and checksums, plus a fingerprint of the input they were made from.
+Plain JSONL files from older conversions are read as a single shard.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST = "manifest.json"
+
+
+def file_checksum(path, block_size=1 << 20):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    """Write the manifest atomically, so readers never see a half-written one."""
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def shard_paths(path):
+    """Shard files of a converted dataset directory, or the file itself."""
+    if not os.path.isdir(path):
+        return [path]
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST} in {path}; run `python -m scripts.convert` first")
+    return [os.path.join(path, shard["path"]) for shard in manifest["shards"]]
+
+
+def iter_shard(path, batch_size=10000):
+    """Records of one shard as dicts."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def iter_records(path, limit=None):
+    """Records of a converted dataset (directory or JSONL file), shard by shard."""
+    count = 0
+    for shard in shard_paths(path):
+        for record in iter_shard(shard):
+            yield record
+            count += 1
+            if limit and count >= limit:
+                return
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+from app.services.executor import InferenceExecutor
+
+_DONE = object()
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class TextStream:
+    """
+    Runs a blocking generation function on an executor and exposes the text
+    it produces as an async iterator.
+
+    `fn` is called as `fn(*args, on_text=..., cancel=..., **kwargs)`: it
+    must call `on_text(chunk)` for every decoded piece of text and stop
+    early once `cancel` (a `threading.Event`) is set. Its return value is
+    available as `result` after iteration ends.
+
+    The work is admitted to the executor in the constructor, so an
+    overloaded executor raises `OverloadedError` before any response bytes
+    have been sent.
+    """
+
+    def __init__(self, executor: InferenceExecutor, fn: Callable[..., Any], *args, **kwargs):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.cancel_event = threading.Event()
+        self._future = executor.submit(
+            fn, *args, on_text=self._on_text, cancel=self.cancel_event, **kwargs)
+        self._future.add_done_callback(lambda _: self._queue.put_nowait(_DONE))
+
+    def _on_text(self, text: str) -> None:
+        # Called from the executor thread
+        if text:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, text)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            yield item
+
+    @property
+    def result(self) -> Any:
+        return self._future.result()
+
+    def cancel(self) -> None:
+        """Ask the generation to stop, e.g. because the client went away."""
+        self.cancel_event.set()
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    `text/event-stream` response that cancels its TextStream when the
+    response ends, however it ends: including when the client disconnects
+    before the body starts, so the generator (and any `finally` in it)
+    never runs and would otherwise leave the generation holding its slot.
+    """
+
+    def __init__(self, content, text_stream: Optional[TextStream] = None):
+        super().__init__(content, media_type="text/event-stream")
+        self.text_stream = text_stream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.text_stream is not None:
+                self.text_stream.cancel()
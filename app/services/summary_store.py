@@ -0,0 +1,142 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.collections import Collection, get_collection
+from app.config import SUMMARY_STORE_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+)
+"""
+
+_TOKEN = re.compile(r"\w+")
+# Query words that say nothing about why a document matched
+_STOPWORDS = frozenset(
+    "a an and are as at about be by for from has have in into is it its of on or that the their "
+    "this to was were with who what where when which movie movies film films story stories".split()
+)
+
+
+def text_hash(collection: Collection, doc: Dict[str, Any]) -> str:
+    """Fingerprint of what a document's summary is made from."""
+    text = f"{doc.get('title') or ''}\0{doc.get(collection.text_field) or ''}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _join(words) -> str:
+    words = list(words)
+    return words[0] if len(words) == 1 else f"{', '.join(words[:-1])} and {words[-1]}"
+
+
+def relevance_sentence(query: str, result: Dict[str, Any], summary: str = "") -> str:
+    """
+    One sentence on why a result matches the query, without the LLM: the
+    result's tags that share a word with the query, else the query words
+    found in its title, text, snippet or summary.
+    """
+    collection = get_collection(result.get("collection"))
+    kind = collection.kind.lower()
+    terms = [t for t in dict.fromkeys(_TOKEN.findall(query.lower())) if t not in _STOPWORDS]
+
+    tags = (result.get(collection.tag_field) or []) if collection.tag_field else []
+    matching_tags = [tag for tag in tags if set(_TOKEN.findall(tag.lower())) & set(terms)]
+    if matching_tags:
+        return f"This {kind} is tagged {_join(matching_tags)}, matching your search."
+
+    text = " ".join(
+        str(result.get(field) or "")
+        for field in ("title", collection.text_field, "rerank_passage", "snippet")
+    )
+    words = set(_TOKEN.findall(f"{text} {summary}".lower()))
+    matched = [t for t in terms if t in words]
+    if matched:
+        return f"It matches your search on {_join(matched)}."
+    return f"It is the closest {kind} to your search."
+
+
+class SummaryStore:
+    """
+    Query-independent document summaries, generated offline by
+    scripts/summarize.py, in a SQLite file keyed by (collection, doc_id).
+
+    The API only reads: a lookup is one indexed query on a per-thread
+    read-only connection. The file is opened once it exists, so summaries
+    written after the API started are picked up. WAL mode lets the batch
+    job write while workers read.
+    """
+
+    def __init__(self, path: str = SUMMARY_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self, write: bool = False) -> Optional[sqlite3.Connection]:
+        attr = "writer" if write else "reader"
+        connection = getattr(self._local, attr, None)
+        if connection is not None:
+            return connection
+        if write:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+        else:
+            if not self.path or not os.path.exists(self.path):
+                return None
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        setattr(self._local, attr, connection)
+        return connection
+
+    def close(self):
+        for attr in ("reader", "writer"):
+            connection = getattr(self._local, attr, None)
+            if connection is not None:
+                connection.close()
+                setattr(self._local, attr, None)
+
+    def get(self, collection: str, doc_id: str, digest: Optional[str] = None) -> Optional[str]:
+        """
+        The stored summary of a document, or None. With the `digest` (see
+        `text_hash`) of the document as it is indexed now, a summary made
+        from an older title or body is not returned either.
+        """
+        connection = self._connection()
+        if connection is None:
+            return None
+        try:
+            row = connection.execute(
+                "SELECT summary, text_hash FROM summaries WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # The batch job has not created the table yet
+            return None
+        if row is None or (digest is not None and row[1] != digest):
+            return None
+        return row[0]
+
+    def fingerprints(self, collection: str) -> Dict[str, Tuple[str, str]]:
+        """doc_id -> (text hash, model) of the stored summaries of a collection."""
+        rows = self._connection(write=True).execute(
+            "SELECT doc_id, text_hash, model FROM summaries WHERE collection = ?", (collection,))
+        return {doc_id: (digest, model) for doc_id, digest, model in rows}
+
+    def put_many(self, collection: str, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Store (doc_id, summary, text hash, model) rows, replacing earlier summaries."""
+        connection = self._connection(write=True)
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?)",
+                [(collection, doc_id, summary, digest, model, now) for doc_id, summary, digest, model in rows])
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.collections import Collection
+from app.config import TAG_VOCABULARY_SIZE, FACET_SIZE, TAG_WARM_FILTERS
+from app.services.cache import FACETS, HITS, QueryCache, make_key, normalize_query
+from app.services.retrieval_service import RetrievalService
+
+logger = logging.getLogger(__name__)
+
+# Distinct tag filters counted per worker; past this the least used half is dropped
+MAX_TRACKED_FILTERS = 1000
+
+
+def tag_filter(collection: Collection, tags: List[str]):
+    """Filter clause matching documents with any of `tags`; cached by ES per segment."""
+    return {"terms": {collection.tag_field: sorted(set(tags))}}
+
+
+def facet_aggs(collection: Collection, size: int = FACET_SIZE):
+    return {"tags": {"terms": {"field": collection.tag_field, "size": size}}}
+
+
+class TagService:
+    """
+    Tag vocabulary, facet counts and filter-only browsing over the tag
+    keyword field of the collections that have one.
+
+    A collection's vocabulary (tag -> document count) comes from one terms
+    aggregation and is kept in memory until its index version changes.
+    Tag filters used by requests are counted; once per index version the
+    most used ones are run against the new index, so its filter and
+    request caches are warm before users ask for them.
+    """
+
+    def __init__(self, retrieval: RetrievalService):
+        self.retrieval = retrieval
+        # Collection name -> (index version, {tag: document count})
+        self._vocabularies: Dict[str, Tuple[str, Dict[str, int]]] = {}
+        # (collection name, sorted known tags) -> requests using that filter,
+        # at most MAX_TRACKED_FILTERS entries
+        self._filter_uses: Counter = Counter()
+        # Collection name -> index version whose caches were warmed
+        self._warmed: Dict[str, str] = {}
+        self._tasks = set()
+
+    async def avocabulary(self, collection: Collection) -> Dict[str, int]:
+        """All tags of a collection with their document counts, most frequent first."""
+        version = await self.retrieval.aindex_version([collection])
+        cached = self._vocabularies.get(collection.name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with metrics.stage("es_tags"):
+            response = await self.retrieval.aes.search(
+                index=collection.index, size=0, aggs=facet_aggs(collection, TAG_VOCABULARY_SIZE))
+        vocabulary = {
+            bucket["key"]: bucket["doc_count"]
+            for bucket in response["aggregations"]["tags"]["buckets"]
+        }
+        self._vocabularies[collection.name] = (version, vocabulary)
+        logger.info("tag vocabulary loaded collection=%s tags=%d version=%s",
+                    collection.name, len(vocabulary), version)
+        return vocabulary
+
+    @staticmethod
+    def _buckets(responses) -> List[Dict[str, Any]]:
+        counts = Counter()
+        for response in responses:
+            if "error" in response:
+                continue
+            for bucket in response["aggregations"]["tags"]["buckets"]:
+                counts[bucket["key"]] += bucket["doc_count"]
+        return [{"tag": tag, "count": count} for tag, count in counts.most_common(FACET_SIZE)]
+
+    async def afacets(self, query: str, tags: Optional[List[str]], collections: List[Collection],
+                      cache: Optional[QueryCache] = None, cache_scope: str = "") -> Dict[str, Any]:
+        """
+        Tag counts over all documents matching the query (and tag filter),
+        summed across collections. Runs as size-0 searches, which ES answers
+        from its shard request cache when the same query repeats.
+        """
+        collections = [c for c in collections if c.tag_field]
+        if not collections:
+            return {"tags": []}
+        if cache is not None:
+            key = make_key(cache_scope, normalize_query(query), tags or [], [c.name for c in collections])
+            facets = await cache.aget(FACETS, key)
+            if facets is not None:
+                return facets
+
+        searches = []
+        for collection in collections:
+            searches += [
+                {"index": collection.index},
+                {"query": self.retrieval._build_query(query, tags, collection),
+                 "size": 0, "aggs": facet_aggs(collection)},
+            ]
+        with metrics.stage("es_facets"):
+            response = await self.retrieval.aes.msearch(searches=searches)
+        facets = {"tags": self._buckets(response["responses"])}
+
+        if cache is not None:
+            await cache.aset(FACETS, key, facets)
+        return facets
+
+    async def abrowse(self, tags: List[str], collection: Collection, offset: int = 0, limit: int = 25,
+                      facets: bool = False, with_plot: bool = False,
+                      cache: Optional[QueryCache] = None, cache_scope: str = "") -> Dict[str, Any]:
+        """
+        Documents with any of `tags`, in index order: a filter-only query,
+        so no scoring, no rerank, and the filter is served from ES's cache.
+        With `facets`, the counts of co-occurring tags come in the same request.
+        """
+        if cache is not None:
+            key = make_key(cache_scope, "browse", collection.name, tags, offset, limit, facets, with_plot)
+            page = await cache.aget(HITS, key)
+            if page is not None:
+                return page
+
+        body = {
+            "query": {"bool": {"filter": tag_filter(collection, tags)}},
+            "from_": offset,
+            "size": limit,
+            "sort": ["_doc"],
+            "source": self.retrieval._source_filter(collection, for_rerank=False, with_plot=with_plot),
+            "track_total_hits": True,
+        }
+        if facets:
+            body["aggs"] = facet_aggs(collection)
+        with metrics.stage("es_browse"):
+            response = await self.retrieval.aes.search(index=collection.index, **body)
+
+        page = {
+            "total": response["hits"]["total"]["value"],
+            "results": self.retrieval._to_hits(response, collection),
+        }
+        if facets:
+            page["facets"] = {"tags": self._buckets([response])}
+
+        if cache is not None:
+            await cache.aset(HITS, key, page)
+        return page
+
+    async def aobserve(self, collections: List[Collection], tags: Optional[List[str]] = None) -> None:
+        """Count a request's tag filter; warm the most used filters once per new index version."""
+        for collection in collections:
+            if not collection.tag_field:
+                continue
+            if tags:
+                await self._count_filter(collection, tags)
+            version = await self.retrieval.aindex_version([collection])
+            if self._warmed.get(collection.name) != version:
+                self._warmed[collection.name] = version
+                task = asyncio.create_task(self.awarm(collection))
+                # Keep a reference until it finishes
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _count_filter(self, collection: Collection, tags: List[str]) -> None:
+        # Only tags of the vocabulary (loaded once per index version), so
+        # made-up ones cannot grow the counter
+        try:
+            vocabulary = await self.avocabulary(collection)
+        except Exception:
+            logger.warning("tag vocabulary unavailable collection=%s", collection.name, exc_info=True)
+            return
+        known = tuple(sorted(tag for tag in set(tags) if tag in vocabulary))
+        if not known:
+            return
+        self._filter_uses[(collection.name, known)] += 1
+        if len(self._filter_uses) > MAX_TRACKED_FILTERS:
+            self._filter_uses = Counter(dict(self._filter_uses.most_common(MAX_TRACKED_FILTERS // 2)))
+
+    async def awarm(self, collection: Collection) -> None:
+        """Run the TAG_WARM_FILTERS most used tag filters of a collection once."""
+        filters = [
+            tags for (name, tags), _ in self._filter_uses.most_common() if name == collection.name
+        ][:TAG_WARM_FILTERS]
+        if not filters:
+            return
+        searches = []
+        for tags in filters:
+            searches += [
+                {"index": collection.index, "request_cache": True},
+                {"query": {"bool": {"filter": tag_filter(collection, list(tags))}},
+                 "size": 0, "aggs": facet_aggs(collection)},
+            ]
+        try:
+            with metrics.stage("tag_warm"):
+                await self.retrieval.aes.msearch(searches=searches)
+            logger.info("tag filters warmed collection=%s filters=%d", collection.name, len(filters))
+        except Exception:
+            logger.warning("tag filter warming failed collection=%s", collection.name, exc_info=True)
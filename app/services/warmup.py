@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+from app.collections import get_collection
+from app.config import FEDERATED_MERGE, SEARCH_MODE, WARMUP_QUERIES_FILE, WARMUP_QUERY_LIMIT
+from app.services.retrieval_service import DEFAULT_RESULT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Used without a WARMUP_QUERIES_FILE: short and long, with and without matches
+DEFAULT_QUERIES = [
+    "action movie with a car chase",
+    "haunted house ghost story",
+    "romantic comedy in new york",
+    "a detective investigates a series of murders in a small town",
+    "space",
+    "protein folding in cancer cells",
+    "history of the roman empire",
+    "heist",
+]
+
+# Candidates retrieved and reranked per warm-up query: a default /search request's top_k
+RERANK_CANDIDATES = 25
+LLM_TOKENS = 8
+
+
+def load_queries(path: str = WARMUP_QUERIES_FILE, limit: int = WARMUP_QUERY_LIMIT) -> List[str]:
+    """Queries of a JSONL query log (a `query` per line, or plain lines), or DEFAULT_QUERIES."""
+    if not path:
+        return DEFAULT_QUERIES[:limit]
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = line
+            queries.append(entry["query"] if isinstance(entry, dict) else str(entry))
+            if len(queries) >= limit:
+                break
+    return queries or DEFAULT_QUERIES[:limit]
+
+
+async def awarm_up(registry, queries: List[str] = None) -> Dict[str, Any]:
+    """
+    Run queries through every loaded service the way requests do, so the
+    first real requests find warm index caches, allocated buffers and
+    compiled kernels. Runs on the worker's event loop: retrieval goes
+    through the async client and the query cache the routes use, with the
+    parameters of a default /search request, and the model steps run in a
+    thread.
+
+    A failing step is logged and skipped; returns seconds per step.
+    """
+    queries = queries or load_queries()
+    timings = {}
+
+    async def step(name, run):
+        start = time.perf_counter()
+        try:
+            await run()
+        except Exception:
+            logger.warning("warm-up step failed step=%s", name, exc_info=True)
+            return
+        timings[name] = round(time.perf_counter() - start, 3)
+
+    candidates = {}
+
+    async def retrieve():
+        retrieval = registry.get("retrieval")
+        cache = registry.get("cache") if registry.is_loaded("cache") else None
+        collections = [get_collection()]
+        version = await retrieval.aindex_version(collections)
+        for query in queries:
+            query_vector = None
+            if SEARCH_MODE == "hybrid" and registry.is_loaded("embedder"):
+                query_vector = await asyncio.to_thread(registry.get("embedder").embed_query, query, cache)
+            candidates[query] = await retrieval.asearch(
+                query, top_k=RERANK_CANDIDATES, for_rerank=True, query_vector=query_vector,
+                snippets="snippet" in DEFAULT_RESULT_FIELDS, with_plot=False, collections=collections,
+                merge=FEDERATED_MERGE, cache=cache, cache_scope=version)
+
+    def rerank():
+        reranker = registry.get("reranker")
+        for query in queries:
+            # Without hits (e.g. Elasticsearch is down) the queries stand in as passages
+            hits = candidates.get(query) or [{"doc_id": str(i), "title": q, "plot": q} for i, q in enumerate(queries)]
+            reranker.rerank(query, hits, top_k=len(hits))
+
+    def embed():
+        embedder = registry.get("embedder")
+        for query in queries:
+            embedder.embed_query(query)
+
+    def generate():
+        llm = registry.get("llm")
+        llm.generate(queries[0], max_new_tokens=LLM_TOKENS)
+
+    if registry.is_loaded("retrieval"):
+        await step("retrieval", retrieve)
+    if registry.is_loaded("reranker"):
+        await step("reranker", lambda: asyncio.to_thread(rerank))
+    if registry.is_loaded("embedder"):
+        await step("embedder", lambda: asyncio.to_thread(embed))
+    if registry.is_loaded("llm"):
+        await step("llm", lambda: asyncio.to_thread(generate))
+    logger.info("warm-up finished queries=%d timings=%s", len(queries), timings)
+    return timings
@@ -0,0 +1,61 @@
+"""
+Production server: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+With MODEL_PRELOAD the master loads the model weights once before forking
+(see registry.preload_models), so the workers share them instead of each
+loading its own copy. Each worker then builds its services and warms up in
+the background; /readyz turns 200 when it is done.
+
+WEB_CONCURRENCY sets the number of workers. Give each
+TORCH_NUM_THREADS = cores / workers so they do not oversubscribe the CPU.
+
+Workers write their Prometheus metrics to PROMETHEUS_MULTIPROC_DIR (default
+a directory under the system temp dir, emptied on every start), so /metrics
+reports all of them whichever worker answers the scrape.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn_worker.UvicornWorker"
+# Model calls run on executor threads, so a busy worker still heartbeats
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    # Before anything imports prometheus_client, which picks its value store
+    # on import, and before the workers fork and inherit the environment
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(
+        tempfile.gettempdir(), "temu-prometheus")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    from app.config import MODEL_PRELOAD
+
+    if not MODEL_PRELOAD:
+        return
+    from app.services.registry import preload_models
+
+    preload_models()
+    # Objects allocated so far are never collected, so the collector's
+    # bookkeeping writes do not copy their pages into every worker
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Drops the worker's live gauges (in flight requests, pool connections)
+    multiprocess.mark_process_dead(worker.pid)
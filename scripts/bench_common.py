@@ -0,0 +1,114 @@
+"""Helpers shared by the benchmark scripts: sample queries and documents, timing, latency summaries and run-to-run comparison."""
+import json
+import os
+import statistics
+import time
+
+from app.services.shards import iter_records
+
+# Queries of the model benchmarks (bench_inference, bench_micro)
+QUERIES = [
+    "action movie with a car chase",
+    "haunted house ghost story",
+    "romantic comedy in new york",
+    "space travel and aliens",
+    "revenge after a family is murdered",
+]
+
+
+def load_docs(path, limit=None):
+    """Documents of a converted dataset (shard directory or JSONL file)."""
+    if not os.path.exists(path):
+        raise SystemExit(f"{path} not found; run `python -m scripts.convert` first")
+    return list(iter_records(path, limit))
+
+
+def timed(fn, repeats):
+    """Call `fn` `repeats` times; returns its last result and the duration of each call in seconds."""
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return result, latencies
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of `values` (q in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean/min/max in milliseconds of a list of durations in seconds."""
+    if not seconds:
+        return {"count": 0}
+    ms = lambda value: round(value * 1000, 2)
+    return {
+        "count": len(seconds),
+        "p50_ms": ms(percentile(seconds, 50)),
+        "p95_ms": ms(percentile(seconds, 95)),
+        "p99_ms": ms(percentile(seconds, 99)),
+        "mean_ms": ms(statistics.mean(seconds)),
+        "min_ms": ms(min(seconds)),
+        "max_ms": ms(max(seconds)),
+    }
+
+
+def _flatten(report, prefix=""):
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+# Metrics where a higher value is better; for everything else ending in _ms lower is better
+_HIGHER_IS_BETTER = ("_per_sec", "achieved_rps")
+
+
+def compare(current, baseline, tolerance=0.1):
+    """
+    Compare two benchmark reports metric by metric.
+
+    Returns (rows, regressions): a row per numeric metric present in both
+    reports, and the subset of latency (`*_ms`) or throughput (`*_per_sec`,
+    `achieved_rps`) metrics that got worse by more than `tolerance`.
+    """
+    ours, theirs = _flatten(current), _flatten(baseline)
+    rows, regressions = [], []
+    for path in sorted(ours.keys() & theirs.keys()):
+        new, old = ours[path], theirs[path]
+        change = (new - old) / old if old else 0.0
+        row = {"metric": path, "baseline": old, "current": new, "change": round(change, 4)}
+        rows.append(row)
+        if path.endswith(_HIGHER_IS_BETTER):
+            if change < -tolerance:
+                regressions.append(row)
+        elif path.endswith("_ms") and change > tolerance:
+            regressions.append(row)
+    return rows, regressions
+
+
+def write_report(report, output=None, baseline=None, tolerance=0.1):
+    """Print and optionally save a report; with a baseline file, print the comparison and return the regressions."""
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not baseline:
+        return []
+    with open(baseline) as f:
+        rows, regressions = compare(report, json.load(f), tolerance)
+    print(f"\nCompared with {baseline} (tolerance {tolerance:.0%}):")
+    for row in rows:
+        flag = "  REGRESSION" if row in regressions else ""
+        print(f"  {row['metric']}: {row['baseline']} -> {row['current']} ({row['change']:+.1%}){flag}")
+    return regressions
@@ -0,0 +1,148 @@
+"""
+Compare inference modes of the reranker and the LLM against the current defaults.
+
+For every mode it reports latency and how far the output drifts from the
+baseline (cross-encoder fp32 on torch, LLM fp16):
+- reranker: mean/max absolute score delta and top-10 overlap per query
+- LLM: tokens/sec and greedy token agreement with the baseline output
+
+    python -m scripts.bench_inference --output bench_inference.json
+"""
+import argparse
+import json
+import statistics
+import time
+import warnings
+
+from app.config import LLM_MODEL_ID, RERANKER_MODEL_ID
+from app.services import inference
+from app.services.generation_engine import GenerationEngine, GenerationRequest
+from app.services.reranker_service import build_rerank_passage
+from scripts.bench_common import QUERIES, latency_summary, load_docs, timed
+
+RERANKER_MODES = {
+    "baseline": {"backend": "torch", "dtype": "fp32"},
+    "bf16": {"backend": "torch", "dtype": "bf16"},
+    "int8": {"backend": "torch", "quantize": "int8"},
+    "onnx": {"backend": "onnx"},
+}
+LLM_MODES = {
+    "baseline": {"dtype": "fp16"},
+    "fp32": {"dtype": "fp32"},
+    "bf16": {"dtype": "bf16"},
+    "int8": {"quantize": "int8"},
+}
+
+
+def bench_reranker(modes, docs, repeats, batch_size):
+    passages = [build_rerank_passage(d["title"], d["plot"], d.get("tags")) for d in docs]
+    pairs = [(q, p) for q in QUERIES for p in passages]
+
+    results = {}
+    baseline_scores = None
+    for name in modes:
+        try:
+            model = inference.load_cross_encoder(RERANKER_MODEL_ID, **RERANKER_MODES[name])
+        except Exception as exc:
+            results[name] = {"skipped": str(exc)}
+            continue
+        model.predict(pairs[:batch_size], batch_size=batch_size)  # warm-up
+        scores, latencies = timed(lambda: model.predict(pairs, batch_size=batch_size), repeats)
+        scores = [float(s) for s in scores]
+
+        entry = {**latency_summary(latencies), "pairs": len(pairs),
+                 "pairs_per_sec": round(len(pairs) / statistics.median(latencies), 1)}
+        if baseline_scores is None:
+            baseline_scores = scores
+        else:
+            deltas = [abs(a - b) for a, b in zip(scores, baseline_scores)]
+            overlaps = []
+            per_query = len(passages)
+            for q in range(len(QUERIES)):
+                span = slice(q * per_query, (q + 1) * per_query)
+                top = lambda s: set(sorted(range(per_query), key=lambda i: -s[span][i])[:10])
+                overlaps.append(len(top(scores) & top(baseline_scores)) / min(10, per_query))
+            entry.update({
+                "mean_abs_score_delta": round(statistics.mean(deltas), 5),
+                "max_abs_score_delta": round(max(deltas), 5),
+                "top10_overlap": round(statistics.mean(overlaps), 3),
+            })
+        results[name] = entry
+        del model
+    return results
+
+
+def bench_llm(modes, docs, max_new_tokens):
+    results = {}
+    baseline_tokens = None
+    for name in modes:
+        try:
+            tokenizer, model = inference.load_causal_lm(LLM_MODEL_ID, **LLM_MODES[name])
+        except Exception as exc:
+            results[name] = {"skipped": str(exc)}
+            continue
+        engine = GenerationEngine(model, tokenizer, max_batch_size=1)
+        prompts = [
+            f"Summarize the movie in two sentences.\nTitle: {d['title']}\nPlot: {d['plot'][:1500]}\nSummary:"
+            for d in docs[:3]
+        ]
+
+        outputs, latencies = [], []
+        for prompt in prompts:
+            request = GenerationRequest(tokenizer(prompt)["input_ids"], max_new_tokens, temperature=0.0)
+            start = time.perf_counter()
+            engine.submit(request).result()
+            latencies.append(time.perf_counter() - start)
+            outputs.append(request.generated)
+        engine.close()
+
+        generated = sum(len(o) for o in outputs)
+        entry = {**latency_summary(latencies), "dtype": str(model.dtype),
+                 "tokens_per_sec": round(generated / sum(latencies), 2)}
+        if baseline_tokens is None:
+            baseline_tokens = outputs
+        else:
+            agree = total = 0
+            for ours, base in zip(outputs, baseline_tokens):
+                total += max(len(ours), len(base))
+                agree += sum(a == b for a, b in zip(ours, base))
+            entry["greedy_token_agreement"] = round(agree / total, 3) if total else 1.0
+        results[name] = entry
+        del engine, model
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/mpst")
+    parser.add_argument("--docs", type=int, default=20, help="Documents per query for the reranker")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--reranker-modes", nargs="*", default=list(RERANKER_MODES), choices=list(RERANKER_MODES))
+    parser.add_argument("--llm-modes", nargs="*", default=list(LLM_MODES), choices=list(LLM_MODES))
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Deltas are measured against the first mode, so always run the baseline first
+    for modes in (args.reranker_modes, args.llm_modes):
+        if modes and modes[0] != "baseline":
+            modes[:] = ["baseline"] + [m for m in modes if m != "baseline"]
+
+    warnings.filterwarnings("ignore")
+    inference.configure_threads()
+    docs = load_docs(args.data, args.docs)
+
+    report = {
+        "environment": inference.describe(),
+        "reranker": bench_reranker(args.reranker_modes, docs, args.repeats, args.batch_size),
+        "llm": bench_llm(args.llm_modes, docs, args.max_new_tokens),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
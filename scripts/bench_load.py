@@ -0,0 +1,256 @@
+"""
+Replay a query log against the API and report latency per request and per stage.
+
+Requests are sent to the FastAPI app in-process (through httpx's ASGI
+transport) at a fixed rate (`--rps`, open loop: latency counts from the
+scheduled send time, so queueing is not hidden) with at most
+`--concurrency` in flight. `--rps 0` sends as fast as the concurrency
+allows. In-process runs also time the service calls behind each request:
+
+- es: RetrievalService.asearch / ahydrate (including cache lookups)
+- embed: query embedding for hybrid mode
+- rerank: RerankerService.rerank_with_stats
+- llm: LLMService.enhance_search_results
+
+`--local` serves retrieval from the in-process local engine
+(RETRIEVAL_BACKEND=local, see app/services/local_search.py) over the
+converted datasets, so runs need no cluster; `--url` targets a running
+server instead (end-to-end latency only).
+
+Every line of the query log is either a JSON object with a `query` and
+optional request parameters (`tags`, `top_k`, ...) or a plain query string.
+
+    python -m scripts.bench_load --local --rps 20 --requests 300 --output load.json
+    python -m scripts.bench_load --endpoint enhanced-search --rps 2 --compare load.json
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+
+from scripts.bench_common import latency_summary, write_report
+
+ENDPOINTS = {
+    "search": "/search",
+    "enhanced-search": "/llm/enhanced-search",
+}
+SAMPLE_QUERIES = os.path.join(os.path.dirname(__file__), "bench_queries.jsonl")
+
+
+def load_queries(path):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = line
+            entries.append(entry if isinstance(entry, dict) else {"query": str(entry)})
+    if not entries:
+        raise SystemExit(f"No queries in {path}")
+    return entries
+
+
+class StageRecorder:
+    """Wraps service methods on their instances and records how long each call takes."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.recording = True
+
+    def wrap(self, obj, attr, stage):
+        original = getattr(obj, attr)
+
+        if inspect.iscoroutinefunction(original):
+            @wraps(original)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    self._record(stage, time.perf_counter() - start)
+        else:
+            @wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self._record(stage, time.perf_counter() - start)
+
+        setattr(obj, attr, timed)
+
+    def _record(self, stage, seconds):
+        if self.recording:
+            self.samples[stage].append(seconds)
+
+    def summary(self):
+        return {stage: latency_summary(samples) for stage, samples in sorted(self.samples.items())}
+
+
+def request_params(entry, overrides):
+    params = {**entry, **overrides}
+    # httpx sends lists as repeated parameters, as FastAPI expects for `tags`
+    return {k: v for k, v in params.items() if v is not None}
+
+
+async def replay(client, path, entries, overrides, count, rps, concurrency):
+    """Send `count` requests; return (scheduled, started, finished, status) per request."""
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def send(entry, scheduled):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=request_params(entry, overrides))
+                status = response.status_code
+            except Exception as exc:
+                status = type(exc).__name__
+            records.append((scheduled, started, time.perf_counter(), status))
+
+    tasks = []
+    t0 = time.perf_counter()
+    for i in range(count):
+        scheduled = t0 + i / rps if rps > 0 else t0
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(entries[i % len(entries)], scheduled)))
+    await asyncio.gather(*tasks)
+    return records
+
+
+def summarize(records, wall_seconds):
+    statuses = Counter(str(status) for *_, status in records)
+    ok = [r for r in records if r[3] == 200]
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "statuses": dict(statuses),
+        "achieved_rps": round(len(records) / wall_seconds, 2) if wall_seconds else None,
+        # From the scheduled send time: includes waiting for a concurrency slot
+        "latency": latency_summary([finished - scheduled for scheduled, _, finished, _ in ok]),
+        # From the moment the request was actually sent
+        "service_latency": latency_summary([finished - started for _, started, finished, _ in ok]),
+    }
+
+
+def setup_in_process(args, recorder):
+    """Load the services the endpoint needs and instrument them; return the ASGI app."""
+    from app.config import SEARCH_MODE
+    from app.main import app
+    from app.services import registry as services
+
+    services.startup()
+    retrieval = services.get_retrieval()
+
+    recorder.wrap(retrieval, "asearch", "es")
+    recorder.wrap(retrieval, "ahydrate", "es")
+    recorder.wrap(services.get_reranker(), "rerank_with_stats", "rerank")
+    if args.overrides.get("mode") == "hybrid" or SEARCH_MODE == "hybrid":
+        recorder.wrap(services.registry.get("embedder"), "embed_query", "embed")
+    if args.endpoint == "enhanced-search":
+        recorder.wrap(services.get_llm(), "enhance_search_results", "llm")
+    return app, services
+
+
+async def run(args):
+    import httpx
+
+    entries = load_queries(args.queries)
+    count = args.requests or (int(args.rps * args.duration) if args.rps > 0 else len(entries))
+    path = ENDPOINTS[args.endpoint]
+    recorder = StageRecorder()
+
+    services = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        app, services = setup_in_process(args, recorder)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                   base_url="http://bench", timeout=args.timeout)
+
+    try:
+        if args.warmup:
+            recorder.recording = False
+            await replay(client, path, entries, args.overrides, args.warmup, 0, args.concurrency)
+            recorder.recording = True
+
+        start = time.perf_counter()
+        records = await replay(client, path, entries, args.overrides, count, args.rps, args.concurrency)
+        wall = time.perf_counter() - start
+    finally:
+        await client.aclose()
+        if services is not None:
+            await services.shutdown()
+
+    report = {
+        "benchmark": "load",
+        "config": {
+            "endpoint": args.endpoint, "rps": args.rps, "concurrency": args.concurrency,
+            "requests": count, "warmup": args.warmup, "queries": args.queries,
+            "target": args.url or ("in-process, local engine" if args.local else "in-process"),
+            "params": args.overrides, "cache": not args.no_cache,
+        },
+        "end_to_end": summarize(records, wall),
+        "stages": recorder.summary(),
+    }
+    if services is not None:
+        from app.services import inference
+        report["environment"] = inference.describe()
+    return report
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        overrides.setdefault(key, []).append(value)
+    return {k: v if len(v) > 1 or k == "tags" else v[0] for k, v in overrides.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=SAMPLE_QUERIES, help="Query log (JSONL)")
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="search")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra request parameter for every request, e.g. --param rerank_top_k=10")
+    parser.add_argument("--rps", type=float, default=10, help="Target request rate (0 = closed loop)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Max requests in flight")
+    parser.add_argument("--requests", type=int, help="Requests to send (default: rps x duration)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run at --rps")
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded requests sent first")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--local", action="store_true",
+                        help="Serve retrieval from the in-process local engine (RETRIEVAL_BACKEND=local)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the query cache for this run")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+    args.overrides = parse_overrides(args.param)
+
+    # Must be set before the app's config is imported
+    if args.no_cache:
+        os.environ["CACHE_ENABLED"] = "false"
+    if args.local:
+        os.environ["RETRIEVAL_BACKEND"] = "local"
+
+    report = asyncio.run(run(args))
+    regressions = write_report(report, args.output, args.compare, args.tolerance)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Micro-benchmarks of the model-bound service calls, without HTTP or Elasticsearch.
+
+- rerank: RerankerService.rerank for increasing candidate counts, and the
+  raw cross-encoder forward pass for increasing batch sizes
+- generate: LLMService.generate with 1..N concurrent callers, i.e. the
+  decode batch size of the continuous-batching engine
+
+    python -m scripts.bench_micro --output micro.json
+    python -m scripts.bench_micro --skip-llm --compare micro.json
+"""
+import argparse
+import itertools
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.bench_common import QUERIES, latency_summary, load_docs, timed, write_report
+
+
+def bench_rerank(docs, candidate_counts, batch_sizes, repeats):
+    from app.services.reranker_service import RerankerService, build_rerank_passage
+
+    reranker = RerankerService()
+    results = {"candidates": {}, "forward_batch_size": {}}
+    try:
+        for n in candidate_counts:
+            candidates = [
+                {"doc_id": d["doc_id"], "title": d["title"], "tags": d.get("tags"),
+                 "rerank_passage": build_rerank_passage(d["title"], d.get("plot", ""), d.get("tags")),
+                 "score": 1.0}
+                for d in docs[:n]
+            ]
+            reranker.rerank(QUERIES[0], [dict(c) for c in candidates])  # warm-up
+            queries = itertools.cycle(QUERIES)
+            _, latencies = timed(
+                lambda: reranker.rerank(next(queries), [dict(c) for c in candidates], top_k=n), repeats)
+            summary = latency_summary(latencies)
+            summary["pairs_per_sec"] = round(len(candidates) * len(latencies) / sum(latencies), 1)
+            results["candidates"][str(n)] = summary
+
+        pairs = [(q, build_rerank_passage(d["title"], d.get("plot", ""), d.get("tags")))
+                 for q in QUERIES for d in docs[:max(candidate_counts)]]
+        for batch_size in batch_sizes:
+            reranker.model.predict(pairs[:batch_size], batch_size=batch_size)
+            _, latencies = timed(lambda: reranker.model.predict(pairs, batch_size=batch_size), repeats)
+            summary = latency_summary(latencies)
+            summary["pairs_per_sec"] = round(len(pairs) * len(latencies) / sum(latencies), 1)
+            results["forward_batch_size"][str(batch_size)] = summary
+    finally:
+        reranker.close()
+    return results
+
+
+def bench_generate(docs, concurrencies, max_new_tokens, repeats):
+    from app.services.llm_service import LLMService
+
+    llm = LLMService()
+    prompts = [f"Summarize the movie {d['title']} in two sentences. Plot: {d.get('plot', '')[:800]}"
+               for d in docs[:max(concurrencies)]]
+    results = {}
+
+    def one(prompt):
+        start = time.perf_counter()
+        text = llm.generate(prompt, temperature=0.0, max_new_tokens=max_new_tokens)
+        return time.perf_counter() - start, len(llm.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    try:
+        llm.generate(prompts[0], temperature=0.0, max_new_tokens=4)  # warm-up
+        with ThreadPoolExecutor(max_workers=max(concurrencies)) as pool:
+            for concurrency in concurrencies:
+                latencies, tokens, wall = [], 0, 0.0
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    for seconds, generated in pool.map(one, prompts[:concurrency]):
+                        latencies.append(seconds)
+                        tokens += generated
+                    wall += time.perf_counter() - start
+                summary = latency_summary(latencies)
+                summary["tokens_per_sec"] = round(tokens / wall, 2)
+                results[str(concurrency)] = summary
+    finally:
+        llm.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default="data/mpst")
+    parser.add_argument("--candidates", type=int, nargs="*", default=[10, 25, 50, 100])
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[8, 16, 32, 64])
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 2, 4, 8],
+                        help="Concurrent generate() callers")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skip-rerank", action="store_true")
+    parser.add_argument("--skip-llm", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    from app.services import inference
+
+    warnings.filterwarnings("ignore")
+    inference.configure_threads()
+    docs = load_docs(args.docs, max(args.candidates + args.concurrency))
+
+    report = {"benchmark": "micro", "environment": inference.describe()}
+    if not args.skip_rerank:
+        report["rerank"] = bench_rerank(docs, args.candidates, args.batch_sizes, args.repeats)
+    if not args.skip_llm:
+        report["generate"] = bench_generate(docs, args.concurrency, args.max_new_tokens, args.repeats)
+
+    if write_report(report, args.output, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
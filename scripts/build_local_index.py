@@ -0,0 +1,56 @@
+"""
+Build the local search engine's indices (RETRIEVAL_BACKEND=local or
+failover, see app/services/local_search.py) from the converted datasets.
+
+The API builds missing or outdated indices itself on first use; running
+this beforehand (e.g. in an image build or CI setup step) keeps that out of
+startup. Indices that are current are skipped unless `--force` is given.
+
+    python -m scripts.build_local_index
+    python -m scripts.build_local_index movies scifact --force
+"""
+import argparse
+import os
+import time
+
+from app.collections import COLLECTIONS, enabled_collections
+from app.config import LOCAL_INDEX_DIR, RERANKER_MODEL_ID
+from app.services.local_search import build_lock, build_local_index, is_current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("collections", nargs="*", metavar="collection",
+                        help=f"Collections to build, of {', '.join(COLLECTIONS)} (default: SEARCH_COLLECTIONS)")
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR, help="Directory holding one index per collection")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the index is current")
+    args = parser.parse_args()
+    unknown = set(args.collections) - set(COLLECTIONS)
+    if unknown:
+        parser.error(f"unknown collection(s): {', '.join(sorted(unknown))}")
+
+    collections = [COLLECTIONS[name] for name in args.collections] or enabled_collections()
+    tokenizer = None
+    for collection in collections:
+        directory = os.path.join(args.out, collection.name)
+        if not os.path.exists(collection.data_path):
+            print(f"{collection.data_path} tidak ada, {collection.name} dilewati "
+                  f"(jalankan `python -m scripts.convert` dulu).")
+            continue
+        if not args.force and is_current(directory, collection.data_path):
+            print(f"Index lokal {collection.name} sudah terbaru, dilewati (--force untuk build ulang).")
+            continue
+        if tokenizer is None:
+            from transformers import AutoTokenizer
+
+            # Rerank passages are cut exactly at the token budget, as in scripts/index.py
+            tokenizer = AutoTokenizer.from_pretrained(RERANKER_MODEL_ID)
+        start = time.perf_counter()
+        # Waits for an API worker building the same index
+        with build_lock(directory):
+            meta = build_local_index(collection, collection.data_path, directory, tokenizer=tokenizer)
+        print(f"Selesai build {directory}: {meta['docs']} dokumen ({time.perf_counter() - start:.1f}s).")
+
+
+if __name__ == "__main__":
+    main()
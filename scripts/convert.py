@@ -0,0 +1,266 @@
+"""
+Convert the raw datasets into shards for scripts/index.py.
+
+Input is read in chunks and transformed column-wise with pyarrow (the CSV
+is parsed by pyarrow's streaming reader, tags are split without per-row
+Python), then written as JSONL or Parquet shards of `--shard-rows` documents
+plus a manifest (see app/services/shards.py). Sources that can be sliced (the
+ir_datasets corpora) are split into shard ranges converted by `--workers`
+processes. A rerun whose input fingerprint and options match the existing
+manifest is skipped; `--force` converts anyway.
+
+    python -m scripts.convert mpst
+    python -m scripts.convert wikiclir --workers 8 --format parquet
+    python -m scripts.convert all
+"""
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.services.shards import file_checksum, read_manifest, write_manifest
+
+# Bump when a transform changes its output, so existing shards are rebuilt
+CONVERTER_VERSION = 1
+
+
+def split_tags(column, sep=","):
+    """Split comma-separated tags into a list column, trimmed and without empty tags."""
+    lists = pc.split_pattern(pc.fill_null(column, ""), sep)
+    flat = pc.utf8_trim_whitespace(pc.list_flatten(lists))
+    parents = pc.list_parent_indices(lists)
+    keep = pc.not_equal(flat, "")
+    flat, parents = flat.filter(keep), parents.filter(keep)
+    counts = np.bincount(parents.to_numpy(), minlength=len(column))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    return pa.ListArray.from_arrays(pa.array(offsets), flat)
+
+
+class CsvSource:
+    """A CSV file streamed in record batches (quoted fields may contain newlines)."""
+
+    def __init__(self, locate, columns, block_size=16 << 20):
+        self._locate = locate
+        self._path = None
+        self.columns = columns
+        self.block_size = block_size
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = self._locate()
+        return self._path
+
+    def fingerprint(self):
+        return {"file": os.path.basename(self.path), "sha256": file_checksum(self.path)}
+
+    def count(self):
+        # Not splittable without parsing it: converted in one process
+        return None
+
+    def batches(self, rows, start=0, stop=None):
+        from pyarrow import csv
+
+        reader = csv.open_csv(
+            self.path,
+            read_options=csv.ReadOptions(block_size=self.block_size),
+            parse_options=csv.ParseOptions(newlines_in_values=True),
+            convert_options=csv.ConvertOptions(
+                include_columns=self.columns, column_types={c: pa.string() for c in self.columns}),
+        )
+        for batch in reader:
+            for offset in range(0, batch.num_rows, rows):
+                yield batch.slice(offset, rows)
+
+
+class IRDatasetSource:
+    """Documents of an ir_datasets corpus; slices of it can be converted in parallel."""
+
+    def __init__(self, dataset_id, fields):
+        self.dataset_id = dataset_id
+        self.fields = fields
+
+    def _dataset(self):
+        import ir_datasets
+        return ir_datasets.load(self.dataset_id)
+
+    def fingerprint(self):
+        import ir_datasets
+
+        dataset = self._dataset()
+        fingerprint = {"dataset": self.dataset_id, "ir_datasets": ir_datasets.__version__,
+                       "docs": dataset.docs_count()}
+        try:
+            path = str(dataset.docs_path())
+            if os.path.isfile(path):
+                fingerprint["sha256"] = file_checksum(path)
+        except (AttributeError, NotImplementedError):
+            pass
+        return fingerprint
+
+    def count(self):
+        return self._dataset().docs_count()
+
+    def batches(self, rows, start=0, stop=None):
+        docs = iter(self._dataset().docs_iter()[start:stop])
+        while batch := list(islice(docs, rows)):
+            yield pa.RecordBatch.from_pydict({f: [getattr(d, f) for d in batch] for f in self.fields})
+
+
+def _mpst_csv():
+    import kagglehub
+    return os.path.join(kagglehub.dataset_download("cryptexcode/mpst-movie-plot-synopses-with-tags"),
+                        "mpst_full_data.csv")
+
+
+def mpst_transform(batch):
+    return pa.table({
+        "doc_id": batch.column("imdb_id"),
+        "title": batch.column("title"),
+        "plot": pc.fill_null(batch.column("plot_synopsis"), ""),
+        "tags": split_tags(batch.column("tags")),
+        "source": batch.column("synopsis_source"),
+    })
+
+
+def text_transform(batch):
+    return pa.table({
+        "doc_id": batch.column("doc_id"),
+        "title": pc.fill_null(batch.column("title"), ""),
+        "text": pc.fill_null(batch.column("text"), ""),
+    })
+
+
+DATASETS = {
+    "mpst": {
+        "out": "data/mpst",
+        "source": lambda: CsvSource(
+            _mpst_csv, ["imdb_id", "title", "plot_synopsis", "tags", "synopsis_source"]),
+        "transform": mpst_transform,
+    },
+    "scifact": {
+        "out": "data/scifact",
+        "source": lambda: IRDatasetSource("beir/scifact", ["doc_id", "title", "text"]),
+        "transform": text_transform,
+    },
+    "wikiclir": {
+        "out": "data/wikiclir",
+        "source": lambda: IRDatasetSource("wikiclir/en-simple", ["doc_id", "title", "text"]),
+        "transform": text_transform,
+    },
+}
+
+
+def write_shard(table, directory, index, fmt):
+    name = f"part-{index:05d}.{fmt}"
+    path = os.path.join(directory, name)
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp, compression="zstd")
+    else:
+        table.to_pandas().to_json(tmp, orient="records", lines=True, force_ascii=False)
+    os.replace(tmp, path)
+    return {"path": name, "rows": table.num_rows, "bytes": os.path.getsize(path), "sha256": file_checksum(path)}
+
+
+def convert_range(name, directory, fmt, shard_rows, chunk_rows, start=0, stop=None, first_shard=0):
+    """Convert documents [start, stop) of a dataset into shards numbered from `first_shard`."""
+    dataset = DATASETS[name]
+    source, transform = dataset["source"](), dataset["transform"]
+    shards, pending, pending_rows = [], [], 0
+    for batch in source.batches(chunk_rows, start, stop):
+        table = transform(batch)
+        pending.append(table)
+        pending_rows += table.num_rows
+        while pending_rows >= shard_rows:
+            table = pa.concat_tables(pending)
+            shards.append(write_shard(table.slice(0, shard_rows), directory, first_shard + len(shards), fmt))
+            rest = table.slice(shard_rows)
+            pending, pending_rows = ([rest] if rest.num_rows else []), rest.num_rows
+    if pending_rows:
+        shards.append(write_shard(pa.concat_tables(pending), directory, first_shard + len(shards), fmt))
+    return shards
+
+
+def _intact(directory, manifest):
+    return all(
+        os.path.exists(path := os.path.join(directory, shard["path"])) and os.path.getsize(path) == shard["bytes"]
+        for shard in manifest["shards"]
+    )
+
+
+def convert(name, args):
+    dataset = DATASETS[name]
+    directory = args.out or dataset["out"]
+    os.makedirs(directory, exist_ok=True)
+    source = dataset["source"]()
+    fingerprint = source.fingerprint()
+    options = {"format": args.format, "shard_rows": args.shard_rows, "converter_version": CONVERTER_VERSION}
+
+    previous = read_manifest(directory)
+    if (not args.force and previous is not None and previous["input"] == fingerprint
+            and previous["options"] == options and _intact(directory, previous)):
+        print(f"Input {name} tidak berubah, {directory} dilewati (--force untuk konversi ulang).")
+        return previous
+
+    start = time.perf_counter()
+    count = source.count()
+    if count is not None and args.workers > 1 and count > args.shard_rows:
+        # One task per shard: documents [i * shard_rows, (i + 1) * shard_rows)
+        with ProcessPoolExecutor(args.workers) as pool:
+            futures = [
+                pool.submit(convert_range, name, directory, args.format, args.shard_rows, args.chunk_rows,
+                            i * args.shard_rows, min(count, (i + 1) * args.shard_rows), i)
+                for i in range(math.ceil(count / args.shard_rows))
+            ]
+            shards = [shard for future in futures for shard in future.result()]
+    else:
+        shards = convert_range(name, directory, args.format, args.shard_rows, args.chunk_rows)
+
+    # Shards of an earlier, larger conversion would otherwise be left behind
+    current = {shard["path"] for shard in shards}
+    for entry in os.listdir(directory):
+        if entry.startswith("part-") and entry not in current:
+            os.remove(os.path.join(directory, entry))
+
+    manifest = {
+        "dataset": name,
+        "input": fingerprint,
+        "options": options,
+        "rows": sum(shard["rows"] for shard in shards),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "shards": shards,
+    }
+    write_manifest(directory, manifest)
+    print(f"Selesai simpan {directory}: {manifest['rows']} dokumen dalam {len(shards)} shard "
+          f"({time.perf_counter() - start:.1f}s).")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=[*DATASETS, "all"])
+    parser.add_argument("--out", help="Output directory (default depends on the dataset)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--shard-rows", type=int, default=20000, help="Documents per shard")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="Documents transformed at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes converting shards of splittable sources")
+    parser.add_argument("--force", action="store_true", help="Convert even if the input did not change")
+    args = parser.parse_args()
+
+    if args.dataset == "all" and args.out:
+        parser.error("--out needs a single dataset")
+    for name in DATASETS if args.dataset == "all" else [args.dataset]:
+        convert(name, args)
+
+
+if __name__ == "__main__":
+    main()
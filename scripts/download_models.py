@@ -0,0 +1,54 @@
+"""
+Download the models the API loads into the Hugging Face cache (HF_HOME), so
+they can be baked into the image and replicas start without downloading.
+
+Only safetensors weights are fetched (pickled `.bin` files only for models
+that have no safetensors). Those are memory-mapped on load.
+
+    python -m scripts.download_models           # reranker and LLM, encoder with SEARCH_MODE=hybrid
+    python -m scripts.download_models --all
+"""
+import argparse
+import os
+import time
+
+from app.config import (
+    RERANKER_MODEL_ID, RERANKER_BACKEND, LLM_MODEL_ID, EMBEDDING_MODEL_ID, SEARCH_MODE,
+)
+
+# Configs, tokenizers, chat templates and sentence-transformers module configs
+SUPPORT_FILES = ["*.json", "*.txt", "*.model", "*.jinja"]
+
+
+def download(model_id, onnx=False):
+    from huggingface_hub import list_repo_files, snapshot_download
+
+    if os.path.isdir(model_id):
+        print(f"{model_id} adalah direktori lokal, dilewati.")
+        return
+    start = time.perf_counter()
+    files = list_repo_files(model_id)
+    if any(f.endswith(".safetensors") for f in files):
+        weights = ["*.safetensors"]
+    else:
+        print(f"{model_id} tidak punya safetensors, memakai .bin.")
+        weights = ["*.bin"]
+    if onnx:
+        weights.append("onnx/*")
+    path = snapshot_download(model_id, allow_patterns=[*weights, *SUPPORT_FILES])
+    print(f"Selesai unduh {model_id} ke {path} ({time.perf_counter() - start:.1f}s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="Also the embedding model, whatever SEARCH_MODE is")
+    args = parser.parse_args()
+
+    download(RERANKER_MODEL_ID, onnx=RERANKER_BACKEND == "onnx")
+    download(LLM_MODEL_ID)
+    if args.all or SEARCH_MODE == "hybrid":
+        download(EMBEDDING_MODEL_ID)
+
+
+if __name__ == "__main__":
+    main()
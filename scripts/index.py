@@ -0,0 +1,420 @@
+"""
+Index a converted dataset (scripts/convert.py shards, or a JSONL file) into
+Elasticsearch.
+
+Documents are streamed through a generator and sent by a pool of threads,
+each running `helpers.streaming_bulk` on its own chunks (which retries 429
+rejections with exponential backoff). Shards are read, and their documents
+built, by `--read-workers` processes in parallel.
+
+By default every run builds a new versioned index (`<alias>-<timestamp>`)
+with refresh and replicas off, force-merges and warms it, then atomically
+moves the alias the API reads from onto it. The newest `--keep` old
+versions are kept for `--rollback`. `--in-place` writes straight into the
+existing index instead.
+
+    python -m scripts.index mpst
+    python -m scripts.index wikiclir --threads 8 --chunk-bytes 15000000
+    python -m scripts.index mpst --rollback
+    python -m scripts.index mpst --embeddings   # for SEARCH_MODE=hybrid
+"""
+import argparse
+import os
+import secrets
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+
+from elasticsearch import NotFoundError, helpers
+
+from app.collections import COLLECTIONS
+from app.services.es_client import create_client
+from app.services.shards import iter_records, iter_shard, shard_paths
+from app.config import RERANKER_MODEL_ID, EMBEDDING_BATCH_SIZE, ES_MAX_RETRIES
+
+
+def _source_builder(collection):
+    def build():
+        from transformers import AutoTokenizer
+        from app.services.reranker_service import rerank_passage
+
+        # The cross-encoder tokenizer cuts bodies exactly at the token budget
+        tokenizer = AutoTokenizer.from_pretrained(RERANKER_MODEL_ID)
+
+        def to_source(doc):
+            source = {field: doc[field] for field in collection.document_fields}
+            source["rerank_passage"] = rerank_passage(collection, doc, tokenizer=tokenizer)
+            return source
+        return to_source
+    return build
+
+
+def _dataset(collection, fields):
+    return {
+        "file": collection.data_path,
+        "index": collection.index,
+        "mappings": {
+            "properties": {
+                **fields,
+                # Stored for the rerank step only, never searched
+                "rerank_passage": {"type": "text", "index": False},
+            }
+        },
+        "source_builder": _source_builder(collection),
+        "warm_fields": collection.search_fields,
+        "tag_field": collection.tag_field,
+        "embedding_fields": tuple(collection.search_fields),
+    }
+
+
+_TEXT_FIELDS = {
+    "title": {"type": "text"},
+    "text": {"type": "text"},
+}
+
+DATASETS = {
+    "mpst": _dataset(COLLECTIONS["movies"], {
+        "title": {"type": "text"},
+        "plot": {"type": "text"},
+        "tags": {"type": "keyword"},
+        "source": {"type": "keyword"},
+    }),
+    "scifact": _dataset(COLLECTIONS["scifact"], _TEXT_FIELDS),
+    "wikiclir": _dataset(COLLECTIONS["wikiclir"], _TEXT_FIELDS),
+}
+
+
+def iter_actions(path, index, to_source):
+    for doc in iter_records(path):
+        yield {"_index": index, "_id": doc["doc_id"], "_source": to_source(doc)}
+
+
+_worker_to_source = None
+
+
+def _init_reader(dataset_name):
+    global _worker_to_source
+    _worker_to_source = DATASETS[dataset_name]["source_builder"]()
+
+
+def _read_shard(path):
+    return [(doc["doc_id"], _worker_to_source(doc)) for doc in iter_shard(path)]
+
+
+def iter_shard_actions(path, index, dataset_name, workers):
+    """
+    Actions for every document of a sharded dataset. Shards are read and
+    turned into sources (including rerank passages) by `workers`
+    processes, at most two shards per worker ahead of the bulk senders.
+    """
+    shards = iter(shard_paths(path))
+    with ProcessPoolExecutor(workers, initializer=_init_reader, initargs=(dataset_name,)) as pool:
+        pending = set()
+        while True:
+            for shard in islice(shards, 2 * workers - len(pending)):
+                pending.add(pool.submit(_read_shard, shard))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for doc_id, source in future.result():
+                    yield {"_index": index, "_id": doc_id, "_source": source}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def embedding_mapping(dims):
+    return {
+        "type": "dense_vector",
+        "dims": dims,
+        "index": True,
+        "similarity": "cosine",
+        "index_options": {"type": "hnsw", "m": 16, "ef_construction": 100},
+    }
+
+
+def with_embeddings(actions, embedder, fields, batch_size):
+    """Add a document embedding to every action, encoding `batch_size` documents per forward pass."""
+    from app.collections import EMBEDDING_FIELD
+    from app.services.embedding_service import embedding_text
+
+    title_field, text_field = fields
+    for batch in chunked(actions, batch_size):
+        texts = [embedding_text(a["_source"][title_field], a["_source"][text_field]) for a in batch]
+        for action, vector in zip(batch, embedder.encode(texts, batch_size=batch_size)):
+            action["_source"][EMBEDDING_FIELD] = vector
+            yield action
+
+
+def prepare_index(es, index, mappings):
+    """Create the index (or add new mappings) and switch it to bulk-load settings; return the settings to restore."""
+    if not es.indices.exists(index=index):
+        es.indices.create(index=index, mappings=mappings)
+        print(f"Index '{index}' dibuat.")
+    else:
+        es.indices.put_mapping(index=index, properties=mappings["properties"])
+
+    current = es.indices.get_settings(index=index, include_defaults=True)
+    restore = {}
+    for settings in current.body.values():
+        merged = {**settings.get("defaults", {}).get("index", {}), **settings["settings"]["index"]}
+        restore = {
+            "refresh_interval": merged.get("refresh_interval", "1s"),
+            "number_of_replicas": merged.get("number_of_replicas", "1"),
+        }
+    es.indices.put_settings(index=index, settings={
+        "refresh_interval": "-1",
+        "number_of_replicas": 0,
+    })
+    return restore
+
+
+def finish_index(es, index, restore):
+    es.indices.put_settings(index=index, settings=restore)
+    es.indices.refresh(index=index)
+    # Mark the new index version so the API's query cache is invalidated
+    es.indices.put_mapping(index=index, meta={"build_id": str(time.time_ns())})
+
+
+# Representative queries run against a new version before it goes live so
+# the first user queries do not hit cold caches
+WARM_QUERIES = [
+    "action movie with a car chase",
+    "love story",
+    "murder mystery detective",
+    "space aliens",
+    "war",
+    "family comedy",
+    "cancer treatment",
+    "history of the city",
+]
+
+# Most common tags whose filters are run once on a new version
+WARM_TAGS = 20
+
+# Bulk-load settings for a fresh versioned index
+BUILD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+
+def version_name(alias):
+    """
+    A new version's index name: `<alias>-<timestamp>-<token>`. Names sort in
+    build order (also after the older second-resolution names); the
+    milliseconds and random token keep builds started together apart.
+    """
+    now = time.time()
+    stamp = time.strftime("%Y%m%d%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+    return f"{alias}-{stamp}-{secrets.token_hex(3)}"
+
+
+def versions(es, alias):
+    """Versioned indices behind `alias`, oldest first."""
+    return sorted(es.indices.get(index=f"{alias}-*", expand_wildcards="open").body)
+
+
+def live_indices(es, alias):
+    try:
+        return list(es.indices.get_alias(name=alias).body)
+    except NotFoundError:
+        return []
+
+
+def swap_alias(es, alias, new_index):
+    """Atomically point `alias` at `new_index` only."""
+    actions = []
+    if es.indices.exists(index=alias) and not es.indices.exists_alias(name=alias):
+        # A concrete index still has the alias' name (pre-alias setup): drop it in the same step
+        actions.append({"remove_index": {"index": alias}})
+    for index in live_indices(es, alias):
+        if index != new_index:
+            actions.append({"remove": {"index": index, "alias": alias}})
+    actions.append({"add": {"index": new_index, "alias": alias}})
+    es.indices.update_aliases(actions=actions)
+
+
+def warm(es, index, fields, tag_field=None, top_tags=WARM_TAGS):
+    for query in WARM_QUERIES:
+        es.search(index=index, query={"multi_match": {"query": query, "fields": fields}}, size=10)
+    if not tag_field:
+        return
+    # Filter-only queries on the most common tags, as sent by tag browsing
+    response = es.search(index=index, size=0, aggs={"tags": {"terms": {"field": tag_field, "size": top_tags}}})
+    for bucket in response["aggregations"]["tags"]["buckets"]:
+        es.search(index=index, query={"bool": {"filter": {"terms": {tag_field: [bucket["key"]]}}}},
+                  size=25, sort=["_doc"])
+
+
+def build_version(es, alias, dataset, args, actions_for):
+    """Build, optimise and warm a new versioned index, then make it live under `alias`."""
+    new_index = version_name(alias)
+    es.indices.create(index=new_index, mappings=dataset["mappings"], settings=BUILD_SETTINGS)
+    print(f"Index '{new_index}' dibuat.")
+
+    try:
+        indexed, failed, seconds = bulk_load(
+            es, actions_for(new_index), args.threads, args.chunk_size, args.chunk_bytes, args.max_retries)
+        if failed and not args.allow_failures:
+            raise RuntimeError(f"{failed} dokumen gagal diindeks; alias tidak dipindah")
+
+        es.indices.put_settings(index=new_index, settings={
+            "refresh_interval": args.refresh_interval,
+            "number_of_replicas": args.replicas,
+        })
+        es.indices.refresh(index=new_index)
+        print(f"Force merge ke {args.max_segments} segmen...")
+        es.options(request_timeout=3600).indices.forcemerge(
+            index=new_index, max_num_segments=args.max_segments)
+        es.cluster.health(index=new_index, wait_for_status="yellow", timeout="10m")
+        warm(es, new_index, dataset["warm_fields"], dataset["tag_field"])
+        es.indices.put_mapping(index=new_index, meta={"build_id": str(time.time_ns())})
+    except BaseException:
+        # Never leave a half-built version around
+        es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise
+
+    swap_alias(es, alias, new_index)
+    print(f"Alias '{alias}' -> '{new_index}'")
+    return indexed, failed, seconds
+
+
+def prune_versions(es, alias, keep):
+    """Delete old versions beyond the newest `keep` that are not live."""
+    live = set(live_indices(es, alias))
+    old = [index for index in versions(es, alias) if index not in live]
+    for index in old[:max(0, len(old) - keep)]:
+        es.indices.delete(index=index)
+        print(f"Index lama '{index}' dihapus.")
+
+
+def rollback(es, alias):
+    """Point `alias` back at the newest version older than the live one."""
+    live = live_indices(es, alias)
+    candidates = [index for index in versions(es, alias) if not live or index < min(live)]
+    if not candidates:
+        raise SystemExit(f"Tidak ada versi lama untuk alias '{alias}'.")
+    swap_alias(es, alias, candidates[-1])
+    print(f"Alias '{alias}' dikembalikan ke '{candidates[-1]}'")
+
+
+def bulk_load(es, actions, threads, chunk_size, chunk_bytes, max_retries):
+    """Send actions with `threads` concurrent streaming_bulk workers; return (indexed, failed)."""
+    def send(chunk):
+        ok = failed = 0
+        for success, info in helpers.streaming_bulk(
+                es, chunk, chunk_size=chunk_size, max_chunk_bytes=chunk_bytes,
+                max_retries=max_retries, initial_backoff=1, max_backoff=30,
+                raise_on_error=False, raise_on_exception=False):
+            if success:
+                ok += 1
+            else:
+                failed += 1
+                if failed <= 3:
+                    print(f"Gagal: {info}")
+        return ok, failed
+
+    indexed = failed = 0
+    start = last_report = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = set()
+        for chunk in chunked(actions, chunk_size):
+            # Bound the number of chunks held in memory
+            if len(pending) >= threads * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ok, bad = future.result()
+                    indexed += ok
+                    failed += bad
+            pending.add(pool.submit(send, chunk))
+
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                print(f"Indexed {indexed} docs ({indexed / (now - start):.0f} docs/s)")
+                last_report = now
+        for future in pending:
+            ok, bad = future.result()
+            indexed += ok
+            failed += bad
+    return indexed, failed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("--file", help="Converted dataset directory or JSONL file (default depends on the dataset)")
+    parser.add_argument("--read-workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Processes reading shards and building documents (1 = in the main process)")
+    parser.add_argument("--index", help="Target index (default depends on the dataset)")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent bulk requests")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Max documents per bulk request")
+    parser.add_argument("--chunk-bytes", type=int, default=10 * 1024 * 1024, help="Max bytes per bulk request")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per document on 429 rejections")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Write into the existing index instead of building a new version behind the alias")
+    parser.add_argument("--keep", type=int, default=2, help="Old versions to keep for rollback")
+    parser.add_argument("--max-segments", type=int, default=1, help="Force-merge target segment count")
+    parser.add_argument("--replicas", type=int, default=1, help="Replicas of the new version once loaded")
+    parser.add_argument("--refresh-interval", default="1s", help="Refresh interval of the new version once loaded")
+    parser.add_argument("--allow-failures", action="store_true",
+                        help="Swap the alias even if some documents failed to index")
+    parser.add_argument("--rollback", action="store_true", help="Point the alias back at the previous version and exit")
+    parser.add_argument("--embeddings", action="store_true",
+                        help="Store dense embeddings (EMBEDDING_MODEL_ID) for hybrid search")
+    parser.add_argument("--embedding-batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+
+    dataset = DATASETS[args.dataset]
+    path = args.file or dataset["file"]
+    # With aliases this is the alias name the API reads from
+    index = args.index or dataset["index"]
+
+    # Bulk requests are large and slow: a long timeout, and the transport
+    # retries timed-out requests instead of failing the run
+    es = create_client(request_timeout=120, max_retries=ES_MAX_RETRIES, retry_on_timeout=True)
+
+    if args.rollback:
+        rollback(es, index)
+        return
+
+    # Shards are read by worker processes, which build their own sources
+    parallel = os.path.isdir(path) and args.read_workers > 1 and len(shard_paths(path)) > 1
+    to_source = None if parallel else dataset["source_builder"]()
+    embedder = None
+    if args.embeddings:
+        from app.collections import EMBEDDING_FIELD
+        from app.services.embedding_service import EmbeddingService
+
+        embedder = EmbeddingService()
+        dataset = {**dataset, "mappings": {"properties": {
+            **dataset["mappings"]["properties"], EMBEDDING_FIELD: embedding_mapping(embedder.dims)}}}
+
+    def actions_for(target):
+        if parallel:
+            actions = iter_shard_actions(path, target, args.dataset, args.read_workers)
+        else:
+            actions = iter_actions(path, target, to_source)
+        if embedder is not None:
+            # Encoding runs here while the bulk workers send earlier chunks
+            actions = with_embeddings(actions, embedder, dataset["embedding_fields"], args.embedding_batch_size)
+        return actions
+
+    if args.in_place:
+        restore = prepare_index(es, index, dataset["mappings"])
+        try:
+            indexed, failed, seconds = bulk_load(
+                es, actions_for(index), args.threads, args.chunk_size, args.chunk_bytes, args.max_retries)
+        finally:
+            finish_index(es, index, restore)
+    else:
+        indexed, failed, seconds = build_version(es, index, dataset, args, actions_for)
+        prune_versions(es, index, args.keep)
+
+    print(f"Indexing selesai: {indexed} docs ke '{index}' dalam {seconds:.1f}s "
+          f"({indexed / max(seconds, 1e-9):.0f} docs/s), {failed} gagal.")
+
+
+if __name__ == "__main__":
+    main()
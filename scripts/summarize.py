@@ -0,0 +1,103 @@
+"""
+Precompute a neutral summary of every document of a collection into the
+summary store (SUMMARY_STORE_PATH, see app/services/summary_store.py).
+
+/llm/enhanced-search serves these summaries followed by a one-sentence,
+query-specific relevance note, instead of generating a summary for every
+query. Documents whose text and LLM_MODEL_ID are unchanged since their
+summary was made are skipped, so reruns after a reindex only summarize new
+or edited documents.
+
+Documents are submitted `--batch-size` at a time; the generation engine
+decodes them together.
+
+    python -m scripts.summarize movies
+    python -m scripts.summarize scifact --limit 1000 --batch-size 16
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.collections import COLLECTIONS
+from app.config import LLM_MAX_BATCH_SIZE, LLM_MODEL_ID, SUMMARY_STORE_PATH
+from app.services.shards import iter_records
+from app.services.summary_store import SummaryStore, text_hash
+
+
+def pending_documents(collection, data_path, store, force=False, limit=None):
+    """Documents without a current summary, with their text hash."""
+    done = {} if force else store.fingerprints(collection.name)
+    skipped = 0
+    for doc in iter_records(data_path, limit=limit):
+        digest = text_hash(collection, doc)
+        if done.get(doc["doc_id"]) == (digest, LLM_MODEL_ID):
+            skipped += 1
+            continue
+        yield doc, digest
+    if skipped:
+        print(f"{skipped} dokumen sudah punya ringkasan terbaru, dilewati (--force untuk ulang).")
+
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("collection", choices=list(COLLECTIONS), help="Collection to summarize")
+    parser.add_argument("--file", help="Converted dataset to read (default: the collection's data path)")
+    parser.add_argument("--store", default=SUMMARY_STORE_PATH, help="Summary store to write")
+    parser.add_argument("--limit", type=int, help="Only the first N documents")
+    parser.add_argument("--batch-size", type=int, default=LLM_MAX_BATCH_SIZE,
+                        help="Documents generated together")
+    parser.add_argument("--max-new-tokens", type=int, default=150)
+    parser.add_argument("--force", action="store_true", help="Summarize again even if current")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("SUMMARY_STORE_PATH is empty; pass --store")
+
+    collection = COLLECTIONS[args.collection]
+    data_path = args.file or collection.data_path
+    if not os.path.exists(data_path):
+        parser.error(f"{data_path} not found; run `python -m scripts.convert {collection.name}` first")
+
+    from app.services.llm_service import LLMService
+
+    llm = LLMService()
+    llm.engine.max_batch_size = args.batch_size
+    store = SummaryStore(args.store)
+
+    def summarize(item):
+        doc, digest = item
+        summary = llm.summarize_document(doc, collection, max_new_tokens=args.max_new_tokens)
+        return doc["doc_id"], summary, digest, LLM_MODEL_ID
+
+    start = time.perf_counter()
+    total = 0
+    try:
+        with ThreadPoolExecutor(max_workers=args.batch_size) as pool:
+            documents = pending_documents(collection, data_path, store, args.force, args.limit)
+            # Written per chunk so an interrupted run keeps what it finished
+            for chunk in chunks(documents, args.batch_size * 4):
+                rows = list(pool.map(summarize, chunk))
+                store.put_many(collection.name, rows)
+                total += len(rows)
+                elapsed = time.perf_counter() - start
+                print(f"{total} dokumen diringkas ({total / elapsed:.2f} dok/s).")
+    finally:
+        store.close()
+        llm.close()
+    print(f"Selesai meringkas {total} dokumen {collection.name} ke {args.store} "
+          f"({time.perf_counter() - start:.1f}s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app.collections import MOVIES
+from app.services import retrieval_service
+from app.services.local_search import AsyncLocalSearchEngine, LocalIndex, LocalSearchEngine
+from app.services.retrieval_service import RetrievalService
+
+# A few movies in the converted dataset format (scripts/convert.py)
+MOVIE_DOCS = [
+    {"doc_id": "1", "title": "Alien", "tags": ["horror", "scifi"], "source": "train",
+     "plot": "The crew of a spaceship is hunted by an alien creature."},
+    {"doc_id": "2", "title": "Heat", "tags": ["crime", "action"], "source": "train",
+     "plot": "A detective hunts a crew of bank robbers planning one last heist in Los Angeles."},
+    {"doc_id": "3", "title": "The Shining", "tags": ["horror"], "source": "test",
+     "plot": "A writer takes a family to a haunted hotel for the winter."},
+    {"doc_id": "4", "title": "Ocean's Eleven", "tags": ["crime", "comedy"], "source": "val",
+     "plot": "A charming thief assembles a crew for a casino heist."},
+    {"doc_id": "5", "title": "Paddington", "tags": ["comedy", "family"], "source": "train",
+     "plot": "A bear from Peru finds a family in London."},
+]
+
+
+@pytest.fixture
+def movies_file(tmp_path):
+    path = tmp_path / "movies.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in MOVIE_DOCS:
+            f.write(json.dumps(doc) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def local_engine(movies_file, tmp_path):
+    index = LocalIndex.open(MOVIES, movies_file, str(tmp_path / "local-index" / "movies"))
+    engine = LocalSearchEngine({MOVIES.index: index})
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def local_retrieval(local_engine, monkeypatch):
+    """A RetrievalService over the local engine instead of Elasticsearch."""
+    clients = (local_engine, AsyncLocalSearchEngine(local_engine))
+    monkeypatch.setattr(retrieval_service, "create_clients", lambda: clients)
+    return RetrievalService()
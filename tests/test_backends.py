@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from elasticsearch import ConnectionError
+from prometheus_client import REGISTRY
+
+from app.collections import MOVIES
+from app.services.backends import AsyncFailoverClient, FailoverClient, create_clients
+from app.services.local_search import AsyncLocalSearchEngine
+
+QUERY = {"query": {"multi_match": {"query": "alien", "fields": MOVIES.search_fields}}}
+
+
+class Primary:
+    """Elasticsearch stand-in that is down until `up` is set."""
+
+    def __init__(self):
+        self.up = False
+        self.calls = 0
+
+    def search(self, **kwargs):
+        self.calls += 1
+        if not self.up:
+            raise ConnectionError("connection refused")
+        return {"hits": {"hits": [], "total": {"value": 0, "relation": "eq"}}, "primary": True}
+
+    def close(self):
+        pass
+
+
+class AsyncPrimary(Primary):
+    async def search(self, **kwargs):
+        return Primary.search(self, **kwargs)
+
+    async def close(self):
+        pass
+
+
+class Fallback:
+    """A _LocalEngine around an already opened engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def get(self):
+        return self.engine
+
+    def close(self):
+        pass
+
+
+def fallbacks():
+    return REGISTRY.get_sample_value("temu_retrieval_fallback_requests_total") or 0.0
+
+
+def test_unreachable_primary_fails_over_until_the_retry(local_engine, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.backends.time.monotonic", lambda: clock[0])
+    primary = Primary()
+    client = FailoverClient(primary, Fallback(local_engine), retry_seconds=30)
+    before = fallbacks()
+
+    response = client.search(index=MOVIES.index, **QUERY)
+
+    assert [hit["_id"] for hit in response["hits"]["hits"]] == ["1"]
+    assert client.degraded
+    assert fallbacks() == before + 1
+
+    # Elasticsearch is not tried again while degraded
+    primary.up = True
+    client.search(index=MOVIES.index, **QUERY)
+    assert primary.calls == 1
+
+    clock[0] += 31
+    assert not client.degraded
+    assert client.search(index=MOVIES.index, **QUERY)["primary"]
+    assert primary.calls == 2
+    assert fallbacks() == before + 2
+
+
+def test_errors_elasticsearch_answers_are_raised(local_engine):
+    class Rejecting(Primary):
+        def search(self, **kwargs):
+            raise ValueError("parsing_exception")
+
+    client = FailoverClient(Rejecting(), Fallback(local_engine))
+
+    with pytest.raises(ValueError):
+        client.search(index=MOVIES.index, **QUERY)
+    assert not client.degraded
+
+
+def test_async_client_fails_over(local_engine):
+    client = AsyncFailoverClient(AsyncPrimary(), Fallback(local_engine))
+
+    response = asyncio.run(client.search(index=MOVIES.index, **QUERY))
+
+    assert [hit["_id"] for hit in response["hits"]["hits"]] == ["1"]
+    assert client.degraded
+    mapping = asyncio.run(client.indices.get_mapping(index=MOVIES.index))
+    assert list(mapping) == [f"{MOVIES.index}-local"]
+
+
+def test_create_clients_local(monkeypatch, local_engine):
+    monkeypatch.setattr("app.services.local_search.LocalSearchEngine.open", lambda *args: local_engine)
+
+    es, aes = create_clients("local")
+
+    assert es is local_engine
+    assert isinstance(aes, AsyncLocalSearchEngine)
+
+
+def test_create_clients_rejects_unknown_backends():
+    with pytest.raises(ValueError, match="RETRIEVAL_BACKEND"):
+        create_clients("solr")
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from app.services.batching import MicroBatcher
+
+
+def test_concurrent_requests_share_a_sorted_batch():
+    calls = []
+
+    def predict(items):
+        calls.append(list(items))
+        return [float(len(item)) for item in items]
+
+    batcher = MicroBatcher(predict, max_batch_size=16, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(["ccc", "a"]), batcher.submit(["bb"])]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+
+    # Each caller gets its own scores back, in its own order
+    assert results == [[3.0, 1.0], [2.0]]
+    assert calls == [["a", "bb", "ccc"]]
+
+
+def test_a_full_batch_is_scored_without_waiting():
+    batcher = MicroBatcher(lambda items: [0.0] * len(items), max_batch_size=2, max_wait_ms=60_000)
+    try:
+        assert batcher.submit(["a", "b"]).result(timeout=5) == [0.0, 0.0]
+    finally:
+        batcher.close()
+
+
+def test_empty_requests_and_errors():
+    def predict(items):
+        raise RuntimeError("out of memory")
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=1)
+    try:
+        assert batcher.submit([]).result(timeout=5) == []
+        error = batcher.submit(["a"]).exception(timeout=5)
+    finally:
+        batcher.close()
+
+    assert isinstance(error, RuntimeError)
+    assert not any(thread.name == "batcher" and thread.is_alive() for thread in threading.enumerate())
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(lambda items: [1.0] * len(items), max_batch_size=4, max_wait_ms=50)
+    queued = batcher.submit(["a"])
+    batcher.close()
+
+    assert queued.result(timeout=5) == [1.0]
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit(["b"])
+    batcher.close()
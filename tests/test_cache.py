@@ -0,0 +1,63 @@
+from app.services import cache as cache_module
+from app.services.cache import HITS, RERANK, NullCache, QueryCache, TTLCache, make_key, normalize_query
+
+
+def test_keys_ignore_tag_order_and_query_case():
+    assert make_key("v1", normalize_query("  Space   ALIENS "), ["scifi", "horror"]) == \
+        make_key("v1", "space aliens", ["horror", "scifi"])
+    assert make_key("v1", "space") != make_key("v2", "space")
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock[0])
+    cache = TTLCache(max_entries=10, ttl=5)
+    cache.set("a", 1)
+
+    clock[0] += 4
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_the_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_cached_values_are_copies():
+    cache = TTLCache(max_entries=10, ttl=60)
+    hits = [{"doc_id": "1"}]
+    cache.set("hits", hits)
+    hits[0]["rerank_score"] = 0.5
+
+    cached = cache.get("hits")
+    cached.append({"doc_id": "2"})
+    assert cache.get("hits") == [{"doc_id": "1"}]
+
+
+def test_query_cache_counts_per_namespace():
+    cache = QueryCache(TTLCache(max_entries=10, ttl=60))
+    cache.set_many(RERANK, {"q|1": 0.9, "q|2": 0.1})
+
+    assert cache.get_many(RERANK, ["q|1", "q|2", "q|3"]) == [0.9, 0.1, None]
+    assert cache.get(HITS, "q|1") is None
+
+    stats = cache.stats()
+    assert stats["local_entries"] == 2
+    assert stats["namespaces"][RERANK] == {"hits": 2, "misses": 1, "hit_rate": 0.6667}
+    assert stats["namespaces"][HITS]["misses"] == 1
+
+
+def test_null_cache_always_misses():
+    cache = NullCache()
+    cache.set(HITS, "key", [1])
+
+    assert cache.get(HITS, "key") is None
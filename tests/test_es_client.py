@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError, ConnectionError
+from prometheus_client import REGISTRY
+
+from app.services import es_client
+from app.services.es_client import AsyncResilientClient, ResilientClient, is_transient
+
+OK = {"hits": {"hits": []}}
+QUERY = {"index": "movies", "query": {"match": {"title": "alien"}}, "size": 10}
+
+
+def api_error(status):
+    meta = ApiResponseMeta(status, "1.1", HttpHeaders(), 0.0, NodeConfig("http", "localhost", 9200))
+    return ApiError(f"status {status}", meta, {})
+
+
+class FakeClient:
+    """Elasticsearch client stand-in answering searches with scripted outcomes (a response or an exception)."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.timeouts = []
+        self.transport = self
+        self.node_pool = self
+
+    def all(self):
+        return ["node"]
+
+    def options(self, request_timeout):
+        self.timeouts.append(request_timeout)
+        return self
+
+    def search(self, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def close(self):
+        pass
+
+
+class AsyncFakeClient(FakeClient):
+    """Async FakeClient; an outcome may be a (delay seconds, outcome) pair."""
+
+    async def search(self, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, tuple):
+            delay, outcome = outcome
+            await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(es_client.time, "sleep", delays.append)
+    return delays
+
+
+def test_transient_errors():
+    assert is_transient(ConnectionError("refused"))
+    assert is_transient(api_error(429))
+    assert is_transient(api_error(503))
+    assert not is_transient(api_error(400))
+    assert not is_transient(ValueError("bad"))
+
+
+def test_transient_errors_are_retried_with_jittered_backoff(sleeps):
+    fake = FakeClient(ConnectionError("refused"), api_error(503), OK)
+    client = ResilientClient(fake, "test-retry", max_retries=2, backoff_ms=20, search_budget_ms=1000)
+    before = sample("temu_es_retries_total", method="search")
+
+    assert client.search(**QUERY) is OK
+
+    assert len(fake.calls) == 3
+    assert 0 <= sleeps[0] <= 0.02 and 0 <= sleeps[1] <= 0.04
+    assert sample("temu_es_retries_total", method="search") == before + 2
+    # Each attempt gets what is left of the budget
+    assert fake.timeouts[0] <= 1.0
+    assert fake.timeouts == sorted(fake.timeouts, reverse=True)
+
+
+def test_retries_stop_after_max_retries(sleeps):
+    fake = FakeClient(api_error(503), api_error(503), api_error(503))
+    client = ResilientClient(fake, "test-max", max_retries=2, backoff_ms=1)
+
+    with pytest.raises(ApiError):
+        client.search(**QUERY)
+    assert len(fake.calls) == 3
+
+
+def test_other_errors_are_not_retried(sleeps):
+    fake = FakeClient(api_error(400), OK)
+    client = ResilientClient(fake, "test-fatal", max_retries=2, backoff_ms=1)
+
+    with pytest.raises(ApiError):
+        client.search(**QUERY)
+    assert len(fake.calls) == 1
+
+
+def test_retries_stay_within_the_budget(sleeps, monkeypatch):
+    monkeypatch.setattr(es_client.random, "uniform", lambda low, high: high)
+    fake = FakeClient(ConnectionError("refused"), OK)
+    # A 100ms backoff does not fit in a 50ms budget
+    client = ResilientClient(fake, "test-budget", max_retries=2, backoff_ms=100, search_budget_ms=50)
+
+    with pytest.raises(ConnectionError):
+        client.search(**QUERY)
+    assert len(fake.calls) == 1
+    assert sleeps == []
+
+
+def test_searches_are_routed_by_their_body(monkeypatch):
+    monkeypatch.setattr(es_client, "ES_REQUEST_CACHE", True)
+    monkeypatch.setattr(es_client, "ES_PREFERENCE_ROUTING", True)
+    client = ResilientClient(FakeClient(), "test-route")
+
+    routed = client._route("search", QUERY)
+    other = client._route("search", {**QUERY, "size": 20})
+    hedge = client._route("search", QUERY, hedge=True)
+
+    assert routed["request_cache"] is True
+    assert routed["preference"] == client._route("search", dict(QUERY))["preference"]
+    assert routed["preference"] != other["preference"]
+    assert not routed["preference"].startswith("_")
+    assert "preference" not in hedge and hedge["request_cache"] is True
+    assert "preference" not in QUERY
+    assert client._route("search", {**QUERY, "preference": "_local"})["preference"] == "_local"
+
+
+def test_msearch_headers_are_routed(monkeypatch):
+    monkeypatch.setattr(es_client, "ES_REQUEST_CACHE", True)
+    monkeypatch.setattr(es_client, "ES_PREFERENCE_ROUTING", True)
+    client = ResilientClient(FakeClient(), "test-route-msearch")
+    searches = [{"index": "movies"}, {"query": {"match_all": {}}}, {"index": "scifact"}, {"query": {"match_all": {}}}]
+
+    routed = client._route("msearch", {"searches": searches})["searches"]
+
+    assert routed[1] is searches[1] and routed[3] is searches[3]
+    assert routed[0]["request_cache"] and routed[2]["request_cache"]
+    # Same body, other index: other shards
+    assert routed[0]["preference"] != routed[2]["preference"]
+    assert searches[0] == {"index": "movies"}
+
+
+def test_slow_reads_are_hedged(monkeypatch):
+    monkeypatch.setattr(es_client, "ES_PREFERENCE_ROUTING", True)
+    fake = AsyncFakeClient((1.0, {"slow": True}), (0.0, OK))
+    client = AsyncResilientClient(fake, "test-hedge", hedge_after_ms=20, search_budget_ms=2000)
+    sent, won = sample("temu_es_hedged_requests_total", outcome="sent"), sample(
+        "temu_es_hedged_requests_total", outcome="won")
+
+    assert asyncio.run(client.search(**QUERY)) is OK
+
+    assert "preference" in fake.calls[0] and "preference" not in fake.calls[1]
+    assert sample("temu_es_hedged_requests_total", outcome="sent") == sent + 1
+    assert sample("temu_es_hedged_requests_total", outcome="won") == won + 1
+
+
+def test_fast_reads_are_not_hedged():
+    fake = AsyncFakeClient((0.0, OK))
+    client = AsyncResilientClient(fake, "test-no-hedge", hedge_after_ms=200)
+
+    assert asyncio.run(client.search(**QUERY)) is OK
+    assert len(fake.calls) == 1
+
+
+def test_async_retries_transient_errors(monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    fake = AsyncFakeClient(ConnectionError("refused"), OK)
+    client = AsyncResilientClient(fake, "test-async-retry", hedge_after_ms=0, max_retries=1, backoff_ms=1)
+    monkeypatch.setattr(es_client.asyncio, "sleep", no_sleep)
+
+    assert asyncio.run(client.search(**QUERY)) is OK
+    assert len(fake.calls) == 2
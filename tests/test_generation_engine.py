@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.services.generation_engine import GenerationEngine, GenerationRequest  # noqa: E402
+
+PROMPTS = [[5, 9, 2, 7, 11, 3, 8], [4, 6], [12, 1, 10, 13]]
+
+
+class NumberTokenizer:
+    """Decodes token ids as space-separated numbers."""
+
+    eos_token_id = None
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(str(i) for i in ids)
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=32, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=64)
+    model = transformers.LlamaForCausalLM(config).eval()
+    model.generation_config.eos_token_id = None
+    return model
+
+
+def generate(model, prompts, max_batch_size, **kwargs):
+    engine = GenerationEngine(model, NumberTokenizer(), max_batch_size=max_batch_size)
+    try:
+        futures = [
+            engine.submit(GenerationRequest(prompt, max_new_tokens=6, temperature=0, **kwargs))
+            for prompt in prompts
+        ]
+        return [future.result(timeout=60) for future in futures]
+    finally:
+        engine.close()
+
+
+def test_batched_decoding_matches_decoding_alone(model):
+    alone = [generate(model, [prompt], max_batch_size=1)[0] for prompt in PROMPTS]
+
+    batched = generate(model, PROMPTS, max_batch_size=len(PROMPTS))
+
+    assert batched == alone
+    assert all(len(text.split()) == 6 for text in batched)
+
+
+def test_text_is_streamed_and_cancellation_stops_early(model):
+    chunks = []
+    cancel = threading.Event()
+    cancel.set()
+
+    (streamed,) = generate(model, PROMPTS[:1], max_batch_size=2, on_text=chunks.append)
+    (cancelled,) = generate(model, PROMPTS[:1], max_batch_size=2, cancel=cancel)
+
+    assert "".join(chunks).strip() == streamed
+    assert cancelled == streamed.split()[0]
+
+
+def test_closed_engine_rejects_requests(model):
+    engine = GenerationEngine(model, NumberTokenizer())
+    engine.close()
+
+    with pytest.raises(RuntimeError, match="closed"):
+        engine.submit(GenerationRequest([1, 2], max_new_tokens=1, temperature=0))
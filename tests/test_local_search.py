@@ -0,0 +1,153 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.collections import MOVIES
+from app.services import local_search
+from app.services.local_search import LocalIndex, is_current
+
+
+def text_query(text, tags=None):
+    query = {"bool": {"must": {"multi_match": {"query": text, "fields": MOVIES.search_fields}}}}
+    if tags:
+        query["bool"]["filter"] = {"terms": {MOVIES.tag_field: tags}}
+    return query
+
+
+def hit_ids(response):
+    return [hit["_id"] for hit in response["hits"]["hits"]]
+
+
+def test_hits_are_ranked_by_bm25(local_engine):
+    response = local_engine.search(index=MOVIES.index, query=text_query("crew heist"), size=10)
+
+    assert hit_ids(response) == ["4", "2", "1"]
+    scores = [hit["_score"] for hit in response["hits"]["hits"]]
+    assert scores == sorted(scores, reverse=True)
+    assert response["hits"]["total"] == {"value": 3, "relation": "eq"}
+    assert response["hits"]["max_score"] == scores[0]
+
+
+def test_size_and_source_filter(local_engine):
+    response = local_engine.search(
+        index=MOVIES.index, query=text_query("crew heist"), size=2, source={"includes": ["title"]})
+
+    assert hit_ids(response) == ["4", "2"]
+    assert response["hits"]["hits"][0]["_source"] == {"title": "Ocean's Eleven"}
+    # The total counts every match, not just the page
+    assert response["hits"]["total"]["value"] == 3
+
+
+def test_tag_filter(local_engine):
+    response = local_engine.search(index=MOVIES.index, query=text_query("crew", tags=["crime"]), size=10)
+
+    # Alien's crew is not a crime one
+    assert sorted(hit_ids(response)) == ["2", "4"]
+    assert response["hits"]["total"]["value"] == 2
+
+
+def test_filter_only_searches_page_in_index_order(local_engine):
+    query = {"bool": {"filter": {"terms": {MOVIES.tag_field: ["crime", "family"]}}}}
+
+    first = local_engine.search(index=MOVIES.index, query=query, size=2, sort=["_doc"])
+    second = local_engine.search(index=MOVIES.index, query=query, size=2, from_=2, sort=["_doc"])
+
+    assert hit_ids(first) == ["2", "4"]
+    assert hit_ids(second) == ["5"]
+    assert first["hits"]["hits"][0]["_score"] is None
+
+
+def test_tag_aggregation_counts_the_matches(local_engine):
+    aggs = {"tags": {"terms": {"field": MOVIES.tag_field, "size": 2}}}
+
+    response = local_engine.search(index=MOVIES.index, query=text_query("crew heist"), size=0, aggs=aggs)
+
+    assert response["hits"]["hits"] == []
+    assert response["aggregations"]["tags"]["buckets"] == [
+        {"key": "crime", "doc_count": 2},
+        {"key": "action", "doc_count": 1},
+    ]
+
+
+def test_highlight_wraps_the_matching_terms(local_engine):
+    highlight = {"fields": {"plot": {"fragment_size": 40, "number_of_fragments": 2}}}
+
+    response = local_engine.search(index=MOVIES.index, query=text_query("heist"), size=1, highlight=highlight)
+
+    fragments = response["hits"]["hits"][0]["highlight"]["plot"]
+    assert len(fragments) == 1
+    assert "<em>heist</em>" in fragments[0]
+
+
+def test_msearch_answers_errors_per_search(local_engine):
+    response = local_engine.msearch(searches=[
+        {"index": MOVIES.index}, {"query": text_query("alien")},
+        {"index": MOVIES.index}, {"knn": {"field": "embedding", "query_vector": [0.1], "k": 1}},
+        {"index": "missing"}, {"query": text_query("alien")},
+    ])
+
+    first, knn, missing = response["responses"]
+    assert hit_ids(first) == ["1"]
+    assert knn["status"] == 400 and knn["error"]["type"] == "ValueError"
+    assert missing["status"] == 400 and missing["error"]["type"] == "KeyError"
+
+
+def test_mget_keeps_the_request_order(local_engine):
+    response = local_engine.mget(index=MOVIES.index, ids=["3", "missing", "1"], source_includes=["title"])
+
+    assert [(doc["_id"], doc["found"]) for doc in response["docs"]] == [
+        ("3", True), ("missing", False), ("1", True)]
+    assert response["docs"][0]["_source"] == {"title": "The Shining"}
+
+
+def test_tagged_search_through_the_retrieval_service(local_retrieval):
+    hits = local_retrieval.search("family", top_k=5, tags=["comedy"])
+
+    assert [hit["doc_id"] for hit in hits] == ["5"]
+    assert hits[0]["collection"] == MOVIES.name
+    assert hits[0]["plot"] == "A bear from Peru finds a family in London."
+
+
+def test_rerank_hits_carry_the_stored_passage(local_retrieval):
+    asyncio.run(local_retrieval.aindex_version([MOVIES]))
+    assert local_retrieval.stores_passages(MOVIES)
+
+    hits = local_retrieval.search("alien spaceship", top_k=1, for_rerank=True)
+
+    assert hits[0]["doc_id"] == "1"
+    assert "plot" not in hits[0]
+    assert "hunted by an alien creature" in hits[0]["rerank_passage"]
+    assert hits[0]["rerank_passage"].endswith("Genres: horror, scifi")
+
+
+def test_concurrent_opens_build_the_index_once(movies_file, tmp_path, monkeypatch):
+    directory = str(tmp_path / "index" / "movies")
+    builds = []
+    build = local_search.build_local_index
+    monkeypatch.setattr(local_search, "build_local_index", lambda *args: builds.append(args) or build(*args))
+
+    with ThreadPoolExecutor(4) as pool:
+        indices = list(pool.map(lambda _: LocalIndex.open(MOVIES, movies_file, directory), range(4)))
+
+    assert len(builds) == 1
+    assert all(index.size == 5 for index in indices)
+    assert is_current(directory, movies_file)
+    assert sorted(os.listdir(tmp_path / "index")) == ["movies", "movies.lock"]
+    for index in indices:
+        index.close()
+
+
+def test_rebuilds_replace_the_index(movies_file, tmp_path):
+    directory = str(tmp_path / "index" / "movies")
+    first = LocalIndex.open(MOVIES, movies_file, directory)
+    with open(movies_file, "a", encoding="utf-8") as f:
+        f.write('{"doc_id": "6", "title": "Jaws", "tags": ["horror"], "plot": "A shark."}\n')
+
+    second = LocalIndex.open(MOVIES, movies_file, directory)
+
+    assert (first.size, second.size) == (5, 6)
+    # The replaced index stays readable for whoever has it open
+    assert first.document(0)["title"] == "Alien"
+    assert sorted(os.listdir(tmp_path / "index")) == ["movies", "movies.lock"]
+    first.close()
+    second.close()
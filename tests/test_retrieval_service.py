@@ -0,0 +1,63 @@
+import pytest
+
+from app.collections import COLLECTIONS, MOVIES
+from app.config import RRF_K
+from app.services.retrieval_service import RetrievalService
+
+SCIFACT = COLLECTIONS["scifact"]
+ERROR = {"error": {"type": "search_phase_execution_exception"}, "status": 500}
+
+
+def response(*hits):
+    return {"hits": {"hits": [
+        {"_id": doc_id, "_score": score, "_source": {"title": f"Title {doc_id}"}} for doc_id, score in hits
+    ]}}
+
+
+def ranked(hits):
+    return [(hit["collection"], hit["doc_id"]) for hit in hits]
+
+
+def test_rrf_sums_reciprocal_ranks():
+    bm25 = response(("a", 12.0), ("b", 7.5))
+    knn = response(("b", 0.91), ("c", 0.90))
+
+    hits = RetrievalService._merge([MOVIES, MOVIES], [bm25, knn], top_k=10, merge="rrf")
+
+    assert ranked(hits) == [("movies", "b"), ("movies", "a"), ("movies", "c")]
+    assert hits[0]["score"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert hits[1]["score"] == pytest.approx(1 / (RRF_K + 1))
+
+
+def test_normalize_scales_scores_per_list():
+    bm25 = response(("a", 10.0), ("b", 5.0), ("c", 0.0))
+    knn = response(("b", 0.9), ("d", 0.8), ("e", 0.5))
+
+    hits = RetrievalService._merge([MOVIES, MOVIES], [bm25, knn], top_k=3, merge="normalize")
+
+    assert ranked(hits) == [("movies", "b"), ("movies", "a"), ("movies", "d")]
+    assert [hit["score"] for hit in hits] == pytest.approx([1.5, 1.0, 0.75])
+
+
+def test_normalize_a_list_of_equal_scores():
+    hits = RetrievalService._merge([MOVIES], [response(("a", 3.0))], top_k=3, merge="normalize")
+
+    assert hits[0]["score"] == 1.0
+
+
+def test_same_id_in_different_collections_stays_apart():
+    hits = RetrievalService._merge(
+        [MOVIES, SCIFACT], [response(("1", 4.0)), response(("1", 9.0))], top_k=10, merge="rrf")
+
+    assert sorted(ranked(hits)) == [("movies", "1"), ("scifact", "1")]
+
+
+def test_failed_lists_are_skipped():
+    hits = RetrievalService._merge([MOVIES, SCIFACT], [ERROR, response(("1", 9.0))], top_k=10)
+
+    assert ranked(hits) == [("scifact", "1")]
+
+
+def test_all_lists_failing_raises():
+    with pytest.raises(RuntimeError, match="Search failed"):
+        RetrievalService._merge([MOVIES, SCIFACT], [ERROR, ERROR], top_k=10)
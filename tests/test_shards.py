@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from app.services.shards import MANIFEST, file_checksum, iter_records, read_manifest, shard_paths, write_manifest
+
+
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    write_jsonl(tmp_path / "part-00000.jsonl", [{"doc_id": "1"}, {"doc_id": "2"}])
+    write_jsonl(tmp_path / "part-00001.jsonl", [{"doc_id": "3"}])
+    write_manifest(tmp_path, {"shards": [
+        {"path": "part-00000.jsonl", "rows": 2, "sha256": file_checksum(tmp_path / "part-00000.jsonl")},
+        {"path": "part-00001.jsonl", "rows": 1, "sha256": file_checksum(tmp_path / "part-00001.jsonl")},
+    ]})
+    return str(tmp_path)
+
+
+def test_records_are_read_shard_by_shard(dataset):
+    assert [r["doc_id"] for r in iter_records(dataset)] == ["1", "2", "3"]
+    assert [r["doc_id"] for r in iter_records(dataset, limit=2)] == ["1", "2"]
+
+
+def test_manifest_round_trip(dataset, tmp_path):
+    manifest = read_manifest(dataset)
+
+    assert [shard["rows"] for shard in manifest["shards"]] == [2, 1]
+    assert not (tmp_path / (MANIFEST + ".tmp")).exists()
+    assert read_manifest(str(tmp_path / "missing")) is None
+
+
+def test_a_plain_jsonl_file_is_one_shard(tmp_path):
+    path = str(tmp_path / "movies.jsonl")
+    write_jsonl(path, [{"doc_id": "1"}])
+
+    assert shard_paths(path) == [path]
+    assert list(iter_records(path)) == [{"doc_id": "1"}]
+
+
+def test_a_directory_without_manifest_is_rejected(tmp_path):
+    with pytest.raises(FileNotFoundError, match="scripts.convert"):
+        shard_paths(str(tmp_path))
+
+
+def test_parquet_shards(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    pq.write_table(pa.Table.from_pylist([{"doc_id": "1", "tags": ["a"]}, {"doc_id": "2", "tags": []}]),
+                   tmp_path / "part-00000.parquet")
+    write_manifest(tmp_path, {"shards": [{"path": "part-00000.parquet", "rows": 2}]})
+
+    assert list(iter_records(str(tmp_path))) == [{"doc_id": "1", "tags": ["a"]}, {"doc_id": "2", "tags": []}]
@@ -0,0 +1,29 @@
+from app.collections import MOVIES
+from app.services.summary_store import SummaryStore, relevance_sentence, text_hash
+
+from conftest import MOVIE_DOCS
+
+ALIEN = {"collection": MOVIES.name, **MOVIE_DOCS[0]}
+
+
+def test_get_checks_the_text_hash(tmp_path):
+    store = SummaryStore(str(tmp_path / "summaries.sqlite"))
+    store.put_many(MOVIES.name, [("1", "A crew fights an alien.", text_hash(MOVIES, ALIEN), "model")])
+
+    assert store.get(MOVIES.name, "1") == "A crew fights an alien."
+    assert store.get(MOVIES.name, "1", text_hash(MOVIES, ALIEN)) == "A crew fights an alien."
+    edited = {**ALIEN, "plot": "The crew of a spaceship is hunted by a cat."}
+    assert store.get(MOVIES.name, "1", text_hash(MOVIES, edited)) is None
+    assert store.get(MOVIES.name, "2") is None
+    assert store.fingerprints(MOVIES.name) == {"1": (text_hash(MOVIES, ALIEN), "model")}
+    store.close()
+
+
+def test_get_without_a_store_file(tmp_path):
+    assert SummaryStore(str(tmp_path / "missing.sqlite")).get(MOVIES.name, "1") is None
+
+
+def test_relevance_sentence_prefers_matching_tags():
+    assert relevance_sentence("scifi horror", ALIEN) == "This movie is tagged horror and scifi, matching your search."
+    assert relevance_sentence("the spaceship crew", ALIEN) == "It matches your search on spaceship and crew."
+    assert relevance_sentence("romance", ALIEN) == "It is the closest movie to your search."
@@ -0,0 +1,105 @@
+import asyncio
+
+from app.collections import MOVIES
+from app.services import tag_service
+from app.services.tag_service import TagService
+
+
+def test_vocabulary_counts_documents_per_tag(local_retrieval):
+    vocabulary = asyncio.run(TagService(local_retrieval).avocabulary(MOVIES))
+
+    assert vocabulary == {"comedy": 2, "crime": 2, "family": 1, "horror": 2, "action": 1, "scifi": 1}
+    assert list(vocabulary)[:3] == ["comedy", "crime", "horror"]
+
+
+def test_facets_count_the_tags_of_the_matches(local_retrieval):
+    facets = asyncio.run(TagService(local_retrieval).afacets("crew", None, [MOVIES]))
+
+    assert facets["tags"][:2] == [{"tag": "crime", "count": 2}, {"tag": "action", "count": 1}]
+    assert {"tag": "family", "count": 1} not in facets["tags"]
+
+
+def test_browse_pages_through_a_tag(local_retrieval):
+    tags = TagService(local_retrieval)
+
+    first = asyncio.run(tags.abrowse(["crime", "comedy"], MOVIES, offset=0, limit=2, facets=True))
+    second = asyncio.run(tags.abrowse(["crime", "comedy"], MOVIES, offset=2, limit=2))
+
+    assert first["total"] == 3
+    assert [r["doc_id"] for r in first["results"]] == ["2", "4"]
+    assert [r["doc_id"] for r in second["results"]] == ["5"]
+    assert "plot" not in first["results"][0]
+    assert {"tag": "crime", "count": 2} in first["facets"]["tags"]
+
+
+def test_only_known_tags_are_counted(local_retrieval, monkeypatch):
+    monkeypatch.setattr(tag_service, "MAX_TRACKED_FILTERS", 4)
+    tags = TagService(local_retrieval)
+
+    async def observe():
+        await tags._count_filter(MOVIES, ["horror", "not-a-tag"])
+        await tags._count_filter(MOVIES, ["horror"])
+        await tags._count_filter(MOVIES, ["made-up"])
+        for i in range(10):
+            await tags._count_filter(MOVIES, ["crime", f"junk-{i}"])
+
+    asyncio.run(observe())
+
+    assert tags._filter_uses == {(MOVIES.name, ("horror",)): 2, (MOVIES.name, ("crime",)): 10}
+
+
+def test_the_counter_is_trimmed_to_the_most_used(local_retrieval, monkeypatch):
+    monkeypatch.setattr(tag_service, "MAX_TRACKED_FILTERS", 4)
+    tags = TagService(local_retrieval)
+    filters = [["horror"], ["crime"], ["comedy"], ["family"], ["action"]]
+
+    async def observe():
+        for uses, tag_filter in enumerate(filters, start=1):
+            for _ in range(uses):
+                await tags._count_filter(MOVIES, tag_filter)
+
+    asyncio.run(observe())
+
+    # The fifth filter trimmed the counter to the two most used; it then starts over
+    assert tags._filter_uses == {
+        (MOVIES.name, ("family",)): 4, (MOVIES.name, ("comedy",)): 3, (MOVIES.name, ("action",)): 4}
+
+
+def test_search_cancels_the_facet_task_when_retrieval_fails():
+    from app.routes import search as search_route
+    from app.services.executor import OverloadedError
+
+    cancelled = asyncio.Event()
+
+    class Retrieval:
+        async def aindex_version(self, collections):
+            return "v1"
+
+        async def asearch(self, **kwargs):
+            # Lets the facet search start first
+            await asyncio.sleep(0)
+            raise OverloadedError("busy")
+
+    class Tags:
+        async def aobserve(self, collections, tags):
+            pass
+
+        async def afacets(self, *args, **kwargs):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+    async def run():
+        try:
+            await search_route.search(
+                query="crew", top_k=10, tags=None, rerank=False, rerank_top_k=10, mode="bm25",
+                cascade=False, rerank_budget_ms=None, collections=[MOVIES], merge="rrf", fields=["title"],
+                facets=True, retrieval=Retrieval(), reranker=None, rerank_executor=None, cache=None,
+                tag_service=Tags())
+        except OverloadedError:
+            await asyncio.wait_for(cancelled.wait(), 1)
+            return True
+
+    assert asyncio.run(run())
@@ -0,0 +1,39 @@
+import asyncio
+
+from app.collections import get_collection
+from app.config import FEDERATED_MERGE
+from app.services.cache import HITS, QueryCache, TTLCache
+from app.services.warmup import RERANK_CANDIDATES, awarm_up
+
+
+class FakeRegistry:
+    def __init__(self, **services):
+        self.services = services
+
+    def get(self, name):
+        return self.services[name]
+
+    def is_loaded(self, name):
+        return name in self.services
+
+
+def test_warm_up_fills_the_query_cache_of_the_async_path(local_retrieval):
+    cache = QueryCache(TTLCache(max_entries=100, ttl=60))
+    # Requests never use the sync client, so neither does the warm-up
+    local_retrieval.es = None
+    registry = FakeRegistry(retrieval=local_retrieval, cache=cache)
+
+    async def run():
+        timings = await awarm_up(registry, ["alien spaceship"])
+        collections = [get_collection()]
+        # The hits of a default /search request are now cached
+        hits = await local_retrieval.asearch(
+            "Alien  spaceship", top_k=RERANK_CANDIDATES, for_rerank=True, snippets=True, with_plot=False,
+            collections=collections, merge=FEDERATED_MERGE, cache=cache,
+            cache_scope=await local_retrieval.aindex_version(collections))
+        return timings, hits
+
+    timings, hits = asyncio.run(run())
+    assert set(timings) == {"retrieval"}
+    assert hits
+    assert cache.stats()["namespaces"][HITS]["hits"] == 1